@@ -4,11 +4,13 @@
 import os
 import json
 import sqlite3
-import jieba
-import re
 import math
 from collections import Counter
 from datetime import datetime
+import text_tokenizer
+import token_store
+import vector_index
+import query_planner
 
 # 設定基本參數
 DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
@@ -53,17 +55,29 @@ def load_data_from_db():
         log_message(f"從數據庫加載數據失敗: {str(e)}")
         return [], []
 
-# 使用jieba進行中文分詞
-def tokenize_text(text):
-    if not text:
+# 從數據庫加載法規條文（law_articles.py 拆分），條文表不存在時返回空列表
+def load_articles_from_db():
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT id, title, content, category FROM law_articles
+        ''')
+        articles = cursor.fetchall()
+        conn.close()
+        
+        log_message(f"從數據庫加載了 {len(articles)} 條法規條文")
+        return articles
+    except Exception as e:
+        log_message(f"從數據庫加載法規條文失敗: {str(e)}")
         return []
-    # 移除標點符號和特殊字符
-    text = re.sub(r'[^\w\s]', '', text)
-    # 使用jieba進行分詞
-    words = jieba.cut(text)
-    # 過濾停用詞和空字符
-    stopwords = {'的', '了', '和', '是', '在', '有', '與', '之', '或', '及', '對', '由', '上', '中', '下', '為', '以', '等'}
-    return [word for word in words if word and word not in stopwords]
+
+# 語料庫IDF表供jieba的TF-IDF關鍵詞提取使用，詞必須與jieba分詞結果一致，不隨索引分詞器改變
+IDF_TOKENIZER = "jieba"
+
+# 中文分詞（建立索引使用的分詞器由 text_tokenizer.INDEX_TOKENIZER 設定）
+def tokenize_text(text):
+    return text_tokenizer.tokenize(text, text_tokenizer.INDEX_TOKENIZER)
 
 # 建立TF-IDF索引
 def build_tfidf_index(documents):
@@ -101,19 +115,77 @@ def build_tfidf_index(documents):
     
     return tfidf_docs, idf
 
-# 保存TF-IDF索引到文件
-def save_tfidf_index(tfidf_docs, idf, filename):
+# 保存TF-IDF索引為二進制索引目錄（詞彙表、CSR權重和文檔ID數組，API以 mmap 方式載入）
+def save_tfidf_index(tfidf_docs, idf, dirname):
+    try:
+        output_path = os.path.join(AI_DIR, dirname)
+        doc_count, vocabulary_size = vector_index.save_tfidf_index(
+            output_path, [(doc['id'], doc['tfidf']) for doc in tfidf_docs], idf
+        )
+        log_message(f"成功保存TF-IDF索引: {output_path}，{doc_count} 篇文檔，詞彙量 {vocabulary_size}")
+        return True
+    except Exception as e:
+        log_message(f"保存TF-IDF索引失敗: {str(e)}")
+        return False
+
+# 由數據庫中的詞頻向量建立稀疏向量索引目錄（重排序使用，API啟動時以 mmap 載入）
+# 先補建缺失的詞頻向量，索引包含當前所有文檔
+def save_vector_index(doc_type, dirname):
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        try:
+            token_store.backfill_document_tokens(conn, doc_type)
+            output_path = os.path.join(AI_DIR, dirname)
+            doc_count, vocabulary_size = vector_index.save_vector_index(
+                output_path, token_store.iter_document_vectors(conn, doc_type)
+            )
+        finally:
+            conn.close()
+        log_message(f"成功保存稀疏向量索引: {output_path}，{doc_count} 篇文檔，詞彙量 {vocabulary_size}")
+        return True
+    except Exception as e:
+        log_message(f"保存{doc_type}稀疏向量索引失敗: {str(e)}")
+        return False
+
+# 由數據庫中的詞頻向量建立查詢詞彙表（文檔頻率），查詢詞規劃器據此刪除常見詞和被包含的短語
+def save_query_vocabulary(doc_type):
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        try:
+            doc_count, vocabulary_size = query_planner.build_vocabulary(conn, doc_type)
+        finally:
+            conn.close()
+        log_message(f"成功建立{doc_type}查詢詞彙表: {doc_count} 篇文檔，詞彙量 {vocabulary_size}")
+        return True
+    except Exception as e:
+        log_message(f"建立{doc_type}查詢詞彙表失敗: {str(e)}")
+        return False
+
+# 從已分詞的法規和判例計算語料庫IDF（公式與 build_tfidf_index 相同）
+def build_corpus_idf(tokenized_docs):
+    num_docs = len(tokenized_docs)
+    doc_freq = Counter()
+    for doc_tokens in tokenized_docs:
+        doc_freq.update(set(doc_tokens))
+    
+    return {word: math.log(num_docs / (freq + 1)) + 1 for word, freq in doc_freq.items()}
+
+# 保存語料庫IDF為jieba可載入的格式（每行「詞 IDF值」），供 jieba.analyse.set_idf_path 使用
+def save_jieba_idf(idf, filename):
     try:
         output_path = os.path.join(AI_DIR, filename)
+        count = 0
         with open(output_path, "w", encoding="utf-8") as f:
-            json.dump({
-                'documents': tfidf_docs,
-                'idf': idf
-            }, f, ensure_ascii=False)
-        log_message(f"成功保存TF-IDF索引: {output_path}")
+            for word, value in sorted(idf.items(), key=lambda x: x[1]):
+                # jieba以空格分隔詞和值，且TF-IDF只考慮長度大於1的詞
+                if len(word) < 2 or any(char.isspace() for char in word):
+                    continue
+                f.write(f"{word} {value:.4f}\n")
+                count += 1
+        log_message(f"成功保存語料庫IDF表: {output_path}，共 {count} 個詞")
         return True
     except Exception as e:
-        log_message(f"保存TF-IDF索引失敗: {str(e)}")
+        log_message(f"保存語料庫IDF表失敗: {str(e)}")
         return False
 
 # 建立法律關鍵詞字典
@@ -249,11 +321,36 @@ def main():
     # 建立TF-IDF索引
     log_message("正在建立法規的TF-IDF索引...")
     laws_tfidf, laws_idf = build_tfidf_index(laws)
-    save_tfidf_index(laws_tfidf, laws_idf, "laws_tfidf_index.json")
+    save_tfidf_index(laws_tfidf, laws_idf, "laws_tfidf_index")
     
     log_message("正在建立判例的TF-IDF索引...")
     cases_tfidf, cases_idf = build_tfidf_index(cases)
-    save_tfidf_index(cases_tfidf, cases_idf, "cases_tfidf_index.json")
+    save_tfidf_index(cases_tfidf, cases_idf, "cases_tfidf_index")
+    
+    # 條文索引用於條文搜索的TF-IDF候選（條文內容與法規重複，不計入語料庫IDF）
+    articles = load_articles_from_db()
+    if articles:
+        log_message("正在建立法規條文的TF-IDF索引...")
+        articles_tfidf, articles_idf = build_tfidf_index(articles)
+        save_tfidf_index(articles_tfidf, articles_idf, "articles_tfidf_index")
+    
+    # 建立重排序使用的稀疏向量索引和查詢詞規劃使用的詞彙表（兩者都來自已保存的詞頻向量）
+    log_message("正在建立稀疏向量索引和查詢詞彙表...")
+    search_targets = [("law", "laws_vector_index"), ("case", "cases_vector_index")]
+    if articles:
+        search_targets.append(("article", "articles_vector_index"))
+    for doc_type, dirname in search_targets:
+        save_vector_index(doc_type, dirname)
+        save_query_vocabulary(doc_type)
+    
+    # 建立語料庫IDF表（索引使用jieba分詞時重用上面的分詞結果，否則以jieba重新分詞）
+    log_message("正在建立語料庫IDF表...")
+    if text_tokenizer.get_tokenizer(text_tokenizer.INDEX_TOKENIZER) is text_tokenizer.get_tokenizer(IDF_TOKENIZER):
+        idf_tokens = [doc['tokens'] for doc in laws_tfidf + cases_tfidf]
+    else:
+        idf_tokens = [text_tokenizer.tokenize(doc[2], IDF_TOKENIZER) for doc in laws + cases]
+    corpus_idf = build_corpus_idf(idf_tokens)
+    save_jieba_idf(corpus_idf, "legal_idf.txt")
     
     # 建立法律關鍵詞字典
     log_message("正在建立法律關鍵詞字典...")
@@ -271,6 +368,7 @@ def main():
     save_legal_question_classifier(classifier, "legal_question_classifier.json")
     
     log_message("基於規則的AI解決方案設置完成")
+    log_message("運行中的API服務可調用 POST /api/analyzer/reload 重新載入字典和搜索索引")
 
 if __name__ == "__main__":
     main()
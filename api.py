@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
@@ -9,6 +9,10 @@ import uvicorn
 import sys
 import os
 import json
+import math
+import threading
+import time
+from collections import deque
 from datetime import datetime
 
 # 添加backend目錄到Python路徑
@@ -18,6 +22,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 try:
     import keyword_extractor
     import legal_search
+    import law_citations
     import response_generator
 except ImportError as e:
     print(f"導入模塊失敗: {str(e)}")
@@ -27,6 +32,11 @@ except ImportError as e:
 AI_DIR = "/home/ubuntu/legal-ai-system/backend/ai"
 LOG_FILE = os.path.join(AI_DIR, "api_log.txt")
 
+# 問題回答的延遲預算（毫秒），滾動p95超過預算時自動改用較便宜的分析模式
+LATENCY_BUDGET_MS = float(os.environ.get("LATENCY_BUDGET_MS", "1000"))
+LATENCY_WINDOW_SIZE = 200
+LATENCY_MIN_SAMPLES = 20
+
 # 確保目錄存在
 os.makedirs(AI_DIR, exist_ok=True)
 
@@ -37,6 +47,42 @@ def log_message(message):
         f.write(f"[{timestamp}] {message}\n")
     print(f"[{timestamp}] {message}")
 
+# 滾動延遲監控，用於在負載升高時自動降級分析模式
+class LatencyMonitor:
+    def __init__(self, budget_ms, window_size=LATENCY_WINDOW_SIZE, min_samples=LATENCY_MIN_SAMPLES):
+        self.budget_ms = budget_ms
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    # 記錄一次請求耗時
+    def record(self, elapsed_ms):
+        with self._lock:
+            self._samples.append(elapsed_ms)
+
+    # 計算滾動p95延遲
+    def p95(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        return samples[max(0, math.ceil(len(samples) * 0.95) - 1)]
+
+    # 根據滾動p95選擇分析模式：超出預算時降一級
+    def select_profile(self, default_profile):
+        with self._lock:
+            sample_count = len(self._samples)
+        if sample_count < self.min_samples or self.p95() <= self.budget_ms:
+            return default_profile
+        return keyword_extractor.cheaper_profile(default_profile)
+
+    def stats(self):
+        with self._lock:
+            sample_count = len(self._samples)
+        return {"p95_ms": round(self.p95(), 3), "budget_ms": self.budget_ms, "samples": sample_count}
+
+latency_monitor = LatencyMonitor(LATENCY_BUDGET_MS)
+
 # 創建FastAPI應用
 app = FastAPI(
     title="台灣法律AI系統API",
@@ -51,6 +97,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # 允許所有方法
     allow_headers=["*"],  # 允許所有頭部
+    expose_headers=["X-Next-Cursor"],  # 允許前端讀取分頁游標
 )
 
 # 定義請求和響應模型
@@ -59,18 +106,25 @@ class QuestionRequest(BaseModel):
     user_id: Optional[str] = None
     session_id: Optional[str] = None
     context: Optional[Dict[str, Any]] = None
+    profile: Optional[str] = None  # 分析模式: full / fast / minimal
+    result_mode: Optional[str] = "full"  # 搜索結果模式: full / snippet
 
 class SearchRequest(BaseModel):
     keywords: List[str]
     category: Optional[str] = None
     case_type: Optional[str] = None
     limit: Optional[int] = 10
+    result_mode: Optional[str] = "full"  # 搜索結果模式: full / snippet
+    date_from: Optional[str] = None  # 日期範圍（YYYY-MM-DD，包含兩端）
+    date_to: Optional[str] = None
 
 class AnalysisResponse(BaseModel):
     keywords: List[str]
     category: Optional[str] = None
     entities: List[Dict[str, Any]]
     actions: List[str]
+    profile: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
 
 class SearchResponse(BaseModel):
     laws: List[Dict[str, Any]]
@@ -78,6 +132,8 @@ class SearchResponse(BaseModel):
     keywords: List[str]
     category: Optional[str] = None
     case_type: Optional[str] = None
+    pipeline: Optional[Dict[str, Any]] = None
+    timings: Optional[Dict[str, float]] = None
 
 class QuestionResponse(BaseModel):
     question: str
@@ -86,6 +142,18 @@ class QuestionResponse(BaseModel):
     search_result: SearchResponse
     generated_at: str
 
+# 檢查搜索結果模式
+def check_result_mode(result_mode):
+    if result_mode not in legal_search.RESULT_MODES:
+        raise HTTPException(status_code=400, detail=f"未知的結果模式: {result_mode}，可用: {', '.join(legal_search.RESULT_MODES)}")
+
+# 檢查並統一日期範圍
+def check_date_range(date_from, date_to):
+    try:
+        return legal_search.parse_date_range(date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # 載入回答模板
 def load_response_templates():
     try:
@@ -98,6 +166,14 @@ def load_response_templates():
         log_message(f"載入回答模板失敗: {str(e)}")
         return {}
 
+# 啟動時預先載入問題分析器，避免第一個請求承擔載入成本
+@app.on_event("startup")
+async def preload_question_analyzer():
+    keyword_extractor.get_analyzer()
+    log_message("問題分析器預載完成")
+    # 稀疏向量索引和TF-IDF索引以 mmap 方式開啟，只讀取文件頭，不會延遲啟動
+    legal_search.preload_search_indexes()
+
 # API路由
 @app.get("/")
 async def root():
@@ -105,15 +181,34 @@ async def root():
 
 @app.post("/api/question", response_model=QuestionResponse)
 async def answer_question(request: QuestionRequest):
+    if request.profile and request.profile not in keyword_extractor.ANALYSIS_PROFILES:
+        raise HTTPException(status_code=400, detail=f"未知的分析模式: {request.profile}")
+    check_result_mode(request.result_mode)
+    
     try:
-        log_message(f"收到問題: {request.question}")
+        start_time = time.perf_counter()
+        
+        # 問題只是引用條文（如「民法第184條」）時直接返回條文，不進行問題分析和搜索
+        citations = legal_search.lookup_citations(request.question)
+        if law_citations.is_citation_query(request.question, citations):
+            return answer_citation_query(request, citations, start_time)
+        
+        # 未指定分析模式時，根據滾動延遲自動選擇
+        profile = request.profile or latency_monitor.select_profile(keyword_extractor.get_analyzer().profile)
+        log_message(f"收到問題: {request.question}, 分析模式: {profile}")
         
         # 分析問題
-        analysis_result = keyword_extractor.analyze_question(request.question)
+        analysis_result = keyword_extractor.analyze_question(request.question, profile)
         
         # 搜索相關法規和判例
         search_result = legal_search.search_by_question_analysis(analysis_result)
         
+        # 問題中引用的條文排在搜索結果之前
+        cited = [citation["document"] for citation in citations if citation["found"]]
+        if cited:
+            cited_ids = {document["id"] for document in cited}
+            search_result["laws"] = cited + [law for law in search_result["laws"] if law.get("article") is None or law["id"] not in cited_ids]
+        
         # 載入回答模板
         templates = load_response_templates()
         
@@ -125,36 +220,82 @@ async def answer_question(request: QuestionRequest):
             templates
         )
         
+        # 摘要模式：回答已使用完整內容生成，響應中只返回摘要
+        if request.result_mode == "snippet":
+            search_result = dict(
+                search_result,
+                laws=legal_search.snippet_documents(search_result["laws"], search_result["keywords"]),
+                cases=legal_search.snippet_documents(search_result["cases"], search_result["keywords"])
+            )
+        
         # 格式化響應
         response = {
             "question": request.question,
             "response": full_response["response"],
             "analysis": {
-                "keywords": analysis_result.get("tfidf_keywords", []),
+                "keywords": [keyword for keyword, weight in analysis_result.get("tfidf_keywords", [])],
                 "category": analysis_result.get("category"),
-                "entities": analysis_result.get("entities", []),
-                "actions": analysis_result.get("actions", [])
+                "entities": [{"type": entity_type, "value": value} for entity_type, value in analysis_result.get("entities", [])],
+                "actions": analysis_result.get("actions", []),
+                "profile": analysis_result.get("profile"),
+                "timings": analysis_result.get("timings")
             },
             "search_result": search_result,
             "generated_at": datetime.now().isoformat()
         }
         
+        latency_monitor.record((time.perf_counter() - start_time) * 1000)
         log_message("成功生成回答")
         return response
     except Exception as e:
         log_message(f"處理問題失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"處理問題失敗: {str(e)}")
 
+# 直接返回問題引用的條文（/api/question 的快速路徑）
+def answer_citation_query(request, citations, start_time):
+    documents = [citation["document"] for citation in citations]
+    keywords = [citation["citation"] for citation in citations]
+    search_result = {
+        "laws": documents,
+        "cases": [],
+        "keywords": keywords,
+        "category": None,
+        "case_type": None,
+        "pipeline": {"citation": True},
+        "timings": {"total": round((time.perf_counter() - start_time) * 1000, 3)}
+    }
+    full_response = response_generator.generate_response(request.question, {}, search_result, load_response_templates())
+    if request.result_mode == "snippet":
+        search_result = dict(search_result, laws=legal_search.snippet_documents(documents, keywords))
+    
+    log_message(f"問題為條文引用，直接返回 {len(documents)} 條條文: {keywords}")
+    return {
+        "question": request.question,
+        "response": full_response["response"],
+        "analysis": {
+            "keywords": keywords,
+            "category": None,
+            "entities": [],
+            "actions": [],
+            "profile": "citation",
+            "timings": None
+        },
+        "search_result": search_result,
+        "generated_at": datetime.now().isoformat()
+    }
+
 @app.post("/api/search", response_model=SearchResponse)
 async def search_legal_documents(request: SearchRequest):
+    check_result_mode(request.result_mode)
+    date_range = check_date_range(request.date_from, request.date_to)
     try:
-        log_message(f"收到搜索請求: 關鍵詞={request.keywords}, 類別={request.category}, 案件類型={request.case_type}")
+        log_message(f"收到搜索請求: 關鍵詞={request.keywords}, 類別={request.category}, 案件類型={request.case_type}, 日期={date_range}")
         
         # 搜索法規
-        laws = legal_search.search_laws(request.keywords, request.category, request.limit)
+        laws = legal_search.search_laws(request.keywords, request.category, request.limit, request.result_mode, date_range)
         
         # 搜索判例
-        cases = legal_search.search_cases(request.keywords, request.case_type, request.limit)
+        cases = legal_search.search_cases(request.keywords, request.case_type, request.limit, request.result_mode, date_range)
         
         # 格式化響應
         response = {
@@ -173,42 +314,115 @@ async def search_legal_documents(request: SearchRequest):
 
 @app.get("/api/laws", response_model=List[Dict[str, Any]])
 async def get_laws(
+    response: Response,
     keyword: Optional[str] = Query(None, description="搜索關鍵詞"),
     category: Optional[str] = Query(None, description="法規類別"),
-    limit: int = Query(10, description="返回結果數量限制")
+    limit: int = Query(10, description="返回結果數量限制"),
+    mode: str = Query("full", description="結果模式: full / snippet"),
+    cursor: Optional[str] = Query(None, description="分頁游標（上一頁響應頭 X-Next-Cursor 的值）"),
+    date_from: Optional[str] = Query(None, description="起始日期（YYYY-MM-DD，包含）"),
+    date_to: Optional[str] = Query(None, description="結束日期（YYYY-MM-DD，包含）")
 ):
+    check_result_mode(mode)
+    date_range = check_date_range(date_from, date_to)
     try:
-        log_message(f"收到法規查詢請求: 關鍵詞={keyword}, 類別={category}")
+        log_message(f"收到法規查詢請求: 關鍵詞={keyword}, 類別={category}, 日期={date_range}")
         
-        # 搜索法規
+        # 搜索法規（已拆分條文時返回條文，與問題搜索一致，結果的 doc_type 標明類型），下一頁游標通過響應頭返回
         keywords = [keyword] if keyword else []
-        laws = legal_search.search_laws(keywords, category, limit)
+        laws, next_cursor = legal_search.search_law_page(keywords, category, limit, mode, cursor, date_range)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
         log_message(f"法規查詢完成，找到 {len(laws)} 條相關法規")
         return laws
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         log_message(f"法規查詢失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"法規查詢失敗: {str(e)}")
 
 @app.get("/api/cases", response_model=List[Dict[str, Any]])
 async def get_cases(
+    response: Response,
     keyword: Optional[str] = Query(None, description="搜索關鍵詞"),
     case_type: Optional[str] = Query(None, description="案件類型"),
-    limit: int = Query(10, description="返回結果數量限制")
+    limit: int = Query(10, description="返回結果數量限制"),
+    mode: str = Query("full", description="結果模式: full / snippet"),
+    cursor: Optional[str] = Query(None, description="分頁游標（上一頁響應頭 X-Next-Cursor 的值）"),
+    citation: Optional[str] = Query(None, description="裁判字號，如「最高法院110年度台上字第1234號」，指定時只返回該字號的判決"),
+    date_from: Optional[str] = Query(None, description="起始日期（YYYY-MM-DD，包含）"),
+    date_to: Optional[str] = Query(None, description="結束日期（YYYY-MM-DD，包含）")
 ):
+    check_result_mode(mode)
+    date_range = check_date_range(date_from, date_to)
     try:
-        log_message(f"收到判例查詢請求: 關鍵詞={keyword}, 案件類型={case_type}")
+        log_message(f"收到判例查詢請求: 關鍵詞={keyword}, 案件類型={case_type}, 字號={citation}, 日期={date_range}")
         
-        # 搜索判例
+        # 字號查詢：以複合索引直接取得判決，不使用全文搜索和分頁
+        if citation:
+            citations, cases = legal_search.lookup_case_citations(citation)
+            if not citations:
+                raise ValueError(f"無法解析裁判字號: {citation}")
+            if mode == "snippet":
+                cases = legal_search.snippet_documents(cases, [])
+            log_message(f"字號查詢完成，找到 {len(cases)} 條判例")
+            return cases
+        
+        # 搜索判例，下一頁游標通過響應頭返回
         keywords = [keyword] if keyword else []
-        cases = legal_search.search_cases(keywords, case_type, limit)
+        cases, next_cursor = legal_search.search_page("case", keywords, case_type, limit, mode, cursor, date_range)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
         log_message(f"判例查詢完成，找到 {len(cases)} 條相關判例")
         return cases
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         log_message(f"判例查詢失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"判例查詢失敗: {str(e)}")
 
+@app.get("/api/laws/{law_id}", response_model=Dict[str, Any])
+async def get_law_detail(law_id: int):
+    law = legal_search.get_document("law", law_id)
+    if not law:
+        raise HTTPException(status_code=404, detail="法規未找到")
+    return law
+
+@app.get("/api/citations")
+async def get_cited_articles(q: str = Query(..., description="條文引用，如「民法第184條」、「刑法第185條之3」")):
+    citations = legal_search.lookup_citations(q)
+    if not citations:
+        raise HTTPException(status_code=404, detail="未找到條文引用")
+    return {
+        "query": q,
+        "citations": [
+            {
+                "citation": citation["citation"],
+                "law": citation["law"],
+                "article": citation["article"],
+                "found": citation["found"],
+                "document": citation["document"]
+            }
+            for citation in citations
+        ]
+    }
+
+@app.get("/api/articles/{article_id}", response_model=Dict[str, Any])
+async def get_article_detail(article_id: int):
+    article = legal_search.get_document("article", article_id)
+    if not article:
+        raise HTTPException(status_code=404, detail="條文未找到")
+    return article
+
+@app.get("/api/cases/{case_id}", response_model=Dict[str, Any])
+async def get_case_detail(case_id: int):
+    case = legal_search.get_document("case", case_id)
+    if not case:
+        raise HTTPException(status_code=404, detail="判例未找到")
+    return case
+
 @app.get("/api/categories")
 async def get_categories():
     try:
@@ -227,6 +441,42 @@ async def get_categories():
         log_message(f"獲取類別失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"獲取類別失敗: {str(e)}")
 
+@app.post("/api/analyzer/reload")
+async def reload_question_analyzer():
+    try:
+        # ai_setup.py 重新生成字典文件和搜索索引後調用
+        keyword_extractor.reload_analyzer()
+        analyzer = keyword_extractor.get_analyzer()
+        search_indexes = legal_search.reload_search_indexes()
+        return {
+            "status": "reloaded",
+            "keywords": len(analyzer.keywords_dict),
+            "categories": len(analyzer.classifier),
+            "loaded_at": analyzer.loaded_at.isoformat(),
+            "search_indexes": search_indexes
+        }
+    except Exception as e:
+        log_message(f"重新載入問題分析器失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"重新載入問題分析器失敗: {str(e)}")
+
+@app.get("/api/analyzer/status")
+async def get_question_analyzer_status():
+    analyzer = keyword_extractor.get_analyzer()
+    return {
+        "default_profile": analyzer.profile,
+        "active_profile": latency_monitor.select_profile(analyzer.profile),
+        "latency": latency_monitor.stats(),
+        "dictionary_version": analyzer.dictionary_version,
+        "cache": analyzer.cache.stats()
+    }
+
+@app.get("/api/search/stats")
+async def get_search_stats():
+    return {
+        "connection_pool": legal_search.get_read_pool().stats(),
+        "statement_cache": legal_search.search_query.statement_stats.stats()
+    }
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
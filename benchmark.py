@@ -0,0 +1,613 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 性能基準測試
+# 用法: python benchmark.py [測試名稱 ...]，不指定名稱時運行全部測試
+
+import os
+import re
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+
+# 設定基本參數
+AI_DIR = "/home/ubuntu/legal-ai-system/backend/ai"
+LOG_FILE = os.path.join(AI_DIR, "benchmark_log.txt")
+
+# 確保目錄存在
+os.makedirs(AI_DIR, exist_ok=True)
+
+# 記錄函數
+def log_message(message):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"[{timestamp}] {message}\n")
+    print(f"[{timestamp}] {message}")
+
+# 重複執行函數，返回每次調用的平均耗時（毫秒）
+def time_call(func, *args, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+# 原有的實體和行為抽取實現（每次調用查找正則緩存，行為正則帶嵌套捕獲組），作為對照
+def legacy_extract_entities_and_actions(text):
+    entities = []
+    actions = []
+    person_pattern = r'([張李王陳楊趙黃周吳劉蔡鄭許謝郭洪曾邱廖賴][\u4e00-\u9fa5]{0,1}某|我|他|她|你|妳|我們|他們|她們|你們|妳們)'
+    entities.extend([("人物", match) for match in re.findall(person_pattern, text)])
+    location_pattern = r'(在|於)([^\，\。\！\？\；\：]{1,10})'
+    entities.extend([("地點", match[1]) for match in re.findall(location_pattern, text)])
+    time_pattern = r'([0-9]{4}年[0-9]{1,2}月[0-9]{1,2}日|[0-9]{1,2}月[0-9]{1,2}日|[0-9]{1,2}日|[0-9]{1,2}時|[0-9]{1,2}分|昨天|今天|明天|前天|後天|早上|中午|下午|晚上)'
+    entities.extend([("時間", match) for match in re.findall(time_pattern, text)])
+    action_pattern = r'(([^\，\。\！\？\；\：]{1,3})(了|過)([^\，\。\！\？\；\：]{1,10}))'
+    actions.extend([match[0] for match in re.findall(action_pattern, text)])
+    return entities, actions
+
+# 實體和行為抽取：模組級預編譯正則（仍為四個正則各掃描一次）vs 原有實現
+def benchmark_entity_regex():
+    import keyword_extractor
+
+    # 基準測試時不寫日誌，避免I/O干擾計時
+    extractor_log = keyword_extractor.log_message
+    keyword_extractor.log_message = lambda message: None
+
+    question = "我昨天下午在台北市忠孝東路開車時不小心撞到了路人，他說要告我過失傷害，我該怎麼辦？"
+    paragraph = "2023年5月3日早上，張某在公司會議室與王某發生爭執，王某打了張某一拳，張某報了警。之後雙方去過醫院驗傷，醫生開了診斷證明。\n"
+    inputs = [
+        ("短問題", question),
+        ("多段落(約2千字)", paragraph * 30),
+        ("多段落(約2萬字)", paragraph * 300),
+        ("無標點長文(2萬字)", "他打了人又罵過人" * 2500)
+    ]
+
+    try:
+        log_message("實體和行為抽取基準測試（每次調用平均耗時）")
+        log_message(f"{'輸入':<16}{'字數':>8}{'原有實現(ms)':>16}{'預編譯四次掃描(ms)':>16}{'加速比':>10}")
+        for name, text in inputs:
+            repeat = 200 if len(text) < 1000 else 10
+            if legacy_extract_entities_and_actions(text) != keyword_extractor.extract_entities_and_actions(text):
+                log_message(f"{name}: 兩種實現的結果不一致")
+            legacy_ms = time_call(legacy_extract_entities_and_actions, text, repeat=repeat)
+            precompiled_ms = time_call(keyword_extractor.extract_entities_and_actions, text, repeat=repeat)
+            log_message(f"{name:<16}{len(text):>8}{legacy_ms:>16.3f}{precompiled_ms:>16.3f}{legacy_ms / precompiled_ms:>10.2f}")
+    finally:
+        keyword_extractor.log_message = extractor_log
+
+# 從數據庫讀取法規和判例內容作為測試語料
+def load_corpus_texts(min_chars=1000000):
+    import ai_setup
+    laws, cases = ai_setup.load_data_from_db()
+    texts = [row[2] for row in laws + cases if row[2]]
+    if not texts:
+        return []
+    # 語料太小時重複使用，使計時穩定
+    total = sum(len(text) for text in texts)
+    return texts * max(1, min_chars // max(total, 1))
+
+# 分詞器吞吐量：jieba(HMM) / jieba(僅詞典) / 字元二元組
+def benchmark_tokenizers():
+    import ai_setup
+    import text_tokenizer
+
+    texts = load_corpus_texts()
+    if not texts:
+        log_message("數據庫中沒有語料，無法進行分詞器基準測試")
+        return
+    total_chars = sum(len(text) for text in texts)
+    distinct_texts = list(dict.fromkeys(texts))
+
+    # 召回率：法律分類詞按同一分詞器切分後，能否在包含該詞的文檔詞彙中全部找到
+    legal_terms = [term for terms in ai_setup.build_legal_question_classifier().values() for term in terms]
+
+    log_message(f"分詞器基準測試：{len(texts)} 篇文檔，共 {total_chars} 字")
+    log_message(f"{'分詞器':<14}{'耗時(s)':>10}{'字/秒':>14}{'詞數':>12}{'詞彙量':>10}{'法律詞召回':>12}")
+    for name, tokenizer in text_tokenizer.TOKENIZERS.items():
+        tokenizer.cut("預熱分詞詞典")
+        start = time.perf_counter()
+        token_count = 0
+        for text in texts:
+            token_count += len(tokenizer.cut(text))
+        elapsed = time.perf_counter() - start
+
+        vocabulary = set()
+        found = total = 0
+        for text in distinct_texts:
+            doc_tokens = set(tokenizer.cut(text))
+            vocabulary |= doc_tokens
+            for term in legal_terms:
+                if term in text:
+                    total += 1
+                    found += all(token in doc_tokens for token in tokenizer.cut(term))
+        recall = found / total if total else 0.0
+        log_message(f"{name:<14}{elapsed:>10.2f}{total_chars / elapsed:>14.0f}{token_count:>12}{len(vocabulary):>10}{recall:>12.2%}")
+
+# 複製數據庫作為基準測試數據庫：刪除全文搜索索引和同步觸發器，數據重複到每個數據表指定行數
+# 返回存在的全文搜索數據表
+def prepare_benchmark_db(path, rows_per_table):
+    import fts_index
+
+    shutil.copyfile(fts_index.DB_FILE, path)
+    conn = sqlite3.connect(path)
+    tables = [
+        table for table in fts_index.FTS_TABLES
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    ]
+    for table in tables:
+        spec = fts_index.FTS_TABLES[table]
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+        conn.execute(f"DROP TABLE IF EXISTS {spec['fts']}")
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})") if row[1] != "id"]
+        column_list = ", ".join(columns)
+        # 有唯一約束的欄位（如url）在複製時加上隨機後綴
+        unique_columns = set()
+        for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+            if index[2] and index[3] != "pk":
+                unique_columns.update(row[2] for row in conn.execute(f"PRAGMA index_info({index[1]})"))
+        select_list = ", ".join(f"{column} || '#' || abs(random())" if column in unique_columns else column for column in columns)
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        while 0 < count < rows_per_table:
+            conn.execute(f"INSERT INTO {table} ({column_list}) SELECT {select_list} FROM {table} LIMIT {rows_per_table - count}")
+            count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return tables
+
+# 全文搜索分詞模式：索引大小、建立耗時和查詢延遲
+def benchmark_fts_modes(rows_per_table=5000):
+    import ai_setup
+    import fts_index
+
+    if not os.path.exists(fts_index.DB_FILE):
+        log_message("數據庫不存在，無法進行全文搜索基準測試")
+        return
+
+    # 查詢詞：法律分類詞（大多為2個字，unicode61和trigram模式的弱點）
+    terms = list(dict.fromkeys(term for terms in ai_setup.build_legal_question_classifier().values() for term in terms))
+    tmp_dir = tempfile.mkdtemp(prefix="fts_benchmark_")
+
+    try:
+        # 準備不含全文搜索索引的測試數據庫，數據重複到指定行數
+        base_file = os.path.join(tmp_dir, "base.sqlite")
+        tables = prepare_benchmark_db(base_file, rows_per_table)
+        base_size = os.path.getsize(base_file)
+
+        log_message(f"全文搜索基準測試：每個數據表 {rows_per_table} 行，{len(terms)} 個查詢詞")
+        log_message(f"{'分詞模式':<12}{'建立耗時(s)':>12}{'索引大小(KB)':>14}{'平均查詢(ms)':>14}{'命中詞數':>10}{'平均命中行數':>14}")
+        for mode in fts_index.FTS_MODES:
+            mode_file = os.path.join(tmp_dir, f"{mode}.sqlite")
+            shutil.copyfile(base_file, mode_file)
+            conn = sqlite3.connect(mode_file)
+
+            start = time.perf_counter()
+            for table in tables:
+                fts_index.rebuild_fts_index(conn, table, mode)
+            build_seconds = time.perf_counter() - start
+            conn.execute("VACUUM")
+            index_kb = (os.path.getsize(mode_file) - base_size) / 1024
+
+            query_ms = []
+            matched_terms = 0
+            matched_rows = 0
+            for term in terms:
+                expression = fts_index.build_match_expression([term], mode)
+                if expression is None:
+                    continue
+                start = time.perf_counter()
+                hits = conn.execute("SELECT COUNT(*) FROM court_cases_fts WHERE court_cases_fts MATCH ?", (expression,)).fetchone()[0]
+                hits += conn.execute("SELECT COUNT(*) FROM laws_fts WHERE laws_fts MATCH ?", (expression,)).fetchone()[0]
+                query_ms.append((time.perf_counter() - start) * 1000)
+                matched_terms += hits > 0
+                matched_rows += hits
+            conn.close()
+
+            avg_ms = sum(query_ms) / len(query_ms) if query_ms else 0.0
+            avg_rows = matched_rows / len(terms) if terms else 0.0
+            log_message(f"{mode:<12}{build_seconds:>12.2f}{index_kb:>14.0f}{avg_ms:>14.3f}{matched_terms:>10}{avg_rows:>14.1f}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# 產生模擬判決的稀疏詞頻向量：詞頻服從Zipf分布，返回 (文檔ID, 詞頻字典, 向量長度) 的生成函數和CSR矩陣
+def synthetic_judgment_vectors(doc_count, vocabulary_size=50000, terms_per_doc=80, seed=0):
+    import numpy as np
+    from scipy import sparse
+
+    rng = np.random.default_rng(seed)
+    indptr = np.arange(0, (doc_count + 1) * terms_per_doc, terms_per_doc, dtype=np.int64)
+    indices = (rng.zipf(1.3, doc_count * terms_per_doc) % vocabulary_size).astype(np.int32)
+    data = np.ones(doc_count * terms_per_doc, dtype=np.float32)
+    # 同一文檔中重複的詞合併為詞頻
+    matrix = sparse.csr_matrix((data, indices, indptr), shape=(doc_count, vocabulary_size))
+    matrix.sum_duplicates()
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    return matrix, norms
+
+# 稀疏向量相似度引擎 vs 逐篇計算的餘弦相似度（10k / 100k / 1M 篇模擬判決）
+def benchmark_sparse_similarity():
+    import numpy as np
+    import legal_search
+    import token_store
+    import vector_index
+
+    sizes = [int(size) for size in os.environ.get("BENCHMARK_SIMILARITY_SIZES", "10000,100000,1000000").split(",")]
+    candidate_count = 200
+    python_sample = 2000
+    vocabulary = {f"w{i}": i for i in range(50000)}
+    words = list(vocabulary)
+    
+    # 查詢為約15個詞的問題
+    rng = np.random.default_rng(1)
+    question_tokens = [words[i] for i in rng.zipf(1.3, 15) % len(words)]
+    question_vector, question_norm = token_store.build_vector(question_tokens)
+    
+    log_message(f"稀疏向量相似度基準測試：查詢 {len(question_vector)} 個詞，候選 {candidate_count} 篇")
+    log_message(f"{'文檔數':>10}{'建立(s)':>10}{'逐篇/候選(ms)':>16}{'向量化/候選(ms)':>18}{'逐篇/全部(ms)':>16}{'向量化/全部(ms)':>18}{'top10(ms)':>12}")
+    for size in sizes:
+        start = time.perf_counter()
+        matrix, norms = synthetic_judgment_vectors(size)
+        index = vector_index.SparseVectorIndex(vocabulary, matrix, norms, np.arange(size))
+        build_seconds = time.perf_counter() - start
+        
+        # 逐篇計算使用詞頻字典（與舊的重排序方式相同），全部文檔的耗時按樣本推算
+        sample_rows = list(range(min(size, python_sample)))
+        sample_vectors = []
+        for row in sample_rows:
+            begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+            vector = {words[i]: float(w) for i, w in zip(matrix.indices[begin:end], matrix.data[begin:end])}
+            sample_vectors.append((vector, norms[row]))
+        def python_scores(count):
+            return [token_store.cosine_similarity(question_vector, question_norm, vector, norm) for vector, norm in sample_vectors[:count]]
+        def python_counter_scores(count):
+            return [legal_search.calculate_token_similarity(question_tokens, [word for word, c in vector.items() for _ in range(int(c))]) for vector, norm in sample_vectors[:count]]
+        
+        candidates = rng.choice(size, size=min(candidate_count, size), replace=False).tolist()
+        python_candidate_ms = time_call(python_scores, len(candidates), repeat=5)
+        vector_candidate_ms = time_call(index.score, question_vector, question_norm, candidates, repeat=20)
+        python_all_ms = time_call(python_scores, len(sample_rows), repeat=2) * size / len(sample_rows)
+        vector_all_ms = time_call(index.score, question_vector, question_norm, repeat=3)
+        top_ms = time_call(index.top_k, question_vector, question_norm, 10, repeat=3)
+        
+        # 結果必須與逐篇計算一致
+        ids, scores = index.score(question_vector, question_norm, sample_rows[:candidate_count])
+        if not np.allclose(scores, python_scores(len(ids)), atol=1e-6):
+            log_message(f"{size} 篇: 向量化結果與逐篇計算不一致")
+        
+        log_message(f"{size:>10}{build_seconds:>10.2f}{python_candidate_ms:>16.3f}{vector_candidate_ms:>18.3f}{python_all_ms:>16.1f}{vector_all_ms:>18.1f}{top_ms:>12.1f}")
+        if size == sizes[0]:
+            counter_ms = time_call(python_counter_scores, len(candidates), repeat=2)
+            log_message(f"原有 calculate_token_similarity 計算 {len(candidates)} 篇候選: {counter_ms:.1f} ms")
+        del index, matrix
+
+# TF-IDF索引：原JSON格式 vs 二進制 mmap 格式的文件大小、載入時間和首次top-k查詢
+def benchmark_tfidf_index_load():
+    import json
+    import vector_index
+
+    doc_count = int(os.environ.get("BENCHMARK_TFIDF_DOCS", "50000"))
+    matrix, norms = synthetic_judgment_vectors(doc_count)
+    words = [f"w{i}" for i in range(matrix.shape[1])]
+    idf = {word: 1.0 + (i % 100) / 10 for i, word in enumerate(words)}
+    doc_vectors = []
+    for row in range(doc_count):
+        begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+        doc_vectors.append((row + 1, {words[i]: float(w) * idf[words[i]] for i, w in zip(matrix.indices[begin:end], matrix.data[begin:end])}))
+    del matrix
+    query = {words[i]: 1 for i in (1, 5, 20, 300, 4000)}
+    tmp_dir = tempfile.mkdtemp(prefix="tfidf_benchmark_")
+
+    try:
+        # 原格式（只包含TF-IDF權重，不含原文和分詞結果，實際文件會更大）
+        json_file = os.path.join(tmp_dir, "tfidf_index.json")
+        start = time.perf_counter()
+        with open(json_file, "w", encoding="utf-8") as f:
+            json.dump({"documents": [{"id": doc_id, "tfidf": vector} for doc_id, vector in doc_vectors], "idf": idf}, f, ensure_ascii=False)
+        json_save = time.perf_counter() - start
+
+        binary_dir = os.path.join(tmp_dir, "tfidf_index")
+        start = time.perf_counter()
+        vector_index.save_tfidf_index(binary_dir, doc_vectors, idf)
+        binary_save = time.perf_counter() - start
+        binary_size = sum(os.path.getsize(os.path.join(binary_dir, name)) for name in os.listdir(binary_dir))
+        del doc_vectors
+
+        start = time.perf_counter()
+        with open(json_file, encoding="utf-8") as f:
+            data = json.load(f)
+        json_load = time.perf_counter() - start
+        start = time.perf_counter()
+        weights = {word: count * data["idf"][word] for word, count in query.items()}
+        query_norm = sum(weight * weight for weight in weights.values()) ** 0.5
+        scores = []
+        for doc in data["documents"]:
+            vector = doc["tfidf"]
+            doc_norm = sum(weight * weight for weight in vector.values()) ** 0.5
+            dot = sum(weight * vector.get(word, 0) for word, weight in weights.items())
+            scores.append((dot / (doc_norm * query_norm) if doc_norm else 0, doc["id"]))
+        json_top = sorted(scores, reverse=True)[:10]
+        json_query = time.perf_counter() - start
+        del data, scores
+
+        start = time.perf_counter()
+        index = vector_index.load_tfidf_index(binary_dir)
+        binary_load = time.perf_counter() - start
+        start = time.perf_counter()
+        binary_top = index.search(list(query), 10)
+        binary_query = time.perf_counter() - start
+
+        if [doc_id for score, doc_id in json_top if score > 0][:3] != [doc_id for doc_id, score in binary_top][:3]:
+            log_message("兩種格式的top-k結果不一致")
+
+        log_message(f"TF-IDF索引基準測試：{doc_count} 篇模擬判決")
+        log_message(f"{'格式':<10}{'大小(MB)':>10}{'保存(s)':>10}{'載入(s)':>10}{'首次top10(s)':>14}")
+        log_message(f"{'JSON':<10}{os.path.getsize(json_file) / 1048576:>10.1f}{json_save:>10.2f}{json_load:>10.3f}{json_query:>14.3f}")
+        log_message(f"{'mmap':<10}{binary_size / 1048576:>10.1f}{binary_save:>10.2f}{binary_load:>10.4f}{binary_query:>14.3f}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# 稀疏向量索引：搜索時從數據庫詞頻向量建立 vs 離線保存後以 mmap 載入的耗時
+def benchmark_vector_index_load():
+    import json
+    import token_store
+    import vector_index
+
+    doc_count = int(os.environ.get("BENCHMARK_VECTOR_DOCS", "50000"))
+    matrix, norms = synthetic_judgment_vectors(doc_count)
+    words = [f"w{i}" for i in range(matrix.shape[1])]
+    query = {words[i]: 1 for i in (1, 5, 20, 300, 4000)}
+    query_norm = len(query) ** 0.5
+    tmp_dir = tempfile.mkdtemp(prefix="vector_benchmark_")
+
+    try:
+        # 模擬數據庫中保存的詞頻向量
+        conn = sqlite3.connect(os.path.join(tmp_dir, "vectors.sqlite"))
+        token_store.ensure_token_table(conn)
+        rows = []
+        for row in range(doc_count):
+            begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+            vector = {words[i]: int(c) for i, c in zip(matrix.indices[begin:end], matrix.data[begin:end])}
+            rows.append(("case", row + 1, token_store.TOKENIZER_VERSION, float(norms[row]), json.dumps(vector)))
+        conn.executemany("INSERT INTO document_vectors VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        del rows, matrix
+
+        # 原方式：首次重排序時在搜索線程中從數據庫建立
+        start = time.perf_counter()
+        db_index = vector_index.SparseVectorIndex.from_vectors(token_store.iter_document_vectors(conn, "case"))
+        db_build = time.perf_counter() - start
+
+        # 離線保存（ai_setup.py），啟動時以 mmap 載入
+        index_dir = os.path.join(tmp_dir, "cases_vector_index")
+        start = time.perf_counter()
+        vector_index.save_vector_index(index_dir, token_store.iter_document_vectors(conn, "case"))
+        save_seconds = time.perf_counter() - start
+        conn.close()
+        index_size = sum(os.path.getsize(os.path.join(index_dir, name)) for name in os.listdir(index_dir))
+
+        start = time.perf_counter()
+        mmap_index = vector_index.load_vector_index(index_dir)
+        mmap_load = time.perf_counter() - start
+        start = time.perf_counter()
+        mmap_top = mmap_index.top_k(query, query_norm, 10)
+        mmap_query = time.perf_counter() - start
+
+        db_top = db_index.top_k(query, query_norm, 10)
+        if [doc_id for doc_id, score in db_top] != [doc_id for doc_id, score in mmap_top]:
+            log_message("兩種載入方式的top-k結果不一致")
+
+        log_message(f"稀疏向量索引基準測試：{doc_count} 篇模擬判決，索引大小 {index_size / 1048576:.1f} MB")
+        log_message(f"{'方式':<12}{'離線保存(s)':>12}{'載入(s)':>10}{'首次top10(s)':>14}")
+        log_message(f"{'數據庫建立':<12}{'-':>12}{db_build:>10.3f}{'-':>14}")
+        log_message(f"{'mmap':<12}{save_seconds:>12.2f}{mmap_load:>10.4f}{mmap_query:>14.3f}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# 搜索結果模式：完整內容 vs 摘要的響應大小和序列化耗時
+def benchmark_result_payload():
+    import json
+    import ai_setup
+    import legal_search
+
+    # 基準測試時不寫日誌，避免I/O干擾計時
+    search_log = legal_search.log_message
+    legal_search.log_message = lambda message: None
+
+    terms = list(dict.fromkeys(term for terms in ai_setup.build_legal_question_classifier().values() for term in terms))
+    log_message(f"搜索結果模式基準測試：{len(terms)} 個查詢詞，每次返回最多10條法規和10條判例")
+    log_message(f"{'模式':<10}{'平均大小(KB)':>14}{'平均序列化(ms)':>16}{'平均查詢(ms)':>14}")
+    for mode in legal_search.RESULT_MODES:
+        total_bytes = 0
+        serialize_ms = 0.0
+        query_ms = 0.0
+        for term in terms:
+            start = time.perf_counter()
+            result = {
+                "laws": legal_search.search_laws([term], None, 10, mode),
+                "cases": legal_search.search_cases([term], None, 10, mode)
+            }
+            query_ms += (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+            serialize_ms += (time.perf_counter() - start) * 1000
+            total_bytes += len(payload)
+        log_message(f"{mode:<10}{total_bytes / len(terms) / 1024:>14.2f}{serialize_ms / len(terms):>16.3f}{query_ms / len(terms):>14.3f}")
+    legal_search.log_message = search_log
+
+# 比較問題關鍵詞全部以 OR 查詢和經查詢計劃刪減後的第一階段檢索耗時
+def benchmark_query_planner(repeat=20):
+    import legal_search
+
+    # 基準測試時不寫日誌，避免I/O干擾計時
+    search_log = legal_search.log_message
+    legal_search.log_message = lambda message: None
+
+    keyword_extractor = legal_search.load_keyword_extractor()
+    if not keyword_extractor:
+        legal_search.log_message = search_log
+        return
+
+    questions = [
+        "我不小心撞到路人，要怎麼樣無罪?",
+        "如果我的鄰居深夜製造噪音，我可以採取什麼法律行動?",
+        "我的房東未經我同意就進入我的租屋處，這違法嗎?",
+        "我的公司拖欠薪資三個月了，我該怎麼辦?",
+        "如果我收到交通罰單但認為不合理，有什麼申訴管道?"
+    ]
+    log_message(f"查詢計劃基準測試：{len(questions)} 個問題，每個查詢重複 {repeat} 次")
+    log_message(f"{'文檔類型':<8}{'原詞數':>8}{'計劃詞數':>10}{'原查詢(ms)':>12}{'計劃查詢(ms)':>14}{'原候選數':>10}{'計劃候選數':>12}")
+    question_keywords = [legal_search.collect_keywords(keyword_extractor.analyze_question(question)) for question in questions]
+    for doc_type, pool in ((legal_search.get_law_doc_type(), legal_search.LAW_CANDIDATE_POOL), ("case", legal_search.CASE_CANDIDATE_POOL)):
+        planner = legal_search.get_query_planner(doc_type)
+        totals = [0, 0, 0.0, 0.0, 0, 0]
+        for keywords in question_keywords:
+            terms = [term for term, df in planner.plan(keywords).terms]
+            totals[0] += len(keywords)
+            totals[1] += len(terms)
+            totals[2] += time_call(legal_search.search_candidates, doc_type, keywords, None, pool, repeat=repeat)
+            totals[3] += time_call(legal_search.search_candidates, doc_type, terms, None, pool, repeat=repeat)
+            totals[4] += len(legal_search.search_candidates(doc_type, keywords, None, pool))
+            totals[5] += len(legal_search.search_candidates(doc_type, terms, None, pool))
+        n = len(question_keywords)
+        log_message(
+            f"{doc_type:<8}{totals[0] / n:>8.1f}{totals[1] / n:>10.1f}{totals[2] / n:>12.3f}"
+            f"{totals[3] / n:>14.3f}{totals[4] / n:>10.1f}{totals[5] / n:>12.1f}"
+        )
+    legal_search.log_message = search_log
+
+# 比較建立二級索引前後的過濾和日期範圍查詢（查詢計劃和平均耗時）
+def benchmark_index_plans(rows_per_table=100000, repeat=20):
+    import fts_index
+    import legal_search
+    import db_migrations
+
+    if not os.path.exists(fts_index.DB_FILE):
+        log_message("數據庫不存在，無法進行索引基準測試")
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix="index_benchmark_")
+    try:
+        db_file = os.path.join(tmp_dir, "index.sqlite")
+        prepare_benchmark_db(db_file, rows_per_table)
+        conn = sqlite3.connect(db_file)
+        # 複製的數據分類和日期相同，改為隨機的20個分類和2000年起的日期，使過濾條件有選擇性
+        conn.execute("UPDATE laws SET category = '類別' || (abs(random()) % 20), date = date('2000-01-01', '+' || (abs(random()) % 8766) || ' days')")
+        conn.execute("UPDATE court_cases SET case_type = '類別' || (abs(random()) % 20), date = date('2000-01-01', '+' || (abs(random()) % 8766) || ' days')")
+        conn.commit()
+
+        mode = fts_index.get_fts_mode(conn)
+        law_query = legal_search.SEARCH_TARGETS["law"]["query"]
+        case_query = legal_search.SEARCH_TARGETS["case"]["query"]
+        date_range = ("2010-01-01", "2010-12-31")
+        queries = [
+            ("法規分類列表", law_query.build([], "類別3", 10, mode, None, None)),
+            ("法規分類+日期", law_query.build([], "類別3", 10, mode, None, date_range)),
+            ("法規日期範圍", law_query.build([], None, 10, mode, None, date_range)),
+            ("法規日期(一個月)", law_query.build([], None, 10, mode, None, ("2010-03-01", "2010-03-31"))),
+            ("判決類型+日期", case_query.build([], "類別3", 10, mode, None, date_range)),
+            ("分類鍵集分頁", ("SELECT id FROM laws WHERE category = ? AND id > ? ORDER BY id LIMIT ?", ["類別3", rows_per_table // 2, 10]))
+        ]
+
+        log_message(f"索引基準測試：每個數據表 {rows_per_table} 行，每個查詢重複 {repeat} 次")
+        results = {}
+        for stage in ("無索引", "有索引"):
+            if stage == "有索引":
+                start = time.perf_counter()
+                updated, created = db_migrations.migrate(conn)
+                log_message(f"建立索引 {len(created)} 個，耗時 {time.perf_counter() - start:.2f} 秒")
+            for name, (sql, params) in queries:
+                plan = " / ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+                elapsed = time_call(lambda: conn.execute(sql, params).fetchall(), repeat=repeat)
+                results.setdefault(name, []).append(elapsed)
+                log_message(f"[{stage}] {name}: {elapsed:.3f} ms，{plan}")
+
+        log_message(f"{'查詢':<16}{'無索引(ms)':>12}{'有索引(ms)':>12}{'加速':>8}")
+        for name, (before, after) in results.items():
+            log_message(f"{name:<16}{before:>12.3f}{after:>12.3f}{before / max(after, 1e-6):>8.1f}x")
+        conn.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# 比較 optimized_api 原有的 LIKE '%關鍵詞%' 掃描和FTS5全文搜索（常見詞、罕見詞、不存在的詞和問題關鍵詞）
+def benchmark_like_scan(rows_per_table=100000, repeat=5):
+    import functools
+    import fts_index
+    import legal_search
+    import optimized_api
+
+    if not os.path.exists(fts_index.DB_FILE):
+        log_message("數據庫不存在，無法進行LIKE掃描基準測試")
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix="like_benchmark_")
+    segment = fts_index.segment_for_fts
+    try:
+        db_file = os.path.join(tmp_dir, "like.sqlite")
+        prepare_benchmark_db(db_file, rows_per_table)
+        conn = sqlite3.connect(db_file)
+        # 在千分之一的行中加入罕見詞，使查詢詞的選擇性有高有低
+        rare_term = "假釋撤銷"
+        for table in ("laws", "court_cases"):
+            conn.execute(f"UPDATE {table} SET content = content || '\n{rare_term}' WHERE abs(random()) % 1000 = 0")
+        conn.commit()
+
+        # 複製的行內容相同，建立索引時緩存分詞結果
+        mode = fts_index.get_fts_mode(conn) or fts_index.DEFAULT_FTS_MODE
+        fts_index.segment_for_fts = functools.lru_cache(maxsize=None)(segment)
+        start = time.perf_counter()
+        for table in ("laws", "court_cases"):
+            fts_index.rebuild_fts_index(conn, table, mode)
+        log_message(f"LIKE掃描基準測試：每個數據表 {rows_per_table} 行，分詞模式 {mode}，建立索引耗時 {time.perf_counter() - start:.2f} 秒")
+
+        questions = ["我不小心撞到路人，要怎麼樣無罪?", "傷害他人身體會有什麼刑責?", "我的公司拖欠薪資三個月了，我該怎麼辦?"]
+        queries = [("常見詞", ["傷害"]), ("罕見詞", [rare_term]), ("不存在的詞", ["量子糾纏"])]
+        queries += [(f"問題{i + 1}", optimized_api.extract_keywords(question)) for i, question in enumerate(questions)]
+
+        log_message(f"{'查詢':<10}{'數據表':<14}{'LIKE(ms)':>12}{'FTS5(ms)':>12}{'加速':>10}{'LIKE行數':>10}{'FTS5行數':>10}")
+        for name, keywords in queries:
+            for doc_type, table in (("law", "laws"), ("case", "court_cases")):
+                # optimized_api 原有的查詢：每個關鍵詞 title LIKE / content LIKE，LIMIT 5
+                conditions = " OR ".join("title LIKE ? OR content LIKE ?" for _ in keywords)
+                like_params = [f"%{keyword}%" for keyword in keywords for _ in range(2)]
+                like_sql = f"SELECT * FROM {table} WHERE {conditions} LIMIT 5"
+                fts_sql, fts_params = legal_search.SEARCH_TARGETS[doc_type]["query"].build(keywords, None, 5, mode)
+                like_ms = time_call(lambda: conn.execute(like_sql, like_params).fetchall(), repeat=repeat)
+                fts_ms = time_call(lambda: conn.execute(fts_sql, fts_params).fetchall(), repeat=repeat)
+                like_rows = len(conn.execute(like_sql, like_params).fetchall())
+                fts_rows = len(conn.execute(fts_sql, fts_params).fetchall())
+                log_message(f"{name:<10}{table:<14}{like_ms:>12.3f}{fts_ms:>12.3f}{like_ms / max(fts_ms, 1e-6):>9.1f}x{like_rows:>10}{fts_rows:>10}")
+        conn.close()
+    finally:
+        fts_index.segment_for_fts = segment
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# 所有基準測試
+BENCHMARKS = {
+    "entity_regex": benchmark_entity_regex,
+    "tokenizers": benchmark_tokenizers,
+    "fts_modes": benchmark_fts_modes,
+    "sparse_similarity": benchmark_sparse_similarity,
+    "tfidf_index_load": benchmark_tfidf_index_load,
+    "vector_index_load": benchmark_vector_index_load,
+    "result_payload": benchmark_result_payload,
+    "query_planner": benchmark_query_planner,
+    "index_plans": benchmark_index_plans,
+    "like_scan": benchmark_like_scan
+}
+
+# 主函數
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS.keys())
+    for name in names:
+        if name not in BENCHMARKS:
+            log_message(f"未知的基準測試: {name}，可用: {', '.join(BENCHMARKS.keys())}")
+            continue
+        log_message(f"開始基準測試: {name}")
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
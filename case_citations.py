@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 裁判字號解析
+# 解析「最高法院110年度台上字第1234號」等裁判字號，以 (年度, 字別, 號次) 的複合索引直接查得判決，
+# court_cases 的 year / case_type / case_number 欄位分別保存司法院資料的 JYEAR / JCASE / JNO
+# 用法: python case_citations.py，為現有數據庫建立複合索引並顯示查詢計劃
+
+import os
+import re
+import sqlite3
+from datetime import datetime
+from law_articles import NUMBER_PATTERN, parse_number
+
+# 設定基本參數
+DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
+DB_FILE = os.path.join(DB_DIR, "legal_db.sqlite")
+LOG_FILE = os.path.join(DB_DIR, "case_citations_log.txt")
+
+# 裁判字號：法院名稱（可省略）、年度、字別、號次，如「臺灣高等法院臺中分院 109 年度上訴字第 56 號」
+CASE_CITATION_RE = re.compile(
+    rf"(?:(?P<court>[\u4e00-\u9fff]{{2,16}}?(?:法院|分院)))?[ \t　]*"
+    rf"(?P<year>{NUMBER_PATTERN})[ \t　]*年度?[ \t　]*"
+    rf"(?P<word>[\u4e00-\u9fff]{{1,8}}?)[ \t　]*字[ \t　]*"
+    rf"第?[ \t　]*(?P<number>{NUMBER_PATTERN})[ \t　]*號"
+)
+
+# 司法院裁判書JID（如「TPSV,110,台上,1234,20210825,1」）前三個字母的法院代碼
+JID_COURTS = {
+    "TPC": "司法院",
+    "TPS": "最高法院",
+    "TPA": "最高行政法院",
+    "TPP": "懲戒法院",
+    "TPH": "臺灣高等法院",
+    "TCH": "臺灣高等法院臺中分院",
+    "TNH": "臺灣高等法院臺南分院",
+    "KSH": "臺灣高等法院高雄分院",
+    "HLH": "臺灣高等法院花蓮分院",
+    "KMH": "福建高等法院金門分院",
+    "TPB": "臺北高等行政法院",
+    "TCB": "臺中高等行政法院",
+    "KSB": "高雄高等行政法院",
+    "IPC": "智慧財產及商業法院",
+    "TPD": "臺灣臺北地方法院",
+    "SLD": "臺灣士林地方法院",
+    "PCD": "臺灣新北地方法院",
+    "ILD": "臺灣宜蘭地方法院",
+    "KLD": "臺灣基隆地方法院",
+    "TYD": "臺灣桃園地方法院",
+    "SCD": "臺灣新竹地方法院",
+    "MLD": "臺灣苗栗地方法院",
+    "TCD": "臺灣臺中地方法院",
+    "CHD": "臺灣彰化地方法院",
+    "NTD": "臺灣南投地方法院",
+    "ULD": "臺灣雲林地方法院",
+    "CYD": "臺灣嘉義地方法院",
+    "TND": "臺灣臺南地方法院",
+    "KSD": "臺灣高雄地方法院",
+    "CTD": "臺灣橋頭地方法院",
+    "HLD": "臺灣花蓮地方法院",
+    "TTD": "臺灣臺東地方法院",
+    "PTD": "臺灣屏東地方法院",
+    "PHD": "臺灣澎湖地方法院",
+    "KMD": "福建金門地方法院",
+    "LCD": "福建連江地方法院",
+    "KSY": "臺灣高雄少年及家事法院"
+}
+
+# 字別和法院名稱中「台」和「臺」混用，查詢時兩種寫法都匹配
+TAI_VARIANTS = ("台", "臺")
+
+# 確保目錄存在
+os.makedirs(DB_DIR, exist_ok=True)
+
+# 記錄函數
+def log_message(message):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"[{timestamp}] {message}\n")
+    print(f"[{timestamp}] {message}")
+
+# 創建 (年度, 字別, 號次) 複合索引
+def ensure_citation_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_court_cases_citation ON court_cases (year, case_type, case_number)")
+
+# 字別的全部寫法（「台上」和「臺上」）
+def word_variants(word):
+    variants = {word}
+    for old, new in (TAI_VARIANTS, TAI_VARIANTS[::-1]):
+        variants.add(word.replace(old, new))
+    return sorted(variants)
+
+# 解析文本中的全部裁判字號，年度和號次轉為與司法院資料相同的不補零數字字串
+def parse_case_citations(text):
+    citations = []
+    for match in CASE_CITATION_RE.finditer(text or ""):
+        year = parse_number(match.group("year"))
+        number = parse_number(match.group("number"))
+        if year is None or number is None:
+            continue
+        court = match.group("court")
+        citations.append({
+            "citation": match.group(0).strip(),
+            "court": court,
+            "year": str(year),
+            "case_word": match.group("word"),
+            "case_number": str(number),
+            "start": match.start(),
+            "end": match.end()
+        })
+    return citations
+
+# 由裁判書JID的法院代碼取得法院名稱，非JID格式或代碼未知時返回空字串
+def jid_court(case_id):
+    return JID_COURTS.get((case_id or "").split(",")[0][:3].upper(), "")
+
+# 判決標題中的法院名稱（年度之前的部分），只有樣本數據等標題包含法院名稱時有效
+# 司法院資料的標題為 JTITLE（案由，如「損害賠償」），法院名稱需從 JID 取得
+def title_court(title, year):
+    position = (title or "").find(year)
+    return title[:position].strip() if position > 0 else ""
+
+# 判決是否屬於引用中的法院：優先使用JID的法院代碼，其次使用標題中的法院名稱
+# 引用中的法院名稱可省略前綴（如「臺北地方法院」、「臺中分院」），兩者以後綴比較
+# 引用沒有法院名稱，或判決的法院無法確定時都符合（不因缺少資料而丟棄判決）
+def matches_court(citation, title, case_id=None):
+    if not citation["court"]:
+        return True
+    court = (jid_court(case_id) or title_court(title, citation["year"])).replace("台", "臺")
+    cited = citation["court"].replace("台", "臺")
+    return not court or court.endswith(cited) or cited.endswith(court)
+
+# 查詢裁判字號對應的判決，columns 為返回欄位，返回 [文檔字典]
+# 同一字號可能屬於不同法院，引用有法院名稱時按判決的JID法院代碼（或標題）過濾
+def lookup_case_citation(conn, citation, columns):
+    words = word_variants(citation["case_word"])
+    placeholders = ",".join("?" for _ in words)
+    cursor = conn.execute(
+        f"SELECT case_id, title, {', '.join(columns)} FROM court_cases WHERE year = ? AND case_type IN ({placeholders}) AND case_number = ? ORDER BY id",
+        [citation["year"]] + words + [citation["case_number"]]
+    )
+    return [
+        dict(zip(columns, row[2:])) for row in cursor.fetchall()
+        if matches_court(citation, row[1], row[0])
+    ]
+
+# 主函數：建立複合索引並顯示字號查詢的查詢計劃
+def main():
+    log_message("開始建立裁判字號索引")
+
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        ensure_citation_index(conn)
+        conn.commit()
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM court_cases WHERE year = ? AND case_type IN (?, ?) AND case_number = ?",
+            ("110", "台上", "臺上", "1234")
+        ).fetchall()
+        log_message(f"字號查詢計劃: {' / '.join(row[-1] for row in plan)}")
+    except sqlite3.OperationalError as e:
+        log_message(f"建立裁判字號索引失敗: {str(e)}")
+    conn.close()
+
+    log_message("裁判字號索引建立完成")
+
+if __name__ == "__main__":
+    main()
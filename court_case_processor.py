@@ -6,6 +6,9 @@ import json
 import codecs
 import sqlite3
 from datetime import datetime
+import token_store
+import fts_index
+import db_migrations
 
 # 設定基本參數
 DATA_DIR = "/home/ubuntu/legal-ai-system/data/raw/cases"
@@ -47,7 +50,7 @@ def process_court_case_data(raw_data, source_file):
             case_id = raw_data.get("id") or raw_data.get("JID") or ""
             title = raw_data.get("title") or raw_data.get("JTITLE") or ""
             content = raw_data.get("content") or raw_data.get("JFULL") or ""
-            date = raw_data.get("date") or raw_data.get("JDATE") or ""
+            date = db_migrations.normalize_date(raw_data.get("date") or raw_data.get("JDATE") or "")
             case_number = raw_data.get("JNO") or ""
             case_type = raw_data.get("JCASE") or ""
             year = raw_data.get("JYEAR") or ""
@@ -76,7 +79,7 @@ def process_court_case_data(raw_data, source_file):
                     case_id = item.get("id") or item.get("JID") or ""
                     title = item.get("title") or item.get("JTITLE") or ""
                     content = item.get("content") or item.get("JFULL") or ""
-                    date = item.get("date") or item.get("JDATE") or ""
+                    date = db_migrations.normalize_date(item.get("date") or item.get("JDATE") or "")
                     case_number = item.get("JNO") or ""
                     case_type = item.get("JCASE") or ""
                     year = item.get("JYEAR") or ""
@@ -138,41 +141,15 @@ def import_to_sqlite(data):
         )
         ''')
         
-        # 創建全文搜索索引
-        cursor.execute('''
-        CREATE VIRTUAL TABLE IF NOT EXISTS court_cases_fts USING fts5(
-            title, content, case_type,
-            content='court_cases',
-            content_rowid='id'
-        )
-        ''')
-        
-        # 創建觸發器以保持FTS索引同步
-        cursor.execute('''
-        CREATE TRIGGER IF NOT EXISTS court_cases_ai AFTER INSERT ON court_cases BEGIN
-            INSERT INTO court_cases_fts(rowid, title, content, case_type)
-            VALUES (new.id, new.title, new.content, new.case_type);
-        END
-        ''')
+        # 創建全文搜索索引和同步觸發器（分詞模式見 fts_index.py）
+        fts_index.ensure_fts_schema(conn, "court_cases")
         
-        cursor.execute('''
-        CREATE TRIGGER IF NOT EXISTS court_cases_ad AFTER DELETE ON court_cases BEGIN
-            INSERT INTO court_cases_fts(court_cases_fts, rowid, title, content, case_type)
-            VALUES ('delete', old.id, old.title, old.content, old.case_type);
-        END
-        ''')
-        
-        cursor.execute('''
-        CREATE TRIGGER IF NOT EXISTS court_cases_au AFTER UPDATE ON court_cases BEGIN
-            INSERT INTO court_cases_fts(court_cases_fts, rowid, title, content, case_type)
-            VALUES ('delete', old.id, old.title, old.content, old.case_type);
-            INSERT INTO court_cases_fts(rowid, title, content, case_type)
-            VALUES (new.id, new.title, new.content, new.case_type);
-        END
-        ''')
+        # 裁判字號、案件類型和日期的索引（見 db_migrations.py）
+        db_migrations.ensure_secondary_indexes(conn)
         
         # 導入數據
         success_count = 0
+        new_rows = []
         for case in data:
             try:
                 cursor.execute('''
@@ -193,12 +170,16 @@ def import_to_sqlite(data):
                 
                 if cursor.rowcount > 0:
                     success_count += 1
+                    new_rows.append((cursor.lastrowid, case.get("content", "")))
             except Exception as e:
                 log_message(f"導入單條裁判書數據失敗: {str(e)}")
         
         conn.commit()
         log_message(f"成功導入 {success_count}/{len(data)} 條裁判書數據到SQLite數據庫")
         
+        # 保存新裁判書的詞頻向量，搜索時不必重新分詞
+        token_store.store_document_tokens(conn, "case", new_rows)
+        
         # 測試數據庫
         cursor.execute("SELECT COUNT(*) FROM court_cases")
         count = cursor.fetchone()[0]
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 數據庫結構遷移：過濾欄位的二級索引和日期格式統一
+# 類別、案件類型和日期過濾原本需要掃描整個數據表；建立索引後列表查詢按索引順序讀取，
+# 日期範圍過濾要求日期為 YYYY-MM-DD 格式（字串比較與日期順序一致）
+# 用法: python db_migrations.py，可重複執行
+
+import os
+import re
+import time
+import sqlite3
+from datetime import datetime
+import fts_index
+import case_citations
+import token_store
+
+# 設定基本參數
+DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
+DB_FILE = os.path.join(DB_DIR, "legal_db.sqlite")
+LOG_FILE = os.path.join(DB_DIR, "db_migrations_log.txt")
+
+# 二級索引：(索引名稱, 數據表, 欄位)
+# 過濾欄位單獨的索引按 (欄位, rowid) 排序，「過濾 + ORDER BY id」的列表和分頁不需要排序；
+# (過濾欄位, 日期) 和日期索引用於日期範圍過濾
+SECONDARY_INDEXES = [
+    ("idx_laws_category", "laws", ["category"]),
+    ("idx_laws_category_date", "laws", ["category", "date"]),
+    ("idx_laws_date", "laws", ["date"]),
+    ("idx_court_cases_case_type", "court_cases", ["case_type"]),
+    ("idx_court_cases_case_type_date", "court_cases", ["case_type", "date"]),
+    ("idx_court_cases_date", "court_cases", ["date"]),
+    ("idx_law_articles_category", "law_articles", ["category"])
+]
+
+# 需要統一格式的日期欄位
+DATE_COLUMNS = [("laws", "date"), ("court_cases", "date"), ("law_articles", "date")]
+
+ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+COMPACT_DATE_RE = re.compile(r"^(\d{4})[/.\-]?(\d{1,2})[/.\-]?(\d{1,2})$")
+
+# 確保目錄存在
+os.makedirs(DB_DIR, exist_ok=True)
+
+# 記錄函數
+def log_message(message):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"[{timestamp}] {message}\n")
+    print(f"[{timestamp}] {message}")
+
+# 將日期轉為 YYYY-MM-DD（支持 20210623、2021/6/23、2021.06.23 等），無法識別或日期無效時原樣返回
+def normalize_date(value):
+    if not value:
+        return value
+    value = str(value).strip()
+    if ISO_DATE_RE.match(value):
+        return value
+    match = COMPACT_DATE_RE.match(value)
+    # 沒有分隔符時必須是8位數字（「2021123」無法確定月和日）
+    if not match or (value.isdigit() and len(value) != 8):
+        return value
+    year, month, day = match.groups()
+    normalized = f"{year}-{int(month):02d}-{int(day):02d}"
+    # 「2021-06」等不完整或無效的日期原樣返回
+    return normalized if is_iso_date(normalized) else value
+
+# 是否為有效的 YYYY-MM-DD 日期
+def is_iso_date(value):
+    if not ISO_DATE_RE.match(value or ""):
+        return False
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+def table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+# 建立二級索引（只處理已存在的數據表），返回新建的索引名稱
+def ensure_secondary_indexes(conn):
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    created = []
+    for name, table, columns in SECONDARY_INDEXES:
+        if name in existing or not table_exists(conn, table):
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        created.append(name)
+    if table_exists(conn, "court_cases"):
+        case_citations.ensure_citation_index(conn)
+    return created
+
+# 將已有數據的日期統一為 YYYY-MM-DD，返回更新的行數
+def normalize_dates(conn):
+    # 更新會觸發全文搜索索引的同步觸發器（bigram模式需要 fts_segment 函數）
+    fts_index.register_functions(conn)
+    updated = 0
+    for table, column in DATE_COLUMNS:
+        if not table_exists(conn, table):
+            continue
+        rows = conn.execute(
+            f"SELECT id, {column} FROM {table} WHERE {column} IS NOT NULL AND {column} != '' AND {column} NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+        ).fetchall()
+        changes = [(normalize_date(value), row_id) for row_id, value in rows if normalize_date(value) != value]
+        conn.executemany(f"UPDATE {table} SET {column} = ? WHERE id = ?", changes)
+        updated += len(changes)
+    return updated
+
+# 執行全部遷移並更新查詢優化器的統計信息
+def migrate(conn):
+    updated = normalize_dates(conn)
+    created = ensure_secondary_indexes(conn)
+    # 重排序改用詞頻向量後不再讀取的分詞序列表
+    if token_store.drop_token_streams(conn):
+        log_message("刪除不再使用的 document_tokens 分詞序列表，可運行 VACUUM 回收空間")
+    conn.execute("ANALYZE")
+    conn.commit()
+    return updated, created
+
+# 主函數
+def main():
+    log_message("開始數據庫結構遷移")
+
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        start = time.perf_counter()
+        updated, created = migrate(conn)
+        log_message(f"統一日期格式 {updated} 行，新建索引: {', '.join(created) or '無'}，耗時 {time.perf_counter() - start:.2f} 秒")
+    except sqlite3.OperationalError as e:
+        log_message(f"數據庫結構遷移失敗: {str(e)}")
+    conn.close()
+
+    log_message("數據庫結構遷移完成")
+
+if __name__ == "__main__":
+    main()
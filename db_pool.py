@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# 設定基本參數
+DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
+LOG_FILE = os.path.join(DB_DIR, "db_pool_log.txt")
+
+# 連接池大小和取得連接的等待時間（秒）
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+
+# 只讀查詢使用的PRAGMA（按順序執行，query_only 必須最後設定）
+READ_PRAGMAS = {
+    "journal_mode": os.environ.get("DB_JOURNAL_MODE", "WAL"),
+    "mmap_size": int(os.environ.get("DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.environ.get("DB_CACHE_SIZE", str(-64 * 1024))),  # 負數表示KiB
+    "temp_store": os.environ.get("DB_TEMP_STORE", "MEMORY"),
+    "query_only": os.environ.get("DB_QUERY_ONLY", "ON")
+}
+
+# 確保目錄存在
+os.makedirs(DB_DIR, exist_ok=True)
+
+# 記錄函數
+def log_message(message):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"[{timestamp}] {message}\n")
+    print(f"[{timestamp}] {message}")
+
+# SQLite連接池：連接在首次需要時建立並套用PRAGMA，之後重複使用
+class ConnectionPool:
+    def __init__(self, db_file, size=DB_POOL_SIZE, pragmas=None, timeout=DB_POOL_TIMEOUT):
+        self.db_file = db_file
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(READ_PRAGMAS if pragmas is None else pragmas)
+        # 後進先出，優先重複使用頁面緩存較熱的連接
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._acquired = 0
+        self._reused = 0
+        self._waited = 0
+        self._in_use = 0
+
+    # 建立新連接並套用PRAGMA
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            try:
+                conn.execute(f"PRAGMA {name} = {value}")
+            except sqlite3.DatabaseError as e:
+                # 例如只讀文件系統無法切換到WAL，不影響查詢
+                log_message(f"設定 PRAGMA {name} = {value} 失敗: {str(e)}")
+        return conn
+
+    # 取得連接：優先使用閒置連接，未達上限時新建，否則等待歸還（timeout 為 None 時使用連接池的等待時間）
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            conn = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                reused = False
+            else:
+                with self._lock:
+                    self._waited += 1
+                try:
+                    conn = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"等待數據庫連接超時（{timeout:.3f} 秒）")
+                reused = True
+
+        with self._lock:
+            self._acquired += 1
+            self._reused += reused
+            self._in_use += 1
+        return conn
+
+    # 歸還連接
+    def release(self, conn):
+        with self._lock:
+            self._in_use -= 1
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    # 以上下文管理器的方式使用連接
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    # 關閉所有閒置連接
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    # 連接池使用統計
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._acquired,
+                "reused": self._reused,
+                "waited": self._waited,
+                "reuse_rate": round(self._reused / self._acquired, 4) if self._acquired else 0.0,
+                "pragmas": dict(self.pragmas)
+            }
@@ -5,6 +5,10 @@ import os
 import json
 import sqlite3
 from datetime import datetime
+import token_store
+import fts_index
+import law_articles
+import db_migrations
 
 # 設定基本參數
 PROCESSED_DIR = "/home/ubuntu/legal-ai-system/data/processed/laws"
@@ -44,38 +48,15 @@ def setup_database():
         )
         ''')
         
-        # 創建全文搜索索引
-        cursor.execute('''
-        CREATE VIRTUAL TABLE IF NOT EXISTS laws_fts USING fts5(
-            title, content, source, category,
-            content='laws',
-            content_rowid='id'
-        )
-        ''')
-        
-        # 創建觸發器以保持FTS索引同步
-        cursor.execute('''
-        CREATE TRIGGER IF NOT EXISTS laws_ai AFTER INSERT ON laws BEGIN
-            INSERT INTO laws_fts(rowid, title, content, source, category)
-            VALUES (new.id, new.title, new.content, new.source, new.category);
-        END
-        ''')
+        # 創建全文搜索索引和同步觸發器（分詞模式見 fts_index.py）
+        fts_mode = fts_index.ensure_fts_schema(conn, "laws")
+        log_message(f"全文搜索索引分詞模式: {fts_mode}")
         
-        cursor.execute('''
-        CREATE TRIGGER IF NOT EXISTS laws_ad AFTER DELETE ON laws BEGIN
-            INSERT INTO laws_fts(laws_fts, rowid, title, content, source, category)
-            VALUES ('delete', old.id, old.title, old.content, old.source, old.category);
-        END
-        ''')
+        # 創建條文表（法規按條拆分，見 law_articles.py）
+        law_articles.ensure_article_table(conn)
         
-        cursor.execute('''
-        CREATE TRIGGER IF NOT EXISTS laws_au AFTER UPDATE ON laws BEGIN
-            INSERT INTO laws_fts(laws_fts, rowid, title, content, source, category)
-            VALUES ('delete', old.id, old.title, old.content, old.source, old.category);
-            INSERT INTO laws_fts(rowid, title, content, source, category)
-            VALUES (new.id, new.title, new.content, new.source, new.category);
-        END
-        ''')
+        # 類別和日期的索引（見 db_migrations.py）
+        db_migrations.ensure_secondary_indexes(conn)
         
         conn.commit()
         log_message("成功創建數據庫和表")
@@ -120,12 +101,13 @@ def import_to_sqlite(conn, laws):
     try:
         cursor = conn.cursor()
         success_count = 0
+        new_rows = []
         
         for law in laws:
             # 準備數據
             title = law.get("title", "")
             url = law.get("url", "")
-            date = law.get("date", "")
+            date = db_migrations.normalize_date(law.get("date", ""))
             content = law.get("content", "")
             source = law.get("source", "")
             category = law.get("category", "")
@@ -139,9 +121,16 @@ def import_to_sqlite(conn, laws):
             
             if cursor.rowcount > 0:
                 success_count += 1
+                new_rows.append((cursor.lastrowid, content))
         
         conn.commit()
         log_message(f"成功導入 {success_count}/{len(laws)} 條法規數據到SQLite數據庫")
+        
+        # 保存新法規的詞頻向量，搜索時不必重新分詞
+        token_store.store_document_tokens(conn, "law", new_rows)
+        
+        # 將新法規拆分為條文
+        law_articles.import_law_articles(conn, [law_id for law_id, content in new_rows])
         return True
     except Exception as e:
         log_message(f"導入數據到SQLite數據庫失敗: {str(e)}")
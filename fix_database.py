@@ -4,6 +4,10 @@
 import os
 import sqlite3
 from datetime import datetime
+import token_store
+import fts_index
+import law_articles
+import db_migrations
 
 # 設定基本參數
 DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
@@ -66,22 +70,8 @@ def create_missing_tables(laws_exists, court_cases_exists):
             )
             ''')
             
-            # 創建全文搜索索引
-            cursor.execute('''
-            CREATE VIRTUAL TABLE IF NOT EXISTS laws_fts USING fts5(
-                title, content, source, category,
-                content='laws',
-                content_rowid='id'
-            )
-            ''')
-            
-            # 創建觸發器以保持FTS索引同步
-            cursor.execute('''
-            CREATE TRIGGER IF NOT EXISTS laws_ai AFTER INSERT ON laws BEGIN
-                INSERT INTO laws_fts(rowid, title, content, source, category)
-                VALUES (new.id, new.title, new.content, new.source, new.category);
-            END
-            ''')
+            # 創建全文搜索索引和同步觸發器
+            fts_index.ensure_fts_schema(conn, "laws")
             
             log_message("laws表創建成功")
         
@@ -104,25 +94,14 @@ def create_missing_tables(laws_exists, court_cases_exists):
             )
             ''')
             
-            # 創建全文搜索索引
-            cursor.execute('''
-            CREATE VIRTUAL TABLE IF NOT EXISTS court_cases_fts USING fts5(
-                title, content, case_type,
-                content='court_cases',
-                content_rowid='id'
-            )
-            ''')
-            
-            # 創建觸發器以保持FTS索引同步
-            cursor.execute('''
-            CREATE TRIGGER IF NOT EXISTS court_cases_ai AFTER INSERT ON court_cases BEGIN
-                INSERT INTO court_cases_fts(rowid, title, content, case_type)
-                VALUES (new.id, new.title, new.content, new.case_type);
-            END
-            ''')
+            # 創建全文搜索索引和同步觸發器
+            fts_index.ensure_fts_schema(conn, "court_cases")
             
             log_message("court_cases表創建成功")
         
+        # 類別、案件類型、日期和裁判字號的索引（見 db_migrations.py）
+        db_migrations.ensure_secondary_indexes(conn)
+        
         conn.commit()
         conn.close()
         
@@ -134,8 +113,9 @@ def create_missing_tables(laws_exists, court_cases_exists):
 # 插入示例數據
 def insert_sample_data():
     try:
-        # 連接到SQLite數據庫
+        # 連接到SQLite數據庫（註冊全文搜索觸發器使用的函數）
         conn = sqlite3.connect(DB_FILE)
+        fts_index.register_functions(conn)
         cursor = conn.cursor()
         
         # 檢查laws表是否為空
@@ -376,6 +356,13 @@ def insert_sample_data():
             log_message(f"成功插入 {len(sample_cases)} 條示例判例數據")
         
         conn.commit()
+        
+        # 為示例數據建立詞頻向量
+        token_store.backfill_document_tokens(conn, "law")
+        token_store.backfill_document_tokens(conn, "case")
+        
+        # 拆分示例法規的條文
+        law_articles.import_law_articles(conn)
         conn.close()
         
         return True
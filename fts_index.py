@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 全文搜索索引管理
+# 用法: python fts_index.py [unicode61|trigram|bigram]，以指定的分詞模式重建 laws_fts、court_cases_fts 和 law_articles_fts
+
+import os
+import sys
+import time
+import sqlite3
+from datetime import datetime
+import text_tokenizer
+
+# 設定基本參數
+DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
+DB_FILE = os.path.join(DB_DIR, "legal_db.sqlite")
+LOG_FILE = os.path.join(DB_DIR, "fts_index_log.txt")
+
+# 全文搜索分詞模式
+#   unicode61: SQLite預設分詞器，連續中文字元視為一個詞，只能匹配完整的字串
+#   trigram:   SQLite三元組分詞器，支持任意子字串匹配，但少於3個字的詞無法使用索引
+#   bigram:    以字元二元組預先切分後建立無內容索引，2個字以上的詞都能以短語方式匹配
+FTS_MODES = ("unicode61", "trigram", "bigram")
+DEFAULT_FTS_MODE = os.environ.get("FTS_MODE", "bigram")
+
+# bigram模式的索引不保存內容，FTS5 snippet()/highlight() 只能用於其他模式
+def has_stored_content(mode):
+    return mode != "bigram"
+
+# 各數據表的全文搜索索引和索引欄位
+FTS_TABLES = {
+    "laws": {"fts": "laws_fts", "columns": ["title", "content", "source", "category"]},
+    "court_cases": {"fts": "court_cases_fts", "columns": ["title", "content", "case_type"]},
+    "law_articles": {"fts": "law_articles_fts", "columns": ["title", "content"]}
+}
+
+# 確保目錄存在
+os.makedirs(DB_DIR, exist_ok=True)
+
+# 記錄函數
+def log_message(message):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"[{timestamp}] {message}\n")
+    print(f"[{timestamp}] {message}")
+
+# 以字元二元組切分文本，詞之間以空格分隔（bigram模式的索引內容和查詢共用）
+def segment_for_fts(text):
+    if not text:
+        return ""
+    tokens = text_tokenizer.TOKENIZERS["bigram"].cut(text_tokenizer.PUNCTUATION_RE.sub(" ", text))
+    return " ".join(token for token in tokens if not token.isspace())
+
+# 註冊bigram模式觸發器使用的SQL函數，寫入數據的連接必須先調用
+def register_functions(conn):
+    conn.create_function("fts_segment", 1, segment_for_fts, deterministic=True)
+
+# 讀取數據庫記錄的分詞模式（舊數據庫沒有記錄時視為unicode61）
+def get_fts_mode(conn):
+    try:
+        row = conn.execute("SELECT value FROM search_settings WHERE name = 'fts_mode'").fetchone()
+        if row:
+            return row[0]
+    except sqlite3.OperationalError:
+        pass
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'laws_fts' OR name = 'court_cases_fts'").fetchone()
+    return "unicode61" if exists else None
+
+# 記錄分詞模式
+def set_fts_mode(conn, mode):
+    conn.execute("CREATE TABLE IF NOT EXISTS search_settings (name TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("INSERT OR REPLACE INTO search_settings (name, value) VALUES ('fts_mode', ?)", (mode,))
+
+# 按分詞模式創建全文搜索索引和同步觸發器
+def create_fts_schema(conn, table, mode):
+    fts = FTS_TABLES[table]["fts"]
+    columns = FTS_TABLES[table]["columns"]
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+
+    if mode == "bigram":
+        # 索引預先切分的文本，不保存內容（查詢結果通過rowid從原表讀取）
+        options = "content=''"
+        new_values = ", ".join(f"fts_segment(new.{column})" for column in columns)
+        old_values = ", ".join(f"fts_segment(old.{column})" for column in columns)
+    elif mode == "trigram":
+        options = f"content='{table}', content_rowid='id', tokenize='trigram'"
+    else:
+        options = f"content='{table}', content_rowid='id'"
+
+    conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({column_list}, {options})")
+
+    # 創建觸發器以保持FTS索引同步
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});
+    END
+    ''')
+
+# 確保全文搜索索引存在：已有索引時沿用其模式，新數據庫使用預設模式
+def ensure_fts_schema(conn, table):
+    register_functions(conn)
+    mode = get_fts_mode(conn) or DEFAULT_FTS_MODE
+    create_fts_schema(conn, table, mode)
+    set_fts_mode(conn, mode)
+    return mode
+
+# 以指定模式重建數據表的全文搜索索引
+def rebuild_fts_index(conn, table, mode):
+    fts = FTS_TABLES[table]["fts"]
+    columns = FTS_TABLES[table]["columns"]
+    column_list = ", ".join(columns)
+
+    register_functions(conn)
+    for suffix in ("ai", "ad", "au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+    conn.execute(f"DROP TABLE IF EXISTS {fts}")
+    create_fts_schema(conn, table, mode)
+
+    if mode == "bigram":
+        segmented = ", ".join(f"fts_segment({column})" for column in columns)
+        conn.execute(f"INSERT INTO {fts}(rowid, {column_list}) SELECT id, {segmented} FROM {table}")
+    else:
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    conn.commit()
+
+# 將關鍵詞轉為FTS5短語（雙引號內的雙引號需重複）
+def quote_phrase(phrase):
+    return '"' + phrase.replace('"', '""') + '"'
+
+# 按分詞模式把關鍵詞轉為 MATCH 表達式中的短語列表
+def build_match_phrases(keywords, mode):
+    phrases = []
+    for keyword in keywords:
+        keyword = (keyword or "").strip()
+        if not keyword:
+            continue
+        if mode == "bigram":
+            segmented = segment_for_fts(keyword)
+            if segmented.strip():
+                phrases.append(quote_phrase(segmented))
+        elif mode == "trigram":
+            # 三元組索引無法匹配少於3個字的詞
+            if len(keyword) >= 3:
+                phrases.append(quote_phrase(keyword))
+        else:
+            phrases.append(quote_phrase(keyword))
+    return list(dict.fromkeys(phrases))
+
+# 按分詞模式構建 MATCH 表達式，沒有可用的詞時返回 None
+def build_match_expression(keywords, mode):
+    phrases = build_match_phrases(keywords, mode)
+    return " OR ".join(phrases) if phrases else None
+
+# 主函數：重建全文搜索索引
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FTS_MODE
+    if mode not in FTS_MODES:
+        log_message(f"未知的分詞模式: {mode}，可用: {', '.join(FTS_MODES)}")
+        return
+
+    log_message(f"開始以 {mode} 模式重建全文搜索索引")
+    conn = sqlite3.connect(DB_FILE)
+    for table in FTS_TABLES:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        if not exists:
+            log_message(f"數據表 {table} 不存在，跳過")
+            continue
+        start = time.perf_counter()
+        rebuild_fts_index(conn, table, mode)
+        log_message(f"重建 {FTS_TABLES[table]['fts']} 完成，耗時 {time.perf_counter() - start:.2f} 秒")
+    set_fts_mode(conn, mode)
+    conn.commit()
+    conn.close()
+
+    log_message("全文搜索索引重建完成，請調用 POST /api/analyzer/reload 以使用新的分詞模式")
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,34 @@ import json
 import jieba
 import jieba.analyse
 import re
-from collections import Counter
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
 from datetime import datetime
+from jieba.analyse.textrank import UndirectWeightedGraph
+from jieba.analyse.tfidf import DEFAULT_IDF
+from legal_term_matcher import LegalTermMatcher
+from stage_timer import StageTimer
+import text_tokenizer
 
 # 設定基本參數
 AI_DIR = "/home/ubuntu/legal-ai-system/backend/ai"
 LOG_FILE = os.path.join(AI_DIR, "keyword_extractor_log.txt")
 
+# 分析模式：full 完整分析；fast 跳過TextRank和實體抽取；minimal 只做法律詞彙匹配
+ANALYSIS_PROFILES = {
+    "full": {"tfidf": True, "textrank": True, "entities": True},
+    "fast": {"tfidf": True, "textrank": False, "entities": False},
+    "minimal": {"tfidf": False, "textrank": False, "entities": False}
+}
+# 由昂貴到便宜排列
+ANALYSIS_PROFILE_ORDER = ["full", "fast", "minimal"]
+# 部署預設的分析模式，可通過環境變量 ANALYSIS_PROFILE 設定
+DEFAULT_ANALYSIS_PROFILE = os.environ.get("ANALYSIS_PROFILE", "full")
+# 問題分析結果緩存的最大條目數
+ANALYSIS_CACHE_SIZE = int(os.environ.get("ANALYSIS_CACHE_SIZE", "1024"))
+
 # 確保目錄存在
 os.makedirs(AI_DIR, exist_ok=True)
 
@@ -47,140 +68,137 @@ def load_legal_question_classifier():
         log_message(f"載入法律問題分類器失敗: {str(e)}")
         return {}
 
-# 將法律關鍵詞添加到jieba詞典
+# 載入語料庫IDF表（由 ai_setup.py 生成），取代jieba內建的通用IDF
+# IDF表不存在時恢復jieba內建IDF（重新載入前可能已載入舊的語料庫IDF表）
+def load_corpus_idf():
+    idf_path = os.path.join(AI_DIR, "legal_idf.txt")
+    extractor = jieba.analyse.default_tfidf
+    if not os.path.exists(idf_path):
+        log_message(f"找不到語料庫IDF表，使用jieba內建IDF: {idf_path}")
+        if extractor.idf_loader.path != DEFAULT_IDF:
+            jieba.analyse.set_idf_path(DEFAULT_IDF)
+        return False
+    try:
+        # 路徑相同時jieba不會重新讀取文件，先清除路徑以便重新載入
+        extractor.idf_loader.path = ""
+        jieba.analyse.set_idf_path(idf_path)
+        log_message(f"成功載入語料庫IDF表，共 {len(extractor.idf_freq)} 個詞")
+        return True
+    except Exception as e:
+        log_message(f"載入語料庫IDF表失敗: {str(e)}")
+        return False
+
+# 將法律關鍵詞添加到jieba詞典，返回 {詞: 添加前的詞頻}（jieba基本詞典中沒有的詞為 None），用於移除時恢復
 def add_legal_keywords_to_jieba(keywords_dict):
+    added = {}
     try:
+        jieba.dt.check_initialized()
         # 將法律關鍵詞添加到jieba詞典
         for keyword in keywords_dict.keys():
             if len(keyword) > 1:  # 只添加長度大於1的詞
+                added[keyword] = jieba.dt.FREQ.get(keyword) or None
                 jieba.add_word(keyword, freq=10000)  # 設置高頻率，確保能被識別
         
         log_message(f"成功將 {len(keywords_dict)} 個法律關鍵詞添加到jieba詞典")
-        return True
     except Exception as e:
         log_message(f"將法律關鍵詞添加到jieba詞典失敗: {str(e)}")
-        return False
+    return added
 
-# 使用jieba進行中文分詞
-def tokenize_text(text):
-    if not text:
-        return []
-    # 移除標點符號和特殊字符
-    text = re.sub(r'[^\w\s]', '', text)
-    # 使用jieba進行分詞
-    words = jieba.cut(text)
-    # 過濾停用詞和空字符
-    stopwords = {'的', '了', '和', '是', '在', '有', '與', '之', '或', '及', '對', '由', '上', '中', '下', '為', '以', '等'}
-    return [word for word in words if word and word not in stopwords]
-
-# 使用TF-IDF提取關鍵詞
-def extract_keywords_tfidf(text, topK=10):
+# 移除法律字典添加的詞：jieba基本詞典原有的詞恢復原詞頻，其他詞從詞典中刪除
+def remove_legal_keywords_from_jieba(added):
+    for word, original_freq in added.items():
+        if original_freq is None:
+            jieba.del_word(word)
+        else:
+            jieba.add_word(word, freq=original_freq)
+
+# 返回比指定模式便宜一級的分析模式
+def cheaper_profile(profile):
+    index = ANALYSIS_PROFILE_ORDER.index(profile)
+    return ANALYSIS_PROFILE_ORDER[min(index + 1, len(ANALYSIS_PROFILE_ORDER) - 1)]
+
+# TextRank使用的詞性
+TEXTRANK_ALLOW_POS = frozenset(('ns', 'n', 'vn', 'v'))
+TEXTRANK_SPAN = 5
+
+# 對問題進行一次分詞，返回 (詞, 詞性) 列表；不需要TextRank時不做詞性標註
+# 使用 text_tokenizer.QUERY_TOKENIZER 設定的分詞器，與建立索引的分詞器保持一致
+def segment_question(text, with_pos=False):
+    tokenizer = text_tokenizer.get_tokenizer(text_tokenizer.QUERY_TOKENIZER)
+    if with_pos:
+        return tokenizer.cut_pos(text)
+    return [(word, None) for word in tokenizer.cut(text)]
+
+# 基於已分詞結果使用TF-IDF提取關鍵詞（計算方式與 jieba.analyse.extract_tags 相同）
+def extract_keywords_tfidf_from_tokens(tokens, topK=10):
     try:
-        # 使用jieba的TF-IDF算法提取關鍵詞
-        keywords = jieba.analyse.extract_tags(text, topK=topK, withWeight=True)
+        extractor = jieba.analyse.default_tfidf
+        freq = {}
+        for word, flag in tokens:
+            if len(word.strip()) < 2 or word.lower() in extractor.stop_words:
+                continue
+            freq[word] = freq.get(word, 0.0) + 1.0
+
+        total = sum(freq.values())
+        for word in freq:
+            freq[word] *= extractor.idf_freq.get(word, extractor.median_idf) / total
+
+        keywords = sorted(freq.items(), key=lambda x: x[1], reverse=True)[:topK]
         log_message(f"使用TF-IDF成功提取 {len(keywords)} 個關鍵詞")
         return keywords
     except Exception as e:
         log_message(f"使用TF-IDF提取關鍵詞失敗: {str(e)}")
         return []
 
-# 使用TextRank提取關鍵詞
-def extract_keywords_textrank(text, topK=10):
+# 基於已分詞結果使用TextRank提取關鍵詞（計算方式與 jieba.analyse.textrank 相同）
+def extract_keywords_textrank_from_tokens(tokens, topK=10):
     try:
-        # 使用jieba的TextRank算法提取關鍵詞
-        keywords = jieba.analyse.textrank(text, topK=topK, withWeight=True)
+        stop_words = jieba.analyse.default_textrank.stop_words
+
+        # 分詞器不標註詞性（bigram）時所有詞都是候選
+        def is_candidate(word, flag):
+            return (flag is None or flag in TEXTRANK_ALLOW_POS) and len(word.strip()) >= 2 and word.lower() not in stop_words
+
+        # 在窗口內統計共現次數並建立詞圖
+        co_occurrence = defaultdict(int)
+        for i, (word, flag) in enumerate(tokens):
+            if not is_candidate(word, flag):
+                continue
+            for j in range(i + 1, min(i + TEXTRANK_SPAN, len(tokens))):
+                if is_candidate(*tokens[j]):
+                    co_occurrence[(word, tokens[j][0])] += 1
+
+        graph = UndirectWeightedGraph()
+        for (start, end), weight in co_occurrence.items():
+            graph.addEdge(start, end, weight)
+        nodes_rank = graph.rank()
+
+        keywords = sorted(nodes_rank.items(), key=lambda x: x[1], reverse=True)[:topK]
         log_message(f"使用TextRank成功提取 {len(keywords)} 個關鍵詞")
         return keywords
     except Exception as e:
         log_message(f"使用TextRank提取關鍵詞失敗: {str(e)}")
         return []
 
-# 提取法律相關關鍵詞
-def extract_legal_keywords(text, keywords_dict, topK=10):
-    try:
-        # 分詞
-        tokens = tokenize_text(text)
-        
-        # 找出文本中包含的法律關鍵詞
-        legal_keywords = []
-        for token in tokens:
-            if token in keywords_dict:
-                legal_keywords.append((token, keywords_dict[token]))
-        
-        # 按出現頻率排序
-        counter = Counter(tokens)
-        legal_keywords_with_freq = [(keyword, info, counter[keyword]) for keyword, info in legal_keywords]
-        legal_keywords_with_freq.sort(key=lambda x: x[2], reverse=True)
-        
-        # 取前topK個
-        top_legal_keywords = legal_keywords_with_freq[:topK]
-        
-        log_message(f"成功提取 {len(top_legal_keywords)} 個法律相關關鍵詞")
-        return top_legal_keywords
-    except Exception as e:
-        log_message(f"提取法律相關關鍵詞失敗: {str(e)}")
-        return []
-
-# 分類法律問題
-def classify_legal_question(text, classifier):
-    try:
-        # 分詞
-        tokens = tokenize_text(text)
-        
-        # 計算每個類別的匹配分數
-        category_scores = {}
-        for category, keywords in classifier.items():
-            score = 0
-            for keyword in keywords:
-                if keyword in text:
-                    score += 1
-            if score > 0:
-                category_scores[category] = score
-        
-        # 按分數排序
-        sorted_categories = sorted(category_scores.items(), key=lambda x: x[1], reverse=True)
-        
-        if sorted_categories:
-            top_category = sorted_categories[0][0]
-            log_message(f"問題分類結果: {top_category}, 分數: {sorted_categories[0][1]}")
-            return top_category, sorted_categories
-        else:
-            log_message("無法分類問題")
-            return None, []
-    except Exception as e:
-        log_message(f"分類法律問題失敗: {str(e)}")
-        return None, []
+# 實體和行為抽取用的正則（模組載入時預先編譯）
+# 四類正則的匹配範圍會互相重疊（如"打了我"同時是行為和人物），合併成單一交替正則會漏掉重疊的匹配，因此仍分開掃描
+# 所有量詞都有上限，每個位置的匹配工作量固定，長文本的耗時與長度成線性關係
+# 人物實體（假設人物後面跟著"某"或者是"我"、"他"、"她"等代詞）
+PERSON_RE = re.compile(r'[張李王陳楊趙黃周吳劉蔡鄭許謝郭洪曾邱廖賴][\u4e00-\u9fa5]{0,1}某|我|他|她|你|妳|我們|他們|她們|你們|妳們')
+# 地點實體（假設地點前面有"在"、"於"等介詞）；問題經 NFKC 正規化後標點可能是半形
+LOCATION_RE = re.compile(r'[在於]([^，。！？；：,.!?;:]{1,10})')
+# 時間實體
+TIME_RE = re.compile(r'[0-9]{4}年[0-9]{1,2}月[0-9]{1,2}日|[0-9]{1,2}月[0-9]{1,2}日|[0-9]{1,2}日|[0-9]{1,2}時|[0-9]{1,2}分|昨天|今天|明天|前天|後天|早上|中午|下午|晚上')
+# 行為（假設行為是動詞加上可能的賓語），不使用捕獲組以減少匹配開銷
+ACTION_RE = re.compile(r'[^，。！？；：,.!?;:]{1,3}[了過][^，。！？；：,.!?;:]{1,10}')
 
 # 提取問題中的實體和行為
 def extract_entities_and_actions(text):
     try:
-        # 使用正則表達式提取可能的實體和行為
-        entities = []
-        actions = []
-        
-        # 提取人物實體（假設人物後面跟著"某"或者是"我"、"他"、"她"等代詞）
-        person_pattern = r'([張李王陳楊趙黃周吳劉蔡鄭許謝郭洪曾邱廖賴][\u4e00-\u9fa5]{0,1}某|我|他|她|你|妳|我們|他們|她們|你們|妳們)'
-        person_matches = re.findall(person_pattern, text)
-        if person_matches:
-            entities.extend([("人物", match) for match in person_matches])
-        
-        # 提取地點實體（假設地點前面有"在"、"於"等介詞）
-        location_pattern = r'(在|於)([^\，\。\！\？\；\：]{1,10})'
-        location_matches = re.findall(location_pattern, text)
-        if location_matches:
-            entities.extend([("地點", match[1]) for match in location_matches])
-        
-        # 提取時間實體
-        time_pattern = r'([0-9]{4}年[0-9]{1,2}月[0-9]{1,2}日|[0-9]{1,2}月[0-9]{1,2}日|[0-9]{1,2}日|[0-9]{1,2}時|[0-9]{1,2}分|昨天|今天|明天|前天|後天|早上|中午|下午|晚上)'
-        time_matches = re.findall(time_pattern, text)
-        if time_matches:
-            entities.extend([("時間", match) for match in time_matches])
-        
-        # 提取行為（假設行為是動詞加上可能的賓語）
-        action_pattern = r'(([^\，\。\！\？\；\：]{1,3})(了|過)([^\，\。\！\？\；\：]{1,10}))'
-        action_matches = re.findall(action_pattern, text)
-        if action_matches:
-            actions.extend([match[0] for match in action_matches])
+        entities = [("人物", match) for match in PERSON_RE.findall(text)]
+        entities.extend([("地點", match) for match in LOCATION_RE.findall(text)])
+        entities.extend([("時間", match) for match in TIME_RE.findall(text)])
+        actions = ACTION_RE.findall(text)
         
         log_message(f"成功提取 {len(entities)} 個實體和 {len(actions)} 個行為")
         return entities, actions
@@ -188,50 +206,232 @@ def extract_entities_and_actions(text):
         log_message(f"提取問題中的實體和行為失敗: {str(e)}")
         return [], []
 
-# 綜合分析問題
-def analyze_question(text):
-    try:
-        # 載入法律關鍵詞字典
+# 正規化問題文本：統一全形/半形、合併空白，保留標點（實體和行為抽取以標點分隔）
+# 分析在正規化後的文本上進行，緩存鍵相同的問題分析結果也相同
+def normalize_question(text):
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r'\s+', ' ', text).strip()
+
+# 句末標點（與實體和行為抽取的分隔標點相同，去掉後抽取結果不變）
+TRAILING_PUNCTUATION_RE = re.compile(r'[，。！？；：,.!?;:\s]+$')
+
+# 問題的緩存鍵：正規化文本去掉句末標點，「民法第184條是什麼?」和「民法第184條是什麼」共用緩存
+# 只用於緩存鍵，分析仍使用保留標點的正規化文本
+def question_cache_key(text):
+    return TRAILING_PUNCTUATION_RE.sub('', normalize_question(text))
+
+# 計算字典版本：字典、分類器和IDF文件的修改時間和大小
+def compute_dictionary_version():
+    digest = hashlib.sha1()
+    for filename in ("legal_keywords_dict.json", "legal_question_classifier.json", "legal_idf.txt"):
+        path = os.path.join(AI_DIR, filename)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{filename}:{stat.st_mtime_ns}:{stat.st_size};".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+# 有容量上限的LRU緩存，記錄命中和未命中次數
+class AnalysisCache:
+    def __init__(self, max_size=ANALYSIS_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+# 問題分析器：每個進程只載入一次字典並註冊jieba詞彙
+class QuestionAnalyzer:
+    def __init__(self):
+        self.keywords_dict = {}
+        self.classifier = {}
+        self.matcher = LegalTermMatcher({}, {})
+        self.profile = DEFAULT_ANALYSIS_PROFILE if DEFAULT_ANALYSIS_PROFILE in ANALYSIS_PROFILES else "full"
+        self.loaded_at = None
+        self.dictionary_version = None
+        self.cache = AnalysisCache()
+        self._registered_words = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    # 載入法律關鍵詞字典和問題分類器，並同步jieba詞典
+    def load(self):
         keywords_dict = load_legal_keywords_dict()
-        
-        # 載入法律問題分類器
         classifier = load_legal_question_classifier()
-        
-        # 將法律關鍵詞添加到jieba詞典
-        add_legal_keywords_to_jieba(keywords_dict)
-        
-        # 使用TF-IDF提取關鍵詞
-        tfidf_keywords = extract_keywords_tfidf(text)
-        
-        # 使用TextRank提取關鍵詞
-        textrank_keywords = extract_keywords_textrank(text)
-        
-        # 提取法律相關關鍵詞
-        legal_keywords = extract_legal_keywords(text, keywords_dict)
-        
-        # 分類法律問題
-        category, category_scores = classify_legal_question(text, classifier)
-        
-        # 提取問題中的實體和行為
-        entities, actions = extract_entities_and_actions(text)
-        
-        # 整合分析結果
-        analysis_result = {
-            "original_text": text,
-            "tfidf_keywords": tfidf_keywords,
-            "textrank_keywords": textrank_keywords,
-            "legal_keywords": legal_keywords,
-            "category": category,
-            "category_scores": category_scores,
-            "entities": entities,
-            "actions": actions
-        }
-        
-        log_message("問題分析完成")
+
+        # 編譯法律詞彙匹配自動機
+        matcher = LegalTermMatcher(keywords_dict, classifier)
+
+        with self._lock:
+            # 載入語料庫IDF表
+            load_corpus_idf()
+
+            # 移除新字典中已不存在的詞，避免重新載入後殘留舊詞（只移除法律字典添加的詞，不影響jieba基本詞典）
+            new_words = {keyword for keyword in keywords_dict.keys() if len(keyword) > 1}
+            removed_words = set(self._registered_words) - new_words
+            remove_legal_keywords_from_jieba({word: self._registered_words[word] for word in removed_words})
+            added = add_legal_keywords_to_jieba({word: keywords_dict[word] for word in new_words - set(self._registered_words)})
+
+            self._registered_words = {word: original_freq for word, original_freq in self._registered_words.items() if word not in removed_words}
+            self._registered_words.update(added)
+            self.keywords_dict = keywords_dict
+            self.classifier = classifier
+            self.matcher = matcher
+            self.loaded_at = datetime.now()
+
+            # 字典版本變更後舊的分析結果不再有效
+            self.dictionary_version = compute_dictionary_version()
+            self.cache.clear()
+
+        log_message(f"問題分析器載入完成，關鍵詞 {len(keywords_dict)} 個，類別 {len(classifier)} 個")
+        return True
+
+    # 重新載入（ai_setup.py 重新生成字典文件後調用）
+    def reload(self):
+        log_message("重新載入問題分析器")
+        return self.load()
+
+    # 綜合分析問題，先查詢以正規化文本（去掉句末標點）和字典版本為鍵的緩存
+    # profile 為 None 時使用分析器的預設模式
+    def analyze(self, text, profile=None):
+        timer = StageTimer()
+        profile = profile or self.profile
+        normalized_text = normalize_question(text)
+        cache_key = (question_cache_key(normalized_text), self.dictionary_version, profile)
+
+        cached_result = self.cache.get(cache_key)
+        if cached_result is not None:
+            log_message("問題分析命中緩存")
+            # 耗時為本次查詢緩存的耗時，不沿用首次分析的各階段耗時
+            return dict(cached_result, original_text=text, cache_hit=True, timings=timer.report())
+
+        analysis_result = self._analyze(normalized_text, profile)
+        if analysis_result is not None:
+            analysis_result["original_text"] = text
+            self.cache.put(cache_key, analysis_result)
         return analysis_result
-    except Exception as e:
-        log_message(f"綜合分析問題失敗: {str(e)}")
-        return None
+
+    # 綜合分析問題：只分詞一次，各提取器共用同一份分詞結果
+    def _analyze(self, text, profile):
+        try:
+            if profile not in ANALYSIS_PROFILES:
+                raise ValueError(f"未知的分析模式: {profile}")
+            stages = ANALYSIS_PROFILES[profile]
+            matcher = self.matcher
+            timer = StageTimer()
+
+            # 分詞（僅在啟用TextRank時標註詞性）
+            tokens = []
+            if stages["tfidf"] or stages["textrank"]:
+                with timer.stage("segment"):
+                    tokens = segment_question(text, with_pos=stages["textrank"])
+
+            # 使用TF-IDF提取關鍵詞
+            tfidf_keywords = []
+            if stages["tfidf"]:
+                with timer.stage("tfidf"):
+                    tfidf_keywords = extract_keywords_tfidf_from_tokens(tokens)
+
+            # 使用TextRank提取關鍵詞
+            textrank_keywords = []
+            if stages["textrank"]:
+                with timer.stage("textrank"):
+                    textrank_keywords = extract_keywords_textrank_from_tokens(tokens)
+
+            # 單次掃描找出所有法律詞彙和類別關鍵詞
+            with timer.stage("legal_terms"):
+                hits = matcher.scan(text)
+
+                # 提取法律相關關鍵詞
+                legal_keywords = matcher.legal_keywords(hits)
+
+                # 分類法律問題
+                category, category_scores = matcher.classify(hits)
+            log_message(f"成功提取 {len(legal_keywords)} 個法律相關關鍵詞")
+            if category:
+                log_message(f"問題分類結果: {category}, 分數: {category_scores[0][1]}")
+            else:
+                log_message("無法分類問題")
+
+            # 提取問題中的實體和行為
+            entities, actions = [], []
+            if stages["entities"]:
+                with timer.stage("entities"):
+                    entities, actions = extract_entities_and_actions(text)
+
+            # 整合分析結果
+            analysis_result = {
+                "original_text": text,
+                "tfidf_keywords": tfidf_keywords,
+                "textrank_keywords": textrank_keywords,
+                "legal_keywords": legal_keywords,
+                "category": category,
+                "category_scores": category_scores,
+                "entities": entities,
+                "actions": actions,
+                "profile": profile,
+                "cache_hit": False,
+                "timings": timer.report()
+            }
+
+            log_message(f"問題分析完成，各階段耗時(ms): {analysis_result['timings']}")
+            return analysis_result
+        except Exception as e:
+            log_message(f"綜合分析問題失敗: {str(e)}")
+            return None
+
+# 進程內共用的問題分析器
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+# 獲取共用的問題分析器（首次調用時載入）
+def get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = QuestionAnalyzer()
+    return _analyzer
+
+# 重新載入共用的問題分析器
+def reload_analyzer():
+    return get_analyzer().reload()
+
+# 綜合分析問題
+def analyze_question(text, profile=None):
+    return get_analyzer().analyze(text, profile)
 
 # 保存分析結果
 def save_analysis_result(result, filename):
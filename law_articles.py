@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 法規條文拆分
+# laws 表的 content 保存整部法規，按「第 N 條」標題拆分為 law_articles 表（每條一行，有獨立的全文搜索索引），
+# 搜索結果直接返回相關條文，bm25 也按條文長度計算
+# 用法: python law_articles.py，為全部法規重建條文
+
+import os
+import re
+import sqlite3
+from datetime import datetime
+import token_store
+import fts_index
+
+# 設定基本參數
+DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
+DB_FILE = os.path.join(DB_DIR, "legal_db.sqlite")
+LOG_FILE = os.path.join(DB_DIR, "law_articles_log.txt")
+
+# 條號可使用阿拉伯數字（含全形）或中文數字
+NUMBER_PATTERN = r"[0-9０-９零〇一二三四五六七八九十百千兩]+"
+
+# 條文標題：單獨一行的「第 N 條」、「第 N-M 條」或「第 N 條之 M」
+# 正文中的引用（如「第一百三十五條、第一百三十六條之妨害公務罪」）不是單獨一行，不會被誤認為標題
+ARTICLE_HEADING_RE = re.compile(
+    rf"^[ \t　]*第[ \t　]*({NUMBER_PATTERN})(?:[ \t　]*[-－][ \t　]*({NUMBER_PATTERN}))?[ \t　]*條"
+    rf"(?:[ \t　]*之[ \t　]*({NUMBER_PATTERN}))?[ \t　]*$",
+    re.MULTILINE
+)
+
+CHINESE_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "兩": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+# 確保目錄存在
+os.makedirs(DB_DIR, exist_ok=True)
+
+# 記錄函數
+def log_message(message):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"[{timestamp}] {message}\n")
+    print(f"[{timestamp}] {message}")
+
+# 將條號轉為整數：支持阿拉伯數字、全形數字和中文數字（如「一百八十四」、「十」、「二〇一」），無法解析時返回 None
+def parse_number(text):
+    text = (text or "").strip()
+    if not text:
+        return None
+    if text.isdigit():
+        return int(text)
+    total = 0
+    digit = None
+    for char in text:
+        if char in CHINESE_DIGITS:
+            if digit:
+                # 逐位書寫的數字（如「二〇一」）
+                digit = digit * 10 + CHINESE_DIGITS[char]
+            else:
+                digit = CHINESE_DIGITS[char]
+        elif char in CHINESE_UNITS:
+            total += (digit if digit else 1) * CHINESE_UNITS[char]
+            digit = None
+        else:
+            return None
+    return total + (digit or 0)
+
+# 條文的顯示標籤，如「第184條」、「第184條之1」
+def format_article_label(number, suffix=0):
+    return f"第{number}條" + (f"之{suffix}" if suffix else "")
+
+# 將法規全文拆分為條文，返回 [(條號, 之N, 條文內容)]；沒有條文標題時返回空列表
+# 同一法規中重複的條號只保留第一條，標題下沒有內容的條文不保留
+def split_articles(content):
+    headings = list(ARTICLE_HEADING_RE.finditer(content or ""))
+    articles = []
+    seen = set()
+    for i, heading in enumerate(headings):
+        number = parse_number(heading.group(1))
+        suffix = parse_number(heading.group(2) or heading.group(3)) or 0
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(content)
+        lines = [line.strip() for line in content[heading.end():end].splitlines()]
+        text = "\n".join(line for line in lines if line)
+        if number is None or not text or (number, suffix) in seen:
+            continue
+        seen.add((number, suffix))
+        articles.append((number, suffix, text))
+    return articles
+
+# 創建條文表和全文搜索索引
+# 法規標題和類別冗餘保存在條文表中：全文搜索可匹配法規名稱，按類別過濾時不需要關聯法規表
+def ensure_article_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS law_articles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        law_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        article TEXT NOT NULL,
+        article_number INTEGER NOT NULL,
+        article_suffix INTEGER NOT NULL DEFAULT 0,
+        content TEXT NOT NULL,
+        category TEXT,
+        date TEXT,
+        UNIQUE(law_id, article_number, article_suffix)
+    )
+    ''')
+    # 刪除法規時一併刪除其條文
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS laws_articles_ad AFTER DELETE ON laws BEGIN
+        DELETE FROM law_articles WHERE law_id = old.id;
+    END
+    ''')
+    return fts_index.ensure_fts_schema(conn, "law_articles")
+
+# 拆分一部法規並寫入條文表：已有條文按條號更新（ID不變），不再存在的條文刪除
+# 返回 (新增或內容有變化的 [(條文ID, 內容)], 刪除的條文ID列表)
+def store_law_articles(conn, law_id, title, category, date, content):
+    existing = {
+        (number, suffix): (article_id, old_content)
+        for article_id, number, suffix, old_content in conn.execute(
+            "SELECT id, article_number, article_suffix, content FROM law_articles WHERE law_id = ?", (law_id,)
+        )
+    }
+    # 沒有條文標題的法規整部保存為一行（條號0，無標籤），條文搜索仍能找到
+    articles = split_articles(content)
+    if not articles and content and content.strip():
+        articles = [(0, 0, content.strip())]
+    changed = []
+    for number, suffix, text in articles:
+        label = format_article_label(number, suffix) if number else ""
+        article_id, old_content = existing.pop((number, suffix), (None, None))
+        if article_id is None:
+            cursor = conn.execute('''
+            INSERT INTO law_articles (law_id, title, article, article_number, article_suffix, content, category, date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (law_id, title, label, number, suffix, text, category, date))
+            changed.append((cursor.lastrowid, text))
+        else:
+            conn.execute('''
+            UPDATE law_articles SET title = ?, article = ?, content = ?, category = ?, date = ? WHERE id = ?
+            ''', (title, label, text, category, date, article_id))
+            if text != old_content:
+                changed.append((article_id, text))
+    removed = [article_id for article_id, old_content in existing.values()]
+    if removed:
+        conn.executemany("DELETE FROM law_articles WHERE id = ?", [(article_id,) for article_id in removed])
+    return changed, removed
+
+# 拆分法規並保存新條文的詞頻向量，law_ids 為空時處理全部法規，返回條文數量
+def import_law_articles(conn, law_ids=None):
+    ensure_article_table(conn)
+    query = "SELECT id, title, category, date, content FROM laws"
+    params = []
+    if law_ids is not None:
+        if not law_ids:
+            return 0
+        query += f" WHERE id IN ({','.join('?' for _ in law_ids)})"
+        params = list(law_ids)
+
+    changed = []
+    removed = []
+    article_count = 0
+    for law_id, title, category, date, content in conn.execute(query, params).fetchall():
+        law_changed, law_removed = store_law_articles(conn, law_id, title, category, date, content)
+        changed.extend(law_changed)
+        removed.extend(law_removed)
+        article_count += conn.execute("SELECT COUNT(*) FROM law_articles WHERE law_id = ?", (law_id,)).fetchone()[0]
+    conn.commit()
+
+    if removed:
+        token_store.delete_document_tokens(conn, "article", removed)
+    token_store.store_document_tokens(conn, "article", changed)
+    log_message(f"拆分法規條文: {article_count} 條，更新 {len(changed)} 條，刪除 {len(removed)} 條")
+    return article_count
+
+# 主函數：為全部法規重建條文
+def main():
+    log_message("開始拆分法規條文")
+
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        import_law_articles(conn)
+    except sqlite3.OperationalError as e:
+        log_message(f"拆分法規條文失敗: {str(e)}")
+    conn.close()
+
+    log_message("法規條文拆分完成，請運行 ai_setup.py 更新搜索索引和查詢詞彙表，並調用 POST /api/analyzer/reload 重新載入搜索索引")
+
+if __name__ == "__main__":
+    main()
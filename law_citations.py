@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 法條引用解析
+# 從文本中找出「民法第184條」、「刑法第185條之3」、「勞基法24-1條」等引用，
+# 以 (法規ID, 條號, 之N) 為鍵在預先建立的字典中直接查得條文ID，不經過分詞、全文搜索和重排序
+
+import re
+from law_articles import NUMBER_PATTERN, parse_number, format_article_label
+
+# 法規簡稱 -> 全稱（全稱需與 laws.title 一致，或去掉「中華民國」前綴後一致）
+LAW_ALIASES = {
+    "刑法": "中華民國刑法",
+    "民法": "中華民國民法",
+    "憲法": "中華民國憲法",
+    "刑訴法": "刑事訴訟法",
+    "刑訴": "刑事訴訟法",
+    "民訴法": "民事訴訟法",
+    "民訴": "民事訴訟法",
+    "行訴法": "行政訴訟法",
+    "勞基法": "勞動基準法",
+    "消保法": "消費者保護法",
+    "個資法": "個人資料保護法",
+    "道交條例": "道路交通管理處罰條例",
+    "家暴法": "家庭暴力防治法",
+    "著作權": "著作權法",
+    "公平法": "公平交易法",
+    "國賠法": "國家賠償法",
+    "行程法": "行政程序法",
+    "社維法": "社會秩序維護法",
+    "性騷法": "性騷擾防治法",
+    "毒品條例": "毒品危害防制條例",
+    "槍砲條例": "槍砲彈藥刀械管制條例",
+    "洗錢法": "洗錢防制法"
+}
+
+# 法規名稱可省略的前綴
+LAW_TITLE_PREFIXES = ("中華民國",)
+
+# 條號引用（法規名稱之後）：「第184條」、「184條」、「第184-1條」、「第184條之1」，其後的項、款不影響條文
+ARTICLE_REF_RE = re.compile(
+    rf"[ \t　]*(第)?[ \t　]*({NUMBER_PATTERN})(?:[ \t　]*[-－][ \t　]*({NUMBER_PATTERN}))?[ \t　]*條"
+    rf"(?:[ \t　]*之[ \t　]*({NUMBER_PATTERN}))?"
+)
+
+# 同一法規連續引用多條時的分隔（如「民法第184條、第185條」）
+CONTINUATION_RE = re.compile(r"^[ \t　、，,及和與或暨]*$")
+
+# 只引用法條的問題中可忽略的文字：問題只剩這些文字時視為直接查詢條文
+CITATION_FILLER_RE = re.compile(rf"第?{NUMBER_PATTERN}[項款]|請問|規定|內容|條文|全文|是什麼|什麼|為何|查詢|的|[\s，,。.？?！!：:、]")
+
+# 條文引用索引：法規名稱 -> 法規ID，(法規ID, 條號, 之N) -> 條文ID，解析和查找都是字典操作
+class CitationIndex:
+    def __init__(self, law_titles, articles):
+        self.law_titles = law_titles
+        self.articles = articles
+        self.names = {}
+        for law_id, title in law_titles.items():
+            self.names.setdefault(title, law_id)
+            for prefix in LAW_TITLE_PREFIXES:
+                if title.startswith(prefix) and len(title) > len(prefix):
+                    self.names.setdefault(title[len(prefix):], law_id)
+        for alias, title in LAW_ALIASES.items():
+            law_id = self.names.get(title)
+            if law_id is not None:
+                self.names.setdefault(alias, law_id)
+        self.max_name_length = max((len(name) for name in self.names), default=0)
+
+    # 從數據庫載入法規名稱和條文鍵
+    @classmethod
+    def load(cls, conn):
+        law_titles = dict(conn.execute("SELECT id, title FROM laws").fetchall())
+        articles = {
+            (law_id, number, suffix): article_id
+            for article_id, law_id, number, suffix in conn.execute(
+                "SELECT id, law_id, article_number, article_suffix FROM law_articles"
+            )
+        }
+        return cls(law_titles, articles)
+
+    def __len__(self):
+        return len(self.articles)
+
+    # 查找在 end 位置結束的最長法規名稱，返回 (法規ID, 名稱起始位置)
+    def _law_before(self, text, end):
+        for length in range(min(self.max_name_length, end), 0, -1):
+            law_id = self.names.get(text[end - length:end])
+            if law_id is not None:
+                return law_id, end - length
+        return None, None
+
+    # 解析文本中的全部條文引用，返回引用列表（按出現順序）
+    def parse(self, text):
+        citations = []
+        if not text or not self.names:
+            return citations
+        previous = None
+        for match in ARTICLE_REF_RE.finditer(text):
+            law_id, start = self._law_before(text, match.start())
+            if law_id is None and previous and CONTINUATION_RE.match(text[previous["end"]:match.start()]):
+                # 沿用前一個引用的法規
+                law_id, start = previous["law_id"], match.start()
+            if law_id is None:
+                continue
+            number = parse_number(match.group(2))
+            if number is None:
+                continue
+            suffix = parse_number(match.group(3) or match.group(4)) or 0
+            citation = {
+                "citation": text[start:match.end()].strip(),
+                "law_id": law_id,
+                "law": self.law_titles[law_id],
+                "article_number": number,
+                "article_suffix": suffix,
+                "article": format_article_label(number, suffix),
+                "start": start,
+                "end": match.end()
+            }
+            citations.append(citation)
+            previous = citation
+        return citations
+
+    # 條文引用對應的條文ID，不存在時返回 None
+    def resolve(self, citation):
+        return self.articles.get((citation["law_id"], citation["article_number"], citation["article_suffix"]))
+
+# 去掉引用和可忽略文字後剩餘的文字
+def residual_text(text, citations):
+    parts = []
+    position = 0
+    for citation in citations:
+        parts.append(text[position:citation["start"]])
+        position = max(position, citation["end"])
+    parts.append(text[position:])
+    return CITATION_FILLER_RE.sub("", "".join(parts))
+
+# 問題是否只是查詢條文（如「民法第184條的內容是什麼?」）：引用都能找到且沒有其他內容
+def is_citation_query(text, citations, max_extra_chars=2):
+    return bool(citations) and all(citation.get("found") for citation in citations) and len(residual_text(text, citations)) <= max_extra_chars
@@ -3,11 +3,25 @@
 
 import os
 import json
-import sqlite3
-import jieba
+import re
 import math
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from collections import Counter
+import token_store
+import fts_index
+import search_query
+import vector_index
+import query_planner
+import law_citations
+import case_citations
+import db_migrations
+from db_pool import ConnectionPool
+from stage_timer import StageTimer
 
 # 設定基本參數
 DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
@@ -15,6 +29,32 @@ DB_FILE = os.path.join(DB_DIR, "legal_db.sqlite")
 AI_DIR = "/home/ubuntu/legal-ai-system/backend/ai"
 LOG_FILE = os.path.join(AI_DIR, "legal_search_log.txt")
 
+# 全文搜索排序使用的 bm25() 欄位權重（按 fts_index.FTS_TABLES 中的欄位順序，以逗號分隔）
+#   laws_fts: title, content, source, category
+#   court_cases_fts: title, content, case_type
+#   law_articles_fts: title（法規名稱，同一法規的條文相同）, content
+LAW_BM25_WEIGHTS = os.environ.get("LAW_BM25_WEIGHTS", "10,1,0.5,2")
+CASE_BM25_WEIGHTS = os.environ.get("CASE_BM25_WEIGHTS", "10,1,2")
+ARTICLE_BM25_WEIGHTS = os.environ.get("ARTICLE_BM25_WEIGHTS", "2,1")
+
+# 搜索結果模式：full 返回完整內容，snippet 只返回元數據和關鍵詞摘要（完整內容由詳情端點提供）
+RESULT_MODES = ("full", "snippet")
+
+# 摘要長度：FTS5 snippet() 的詞數，以及在Python中生成摘要時的字數
+SNIPPET_TOKENS = int(os.environ.get("SNIPPET_TOKENS", "32"))
+SNIPPET_CHARS = int(os.environ.get("SNIPPET_CHARS", "120"))
+
+# 兩階段檢索第一階段的候選數量：越大召回越好，但重排序耗時越長
+LAW_CANDIDATE_POOL = int(os.environ.get("LAW_CANDIDATE_POOL", "200"))
+CASE_CANDIDATE_POOL = int(os.environ.get("CASE_CANDIDATE_POOL", "200"))
+
+# 法規和判例並行搜索的線程數，以及整體搜索期限（毫秒），超時的一方返回空結果
+SEARCH_WORKERS = int(os.environ.get("SEARCH_WORKERS", "4"))
+SEARCH_DEADLINE_MS = float(os.environ.get("SEARCH_DEADLINE_MS", "2000"))
+
+# 有期限的查詢每執行此數量的SQLite虛擬機指令檢查一次是否超過期限
+SEARCH_PROGRESS_STEPS = int(os.environ.get("SEARCH_PROGRESS_STEPS", "1000"))
+
 # 確保目錄存在
 os.makedirs(AI_DIR, exist_ok=True)
 
@@ -25,67 +65,389 @@ def log_message(message):
         f.write(f"[{timestamp}] {message}\n")
     print(f"[{timestamp}] {message}")
 
+# 只讀查詢共用的連接池
+_read_pool = None
+
+# 獲取只讀連接池（首次調用時建立）
+def get_read_pool():
+    global _read_pool
+    if _read_pool is None:
+        _read_pool = ConnectionPool(DB_FILE)
+    return _read_pool
+
+# 當前線程的查詢期限（time.perf_counter() 的值），None 表示沒有期限
+_query_deadline = threading.local()
+
+# 在期限內執行查詢：期間當前線程取得的連接和執行的查詢都不超過期限
+@contextmanager
+def query_deadline(deadline):
+    _query_deadline.value = deadline
+    try:
+        yield
+    finally:
+        _query_deadline.value = None
+
+# 取得只讀連接；當前線程有查詢期限時，等待連接的時間不超過剩餘時間，
+# 超過期限的查詢由 progress handler 中斷（拋出 sqlite3.OperationalError），連接隨即歸還連接池
+@contextmanager
+def read_connection():
+    pool = get_read_pool()
+    deadline = getattr(_query_deadline, "value", None)
+    if deadline is None:
+        with pool.connection() as conn:
+            yield conn
+        return
+    
+    remaining = deadline - time.perf_counter()
+    if remaining <= 0:
+        raise TimeoutError("已超過檢索期限")
+    with pool.connection(min(pool.timeout, remaining)) as conn:
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, SEARCH_PROGRESS_STEPS)
+        try:
+            yield conn
+        finally:
+            conn.set_progress_handler(None, 0)
+
+# 當前線程的查詢期限已過時拋出 TimeoutError（期限內不經數據庫的計算步驟之前調用）
+def check_query_deadline():
+    deadline = getattr(_query_deadline, "value", None)
+    if deadline is not None and time.perf_counter() > deadline:
+        raise TimeoutError("已超過檢索期限")
+
+# 異常是否由檢索期限引起（等待連接超時，或查詢被 progress handler 中斷）
+def is_deadline_error(e):
+    return isinstance(e, TimeoutError) or (isinstance(e, sqlite3.OperationalError) and "interrupted" in str(e))
+
+# 並行搜索共用的線程池
+_search_executor = None
+
+# 獲取並行搜索線程池（首次調用時建立）
+def get_search_executor():
+    global _search_executor
+    if _search_executor is None:
+        _search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="legal_search")
+    return _search_executor
+
+# 各文檔類型的二進制稀疏向量索引（ai_setup.py 生成，啟動時以 mmap 載入）
+_vector_indexes = {}
+_vector_index_lock = threading.Lock()
+
+# 獲取文檔類型的稀疏向量索引，索引尚未生成時返回空索引（重排序改為逐篇讀取詞頻向量）
+def get_vector_index(doc_type):
+    index = _vector_indexes.get(doc_type)
+    if index is None:
+        with _vector_index_lock:
+            index = _vector_indexes.get(doc_type)
+            if index is None:
+                path = os.path.join(AI_DIR, SEARCH_TARGETS[doc_type]["vector_index"])
+                try:
+                    index = vector_index.load_vector_index(path)
+                    log_message(f"載入{doc_type}稀疏向量索引: {len(index)} 篇文檔，詞彙量 {len(index.vocabulary)}")
+                except FileNotFoundError:
+                    log_message(f"{doc_type}稀疏向量索引不存在: {path}，請先運行 ai_setup.py")
+                except Exception as e:
+                    log_message(f"載入{doc_type}稀疏向量索引失敗: {str(e)}")
+                if index is None:
+                    index = vector_index.SparseVectorIndex.from_vectors([])
+                _vector_indexes[doc_type] = index
+    return index
+
+# 預載各文檔類型的稀疏向量索引和TF-IDF索引（以 mmap 開啟，只讀取文件頭）
+def preload_search_indexes():
+    for doc_type in SEARCH_TARGETS:
+        get_vector_index(doc_type)
+        get_tfidf_index(doc_type)
+
+# 重新載入搜索索引（ai_setup.py 重新生成索引或導入新文檔後，由 /api/analyzer/reload 調用）
+# 清除稀疏向量索引、TF-IDF索引、查詢詞規劃器、條文引用索引和全文搜索設定，再預載二進制索引
+# 返回各文檔類型的索引文檔數，TF-IDF索引不存在時為 None
+def reload_search_indexes():
+    global _law_doc_type, _citation_index, _fts_mode
+    with _vector_index_lock:
+        _vector_indexes.clear()
+        _tfidf_indexes.clear()
+        _query_planners.clear()
+        _citation_index = None
+        _law_doc_type = None
+        _fts_mode = None
+    preload_search_indexes()
+    log_message("搜索索引已重新載入")
+    counts = {}
+    for doc_type in SEARCH_TARGETS:
+        tfidf_index = get_tfidf_index(doc_type)
+        counts[doc_type] = {
+            "vector_index": len(get_vector_index(doc_type)),
+            "tfidf_index": len(tfidf_index) if tfidf_index is not None else None
+        }
+    return counts
+
+# 各文檔類型的查詢詞規劃器（首次搜索時從詞彙表載入）
+_query_planners = {}
+
+# 獲取文檔類型的查詢詞規劃器
+def get_query_planner(doc_type):
+    planner = _query_planners.get(doc_type)
+    if planner is None:
+        with _vector_index_lock:
+            planner = _query_planners.get(doc_type)
+            if planner is None:
+                with get_read_pool().connection() as conn:
+                    planner = query_planner.QueryPlanner.load(conn, doc_type)
+                _query_planners[doc_type] = planner
+                log_message(f"載入{doc_type}查詢詞彙表: {planner.doc_count} 篇文檔，詞彙量 {len(planner.df)}")
+    return planner
+
+# 各文檔類型的二進制TF-IDF索引（ai_setup.py 生成，mmap 載入）
+_tfidf_indexes = {}
+
+# 獲取文檔類型的TF-IDF索引，索引尚未生成時返回 None
+def get_tfidf_index(doc_type):
+    if doc_type not in _tfidf_indexes:
+        with _vector_index_lock:
+            if doc_type not in _tfidf_indexes:
+                path = os.path.join(AI_DIR, SEARCH_TARGETS[doc_type]["tfidf_index"])
+                index = None
+                try:
+                    index = vector_index.load_tfidf_index(path)
+                    log_message(f"載入{doc_type} TF-IDF索引: {len(index)} 篇文檔，詞彙量 {len(index.vocabulary)}")
+                except FileNotFoundError:
+                    log_message(f"{doc_type} TF-IDF索引不存在: {path}，請先運行 ai_setup.py")
+                except Exception as e:
+                    log_message(f"載入{doc_type} TF-IDF索引失敗: {str(e)}")
+                _tfidf_indexes[doc_type] = index
+    return _tfidf_indexes[doc_type]
+
+# 數據庫全文搜索索引的分詞模式（首次搜索時讀取）
+_fts_mode = None
+
+# 獲取全文搜索索引的分詞模式，查詢關鍵詞需按相同方式切分
+def get_fts_mode():
+    global _fts_mode
+    if _fts_mode is None:
+        with get_read_pool().connection() as conn:
+            _fts_mode = fts_index.get_fts_mode(conn) or "unicode61"
+        log_message(f"全文搜索索引分詞模式: {_fts_mode}")
+    return _fts_mode
+
+# 條文引用索引（首次查找引用時從條文表載入）
+_citation_index = None
+
+# 獲取條文引用索引，條文表不存在時為空索引
+def get_citation_index():
+    global _citation_index
+    if _citation_index is None:
+        with _vector_index_lock:
+            if _citation_index is None:
+                with get_read_pool().connection() as conn:
+                    try:
+                        index = law_citations.CitationIndex.load(conn)
+                    except Exception as e:
+                        log_message(f"載入條文引用索引失敗: {str(e)}")
+                        index = law_citations.CitationIndex({}, {})
+                _citation_index = index
+                log_message(f"載入條文引用索引: {len(index.names)} 個法規名稱，{len(index)} 條條文")
+    return _citation_index
+
+# 法規搜索使用的文檔類型（首次搜索時檢查）
+_law_doc_type = None
+
+# 獲取法規搜索使用的文檔類型：已拆分條文時搜索條文（article），否則搜索整部法規（law）
+def get_law_doc_type():
+    global _law_doc_type
+    if _law_doc_type is None:
+        with get_read_pool().connection() as conn:
+            try:
+                has_articles = conn.execute("SELECT 1 FROM law_articles LIMIT 1").fetchone() is not None
+            except Exception:
+                has_articles = False
+        _law_doc_type = "article" if has_articles else "law"
+        log_message(f"法規搜索文檔類型: {_law_doc_type}")
+    return _law_doc_type
+
+# 解析 bm25() 欄位權重，格式錯誤或欄位數不符時全部使用1.0
+def parse_bm25_weights(value, table):
+    columns = fts_index.FTS_TABLES[table]["columns"]
+    try:
+        weights = [float(weight) for weight in value.split(",")]
+        if len(weights) == len(columns):
+            return weights
+    except ValueError:
+        pass
+    log_message(f"{table} 的 bm25 欄位權重設定無效: {value}，使用預設權重")
+    return [1.0] * len(columns)
+
+# 按欄位權重生成 bm25() 排序表達式（分數越小越相關）
+def bm25_expression(table, weights):
+    fts = fts_index.FTS_TABLES[table]["fts"]
+    return f"bm25({fts}, {', '.join(repr(weight) for weight in weights)})"
+
+LAW_RANK = bm25_expression("laws", parse_bm25_weights(LAW_BM25_WEIGHTS, "laws"))
+CASE_RANK = bm25_expression("court_cases", parse_bm25_weights(CASE_BM25_WEIGHTS, "court_cases"))
+ARTICLE_RANK = bm25_expression("law_articles", parse_bm25_weights(ARTICLE_BM25_WEIGHTS, "law_articles"))
+
+# 搜索目標：數據表、過濾欄位、TF-IDF索引和稀疏向量索引目錄、返回欄位，以及完整文檔、摘要（FTS5 snippet() 或SQL片段）和候選ID的參數化查詢
+LAW_COLUMNS = ["id", "title", "content", "category", "date"]
+CASE_COLUMNS = ["id", "title", "content", "case_type", "date", "case_number"]
+LAW_SNIPPET_COLUMNS = ["id", "title", "category", "date"]
+CASE_SNIPPET_COLUMNS = ["id", "title", "case_type", "date", "case_number"]
+ARTICLE_COLUMNS = ["id", "law_id", "title", "article", "content", "category", "date"]
+ARTICLE_SNIPPET_COLUMNS = ["id", "law_id", "title", "article", "category", "date"]
+SEARCH_TARGETS = {
+    "law": {
+        "table": "laws",
+        "filter": "category",
+        "tfidf_index": "laws_tfidf_index",
+        "vector_index": "laws_vector_index",
+        "columns": LAW_COLUMNS,
+        "snippet_columns": LAW_SNIPPET_COLUMNS,
+        "query": search_query.SearchQueryBuilder("laws", LAW_COLUMNS, "category", LAW_RANK),
+        "snippet_query": search_query.SearchQueryBuilder("laws", LAW_SNIPPET_COLUMNS, "category", LAW_RANK, ("content", SNIPPET_TOKENS)),
+        "excerpt_query": search_query.SearchQueryBuilder("laws", LAW_SNIPPET_COLUMNS, "category", LAW_RANK, excerpt=("content", SNIPPET_CHARS)),
+        "candidate_query": search_query.SearchQueryBuilder("laws", ["id"], "category", LAW_RANK)
+    },
+    "case": {
+        "table": "court_cases",
+        "filter": "case_type",
+        "tfidf_index": "cases_tfidf_index",
+        "vector_index": "cases_vector_index",
+        "columns": CASE_COLUMNS,
+        "snippet_columns": CASE_SNIPPET_COLUMNS,
+        "query": search_query.SearchQueryBuilder("court_cases", CASE_COLUMNS, "case_type", CASE_RANK),
+        "snippet_query": search_query.SearchQueryBuilder("court_cases", CASE_SNIPPET_COLUMNS, "case_type", CASE_RANK, ("content", SNIPPET_TOKENS)),
+        "excerpt_query": search_query.SearchQueryBuilder("court_cases", CASE_SNIPPET_COLUMNS, "case_type", CASE_RANK, excerpt=("content", SNIPPET_CHARS)),
+        "candidate_query": search_query.SearchQueryBuilder("court_cases", ["id"], "case_type", CASE_RANK)
+    },
+    "article": {
+        "table": "law_articles",
+        "filter": "category",
+        "tfidf_index": "articles_tfidf_index",
+        "vector_index": "articles_vector_index",
+        "columns": ARTICLE_COLUMNS,
+        "snippet_columns": ARTICLE_SNIPPET_COLUMNS,
+        "query": search_query.SearchQueryBuilder("law_articles", ARTICLE_COLUMNS, "category", ARTICLE_RANK),
+        "snippet_query": search_query.SearchQueryBuilder("law_articles", ARTICLE_SNIPPET_COLUMNS, "category", ARTICLE_RANK, ("content", SNIPPET_TOKENS)),
+        "excerpt_query": search_query.SearchQueryBuilder("law_articles", ARTICLE_SNIPPET_COLUMNS, "category", ARTICLE_RANK, excerpt=("content", SNIPPET_CHARS)),
+        "candidate_query": search_query.SearchQueryBuilder("law_articles", ["id"], "category", ARTICLE_RANK)
+    }
+}
+
+# 執行搜索目標的參數化查詢（使用連接池中的連接），關鍵詞無法用於全文搜索時返回空列表
+def run_search_query(builder, keywords, filter_value, limit, after=None, date_range=None):
+    mode = get_fts_mode()
+    with read_connection() as conn:
+        rows = builder.execute(conn, keywords, filter_value, limit, mode, after, date_range)
+    if rows is None:
+        log_message(f"關鍵詞無法用於全文搜索（分詞模式: {mode}）: {keywords}")
+        return []
+    return rows
+
 # 載入關鍵詞提取系統
 def load_keyword_extractor():
     try:
         import keyword_extractor
+        # 預先載入共用的問題分析器
+        keyword_extractor.get_analyzer()
         log_message("成功載入關鍵詞提取系統")
         return keyword_extractor
     except Exception as e:
         log_message(f"載入關鍵詞提取系統失敗: {str(e)}")
         return None
 
-# 從數據庫搜索法規
-def search_laws(keywords, category=None, limit=10):
+# 標記片段中的所有關鍵詞，並在片段前後還有內容時加上省略號
+def format_excerpt(excerpt, keywords, truncated_start, truncated_end):
+    terms = sorted({keyword for keyword in keywords or [] if keyword}, key=len, reverse=True)
+    if terms:
+        pattern = re.compile("|".join(re.escape(term) for term in terms))
+        excerpt = pattern.sub(lambda m: f"{search_query.SNIPPET_START}{m.group(0)}{search_query.SNIPPET_END}", excerpt)
+    return (search_query.SNIPPET_ELLIPSIS if truncated_start else "") + excerpt + (search_query.SNIPPET_ELLIPSIS if truncated_end else "")
+
+# 在Python中生成摘要：從第一個關鍵詞出現處截取，並標記所有關鍵詞（用於已讀取完整內容的文檔）
+def make_snippet(text, keywords, length=SNIPPET_CHARS):
+    if not text:
+        return ""
+    terms = [keyword for keyword in keywords or [] if keyword]
+    positions = [position for position in (text.find(term) for term in terms) if position >= 0]
+    start = max(0, min(positions) - length // 4) if positions else 0
+    end = min(len(text), start + length)
+    return format_excerpt(text[start:end], terms, start > 0, end < len(text))
+
+# 將SQL截取的片段（多取一個字，見 SearchQueryBuilder 的 excerpt）轉為摘要
+def excerpt_snippet(excerpt, excerpt_start, keywords, length=SNIPPET_CHARS):
+    if not excerpt:
+        return ""
+    return format_excerpt(excerpt[:length], keywords, (excerpt_start or 1) > 1, len(excerpt) > length)
+
+# 將完整文檔轉為摘要結果：移除內容，加入摘要
+def snippet_documents(documents, keywords):
+    results = []
+    for document in documents:
+        result = {key: value for key, value in document.items() if key != "content"}
+        result["snippet"] = make_snippet(document.get("content"), keywords)
+        results.append(result)
+    return results
+
+# 檢查並統一日期範圍（YYYY-MM-DD，包含兩端），返回 (起始日期, 結束日期)，格式錯誤時拋出 ValueError
+def parse_date_range(date_from=None, date_to=None):
+    date_range = tuple(db_migrations.normalize_date(value) or None for value in (date_from, date_to))
+    for value in date_range:
+        if value and not db_migrations.is_iso_date(value):
+            raise ValueError(f"無效的日期: {value}，請使用 YYYY-MM-DD 格式")
+    if date_range[0] and date_range[1] and date_range[0] > date_range[1]:
+        raise ValueError("起始日期不能晚於結束日期")
+    return date_range
+
+# 搜索文檔：result_mode 為 snippet 時不返回內容，索引保存內容時由FTS5 snippet()生成摘要，否則在SQL中截取片段
+# after 為分頁的排序鍵（見 search_page），date_range 為 parse_date_range 的結果
+def search_documents(doc_type, keywords, filter_value=None, limit=10, result_mode="full", after=None, date_range=None):
+    target = SEARCH_TARGETS[doc_type]
+    if result_mode != "snippet":
+        builder = target["query"]
+        columns = target["columns"]
+    elif fts_index.has_stored_content(get_fts_mode()):
+        builder = target["snippet_query"]
+        columns = target["snippet_columns"] + ["snippet"]
+    else:
+        # bigram索引不保存內容，無法使用 snippet()：在SQL中截取第一個關鍵詞附近的片段，
+        # SQLite仍需讀取整行內容，但只有片段返回給Python，不傳輸和處理完整內容
+        builder = target["excerpt_query"]
+        columns = target["snippet_columns"] + ["excerpt", "excerpt_start"]
+    
+    # 有關鍵詞時使用FTS5全文搜索，按 bm25 相關性排序，LIMIT 直接從索引中取最相關的結果
+    rows = run_search_query(builder, keywords, filter_value, limit, after, date_range)
+    documents = [dict(zip(columns + ["bm25"], row)) for row in rows]
+    
+    for document in documents:
+        if "excerpt" in document:
+            document["snippet"] = excerpt_snippet(document.pop("excerpt"), document.pop("excerpt_start"), keywords)
+    return documents
+
+# 分頁搜索：返回 (文檔列表, 下一頁游標)，沒有更多結果時游標為 None
+# 有關鍵詞時按 (bm25分數, ID) 分頁，否則按 ID 倒序分頁；游標無效時拋出 ValueError
+def search_page(doc_type, keywords, filter_value=None, limit=10, result_mode="full", cursor=None, date_range=None):
+    fingerprint = search_query.query_fingerprint(doc_type, sorted(set(keywords or [])), filter_value, list(date_range or ()), get_fts_mode())
+    after = search_query.decode_cursor(cursor, fingerprint) if cursor else None
+    
+    # 多取一條以判斷是否還有下一頁
+    documents = search_documents(doc_type, keywords, filter_value, limit + 1, result_mode, after, date_range)
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        keys = (last["bm25"], last["id"]) if last["bm25"] is not None else (last["id"],)
+        next_cursor = search_query.encode_cursor(keys, fingerprint)
+    return documents, next_cursor
+
+# 分頁搜索法規：與 search_laws 相同，已拆分條文時按條文分頁（游標也屬於條文查詢）
+# 每條結果的 doc_type 為 "law"（整部法規，詳情見 /api/laws/{id}）或 "article"（條文，詳情見 /api/articles/{id}）
+def search_law_page(keywords, category=None, limit=10, result_mode="full", cursor=None, date_range=None):
+    doc_type = get_law_doc_type()
+    documents, next_cursor = search_page(doc_type, keywords, category, limit, result_mode, cursor, date_range)
+    return [dict(document, doc_type=doc_type) for document in documents], next_cursor
+
+# 從數據庫搜索法規（已拆分條文時返回相關條文）
+def search_laws(keywords, category=None, limit=10, result_mode="full", date_range=None):
     try:
-        # 連接到SQLite數據庫
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # 構建搜索查詢
-        query = """
-        SELECT id, title, content, category, date
-        FROM laws
-        """
-        
-        # 如果有關鍵詞，使用FTS5全文搜索
-        if keywords:
-            keyword_str = " OR ".join([f'"{keyword}"' for keyword in keywords])
-            query = f"""
-            SELECT laws.id, laws.title, laws.content, laws.category, laws.date
-            FROM laws_fts
-            JOIN laws ON laws_fts.rowid = laws.id
-            WHERE laws_fts MATCH '{keyword_str}'
-            """
-        
-        # 如果有類別，添加類別過濾
-        if category:
-            if "WHERE" in query:
-                query += f" AND laws.category = '{category}'"
-            else:
-                query += f" WHERE laws.category = '{category}'"
-        
-        # 添加排序和限制
-        query += f" ORDER BY laws.id DESC LIMIT {limit}"
-        
-        # 執行查詢
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        # 格式化結果
-        laws = []
-        for row in results:
-            law = {
-                "id": row[0],
-                "title": row[1],
-                "content": row[2],
-                "category": row[3],
-                "date": row[4]
-            }
-            laws.append(law)
-        
-        conn.close()
-        
+        laws = search_documents(get_law_doc_type(), keywords, category, limit, result_mode, date_range=date_range)
         log_message(f"從數據庫搜索到 {len(laws)} 條法規")
         return laws
     except Exception as e:
@@ -93,70 +455,143 @@ def search_laws(keywords, category=None, limit=10):
         return []
 
 # 從數據庫搜索判例
-def search_cases(keywords, case_type=None, limit=10):
+def search_cases(keywords, case_type=None, limit=10, result_mode="full", date_range=None):
     try:
-        # 連接到SQLite數據庫
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # 構建搜索查詢
-        query = """
-        SELECT id, title, content, case_type, date, case_number
-        FROM court_cases
-        """
-        
-        # 如果有關鍵詞，使用FTS5全文搜索
-        if keywords:
-            keyword_str = " OR ".join([f'"{keyword}"' for keyword in keywords])
-            query = f"""
-            SELECT court_cases.id, court_cases.title, court_cases.content, court_cases.case_type, court_cases.date, court_cases.case_number
-            FROM court_cases_fts
-            JOIN court_cases ON court_cases_fts.rowid = court_cases.id
-            WHERE court_cases_fts MATCH '{keyword_str}'
-            """
-        
-        # 如果有案件類型，添加類型過濾
-        if case_type:
-            if "WHERE" in query:
-                query += f" AND court_cases.case_type = '{case_type}'"
-            else:
-                query += f" WHERE court_cases.case_type = '{case_type}'"
-        
-        # 添加排序和限制
-        query += f" ORDER BY court_cases.id DESC LIMIT {limit}"
-        
-        # 執行查詢
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        # 格式化結果
-        cases = []
-        for row in results:
-            case = {
-                "id": row[0],
-                "title": row[1],
-                "content": row[2],
-                "case_type": row[3],
-                "date": row[4],
-                "case_number": row[5]
-            }
-            cases.append(case)
-        
-        conn.close()
-        
+        cases = search_documents("case", keywords, case_type, limit, result_mode, date_range=date_range)
         log_message(f"從數據庫搜索到 {len(cases)} 條判例")
         return cases
     except Exception as e:
         log_message(f"從數據庫搜索判例失敗: {str(e)}")
         return []
 
-# 計算文本相似度（基於詞頻）
-def calculate_text_similarity(text1, text2):
+# 按ID讀取單篇完整文檔（詳情端點使用），不存在時返回 None
+def get_document(doc_type, doc_id):
+    try:
+        return load_documents(doc_type, [doc_id]).get(doc_id)
+    except Exception as e:
+        log_message(f"讀取{doc_type}文檔 {doc_id} 失敗: {str(e)}")
+        return None
+
+# 查找文本中引用的條文：解析引用後按 (法規, 條號, 之N) 直接取得條文，不經過全文搜索
+# 返回引用列表，每項附 found 和 document（找不到的條文 document 為 None）
+def lookup_citations(text):
+    index = get_citation_index()
+    citations = index.parse(text)
+    article_ids = {id(citation): index.resolve(citation) for citation in citations}
+    documents = load_documents("article", [article_id for article_id in article_ids.values() if article_id is not None])
+    for citation in citations:
+        citation["document"] = documents.get(article_ids[id(citation)])
+        citation["found"] = citation["document"] is not None
+    return citations
+
+# 按裁判字號查找判決（使用 (年度, 字別, 號次) 複合索引），返回 (引用列表, 判決列表)
+def lookup_case_citations(text):
+    citations = case_citations.parse_case_citations(text)
+    documents = []
+    seen = set()
+    with get_read_pool().connection() as conn:
+        for citation in citations:
+            for document in case_citations.lookup_case_citation(conn, citation, CASE_COLUMNS):
+                if document["id"] not in seen:
+                    seen.add(document["id"])
+                    documents.append(dict(document, citation=citation["citation"]))
+    return citations, documents
+
+# 第一階段：只從全文搜索索引取出候選文檔ID和bm25分數，不讀取內容
+# 超過檢索期限時拋出異常，不當作沒有結果（否則會在期限後再以TF-IDF掃描全部文檔）
+def search_candidates(doc_type, keywords, filter_value=None, limit=200):
+    try:
+        return run_search_query(SEARCH_TARGETS[doc_type]["candidate_query"], keywords, filter_value, limit)
+    except Exception as e:
+        if is_deadline_error(e):
+            raise
+        log_message(f"搜索{doc_type}候選文檔失敗: {str(e)}")
+        return []
+
+# 全文搜索沒有結果時，以TF-IDF索引在全部文檔中取最相似的候選（無bm25分數）
+def search_tfidf_candidates(doc_type, question_vector, filter_value=None, limit=200):
+    index = get_tfidf_index(doc_type)
+    if index is None:
+        return []
+    vector, norm = index.weight_vector(question_vector)
+    doc_ids = [doc_id for doc_id, similarity in index.top_k(vector, norm, limit)]
+    
+    # 類別或案件類型過濾（TF-IDF索引不保存過濾欄位）
+    if filter_value and doc_ids:
+        target = SEARCH_TARGETS[doc_type]
+        placeholders = ",".join("?" for _ in doc_ids)
+        with read_connection() as conn:
+            cursor = conn.execute(
+                f"SELECT id FROM {target['table']} WHERE id IN ({placeholders}) AND {target['filter']} = ?",
+                doc_ids + [filter_value]
+            )
+            allowed = {row[0] for row in cursor.fetchall()}
+        doc_ids = [doc_id for doc_id in doc_ids if doc_id in allowed]
+    return [(doc_id, None) for doc_id in doc_ids]
+
+# 按ID讀取文檔，返回 {文檔ID: 文檔}
+def load_documents(doc_type, doc_ids):
+    if not doc_ids:
+        return {}
+    target = SEARCH_TARGETS[doc_type]
+    columns = target["columns"]
+    placeholders = ",".join("?" for _ in doc_ids)
+    with read_connection() as conn:
+        cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {target['table']} WHERE id IN ({placeholders})", list(doc_ids))
+        return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+# 讀取文檔的預先計算詞頻向量，缺失時讀取內容即時計算
+def get_document_vectors(doc_type, doc_ids):
+    doc_vectors = {}
+    try:
+        with read_connection() as conn:
+            doc_vectors = token_store.load_document_vectors(conn, doc_type, doc_ids)
+    except Exception as e:
+        if is_deadline_error(e):
+            raise
+        log_message(f"讀取文檔詞頻向量失敗: {str(e)}")
+    
+    missing = [doc_id for doc_id in doc_ids if doc_id not in doc_vectors]
+    if missing:
+        log_message(f"{len(missing)} 條{doc_type}文檔沒有已保存的詞頻向量，即時計算")
+        for doc_id, doc in load_documents(doc_type, missing).items():
+            doc_vectors[doc_id] = token_store.build_vector(token_store.tokenize_document(doc["content"]))
+    return doc_vectors
+
+# 第二階段：以詞頻向量的餘弦相似度重排序候選文檔，相似度相同時保持bm25順序
+def rerank_candidates(doc_type, question_vector, question_norm, candidates):
+    similarities = {}
+    
+    # 索引中的候選文檔以一次稀疏矩陣乘法計算相似度
+    index = get_vector_index(doc_type)
+    indexed = [doc_id for doc_id, rank in candidates if doc_id in index]
+    if indexed:
+        doc_ids, scores = index.score(question_vector, question_norm, indexed)
+        similarities.update(zip(doc_ids.tolist(), scores.tolist()))
+    
+    # 載入索引後新增的文檔逐篇計算
+    missing = [doc_id for doc_id, rank in candidates if doc_id not in index]
+    if missing:
+        for doc_id, (vector, norm) in get_document_vectors(doc_type, missing).items():
+            similarities[doc_id] = token_store.cosine_similarity(question_vector, question_norm, vector, norm)
+    
+    scored = [(doc_id, similarities[doc_id], rank) for doc_id, rank in candidates if doc_id in similarities]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored
+
+# 取出重排序後的前 limit 條文檔，附上相似度和bm25分數
+def fetch_ranked_documents(doc_type, ranked, limit):
+    top = ranked[:limit]
+    documents = load_documents(doc_type, [doc_id for doc_id, similarity, rank in top])
+    results = []
+    for doc_id, similarity, rank in top:
+        if doc_id in documents:
+            results.append(dict(documents[doc_id], bm25=rank, similarity=similarity))
+    return results
+
+# 計算已分詞文本的相似度（基於詞頻的餘弦相似度）
+def calculate_token_similarity(words1, words2):
     try:
-        # 分詞
-        words1 = jieba.lcut(text1)
-        words2 = jieba.lcut(text2)
-        
         # 計算詞頻
         counter1 = Counter(words1)
         counter2 = Counter(words2)
@@ -178,34 +613,66 @@ def calculate_text_similarity(text1, text2):
         log_message(f"計算文本相似度失敗: {str(e)}")
         return 0
 
+# 計算文本相似度（基於詞頻）
+def calculate_text_similarity(text1, text2):
+    return calculate_token_similarity(token_store.tokenize_document(text1), token_store.tokenize_document(text2))
+
+# 單一文檔類型的完整檢索流程：候選 -> 重排序 -> 讀取，返回 (文檔列表, 候選數量, 各階段耗時)
+def search_document_type(doc_type, keywords, filter_value, pool, limit, question_vector, question_norm, deadline=None):
+    # 超過期限（time.perf_counter() 的值）的數據庫查詢被中斷，拋出 TimeoutError 或 sqlite3.OperationalError
+    with query_deadline(deadline):
+        timer = StageTimer()
+        
+        # 第一階段：從全文搜索索引取出按bm25排序的候選文檔，沒有結果時改用TF-IDF索引
+        with timer.stage("retrieve"):
+            candidates = search_candidates(doc_type, keywords, filter_value, pool)
+            if not candidates and keywords:
+                check_query_deadline()
+                candidates = search_tfidf_candidates(doc_type, question_vector, filter_value, pool)
+        
+        # 第二階段：以預先計算的詞頻向量重排序
+        with timer.stage("rerank"):
+            ranked = rerank_candidates(doc_type, question_vector, question_norm, candidates)
+        
+        # 只讀取最終返回的文檔內容
+        with timer.stage("fetch"):
+            documents = fetch_ranked_documents(doc_type, ranked, limit)
+        
+        return documents, len(candidates), timer.report()
+
+# 合併問題分析結果中的全部關鍵詞（TF-IDF、TextRank、法律詞、實體、行為）
+def collect_keywords(analysis_result):
+    keywords = []
+    
+    # 從TF-IDF關鍵詞中提取
+    if "tfidf_keywords" in analysis_result and analysis_result["tfidf_keywords"]:
+        keywords.extend([keyword for keyword, weight in analysis_result["tfidf_keywords"]])
+    
+    # 從TextRank關鍵詞中提取
+    if "textrank_keywords" in analysis_result and analysis_result["textrank_keywords"]:
+        keywords.extend([keyword for keyword, weight in analysis_result["textrank_keywords"]])
+    
+    # 從法律關鍵詞中提取
+    if "legal_keywords" in analysis_result and analysis_result["legal_keywords"]:
+        keywords.extend([keyword for keyword, info, freq in analysis_result["legal_keywords"]])
+    
+    # 從實體中提取
+    if "entities" in analysis_result and analysis_result["entities"]:
+        keywords.extend([entity[1] for entity in analysis_result["entities"]])
+    
+    # 從行為中提取
+    if "actions" in analysis_result and analysis_result["actions"]:
+        keywords.extend(analysis_result["actions"])
+    
+    # 去重（保持順序，查詢計劃的結果可重現）
+    return list(dict.fromkeys(keywords))
+
 # 根據問題分析結果搜索相關法規和判例
-def search_by_question_analysis(analysis_result, law_limit=5, case_limit=5):
+# law_pool / case_pool 為第一階段候選數量，law_limit / case_limit 為最終返回數量
+def search_by_question_analysis(analysis_result, law_limit=5, case_limit=5, law_pool=None, case_pool=None):
     try:
         # 提取關鍵詞
-        keywords = []
-        
-        # 從TF-IDF關鍵詞中提取
-        if "tfidf_keywords" in analysis_result and analysis_result["tfidf_keywords"]:
-            keywords.extend([keyword for keyword, weight in analysis_result["tfidf_keywords"]])
-        
-        # 從TextRank關鍵詞中提取
-        if "textrank_keywords" in analysis_result and analysis_result["textrank_keywords"]:
-            keywords.extend([keyword for keyword, weight in analysis_result["textrank_keywords"]])
-        
-        # 從法律關鍵詞中提取
-        if "legal_keywords" in analysis_result and analysis_result["legal_keywords"]:
-            keywords.extend([keyword for keyword, info, freq in analysis_result["legal_keywords"]])
-        
-        # 從實體中提取
-        if "entities" in analysis_result and analysis_result["entities"]:
-            keywords.extend([entity[1] for entity in analysis_result["entities"]])
-        
-        # 從行為中提取
-        if "actions" in analysis_result and analysis_result["actions"]:
-            keywords.extend(analysis_result["actions"])
-        
-        # 去重
-        keywords = list(set(keywords))
+        keywords = collect_keywords(analysis_result)
         
         # 獲取問題類別
         category = None
@@ -225,26 +692,68 @@ def search_by_question_analysis(analysis_result, law_limit=5, case_limit=5):
         
         log_message(f"搜索關鍵詞: {keywords}, 類別: {category}, 案件類型: {case_type}")
         
-        # 搜索相關法規
-        laws = search_laws(keywords, category, law_limit)
-        
-        # 搜索相關判例
-        cases = search_cases(keywords, case_type, case_limit)
-        
-        # 計算相關性分數
-        original_text = analysis_result.get("original_text", "")
+        law_pool = max(law_pool or LAW_CANDIDATE_POOL, law_limit)
+        case_pool = max(case_pool or CASE_CANDIDATE_POOL, case_limit)
+        timer = StageTimer()
         
-        # 為法規計算相關性分數
-        for law in laws:
-            law["similarity"] = calculate_text_similarity(original_text, law["content"])
-        
-        # 為判例計算相關性分數
-        for case in cases:
-            case["similarity"] = calculate_text_similarity(original_text, case["content"])
+        # 法規和判例各自檢索的文檔類型、過濾條件、候選數量和返回數量
+        searches = {
+            "law": (get_law_doc_type(), category, law_pool, law_limit),
+            "case": ("case", case_type, case_pool, case_limit)
+        }
         
-        # 按相關性排序
-        laws.sort(key=lambda x: x["similarity"], reverse=True)
-        cases.sort(key=lambda x: x["similarity"], reverse=True)
+        # 按各文檔類型的詞彙表規劃查詢詞，刪除停用詞和常見詞並限制詞數
+        with timer.stage("plan"):
+            plans = {name: get_query_planner(search[0]).plan(keywords) for name, search in searches.items()}
+        for plan in plans.values():
+            log_message(plan.describe())
+        
+        # 問題只分詞一次，兩個檢索流程共用
+        with timer.stage("tokenize"):
+            original_text = analysis_result.get("original_text", "")
+            question_vector, question_norm = token_store.build_vector(token_store.tokenize_document(original_text))
+        
+        # 法規和判例查詢不同的全文搜索索引，互不依賴，在線程池中並行執行
+        # 超過期限的檢索在下一次數據庫操作時中斷並歸還連接，不會佔用連接池影響後續請求
+        with timer.stage("search"):
+            executor = get_search_executor()
+            deadline = time.perf_counter() + SEARCH_DEADLINE_MS / 1000
+            futures = {
+                name: executor.submit(
+                    search_document_type, doc_type, [term for term, df in plans[name].terms],
+                    filter_value, pool, limit, question_vector, question_norm, deadline
+                )
+                for name, (doc_type, filter_value, pool, limit) in searches.items()
+            }
+            wait(futures.values(), timeout=SEARCH_DEADLINE_MS / 1000)
+        
+        results = {}
+        timed_out = []
+        stage_timings = {}
+        for doc_type, future in futures.items():
+            if not future.done():
+                # 尚未開始的檢索直接取消，執行中的檢索在下一次數據庫操作時因超過期限而中止
+                future.cancel()
+                timed_out.append(doc_type)
+                log_message(f"{doc_type}檢索超過期限 {SEARCH_DEADLINE_MS:.0f}ms，返回空結果")
+                results[doc_type] = ([], 0)
+                continue
+            try:
+                documents, candidate_count, timings = future.result()
+                results[doc_type] = (documents, candidate_count)
+                stage_timings.update({f"{doc_type}_{stage}": elapsed for stage, elapsed in timings.items()})
+            except Exception as e:
+                if is_deadline_error(e):
+                    timed_out.append(doc_type)
+                    log_message(f"{doc_type}檢索超過期限 {SEARCH_DEADLINE_MS:.0f}ms，返回空結果")
+                else:
+                    log_message(f"{doc_type}檢索失敗: {str(e)}")
+                results[doc_type] = ([], 0)
+        
+        laws, law_candidate_count = results["law"]
+        cases, case_candidate_count = results["case"]
+        timings = timer.report()
+        timings.update(stage_timings)
         
         # 返回搜索結果
         search_result = {
@@ -252,7 +761,18 @@ def search_by_question_analysis(analysis_result, law_limit=5, case_limit=5):
             "cases": cases,
             "keywords": keywords,
             "category": category,
-            "case_type": case_type
+            "case_type": case_type,
+            "pipeline": {
+                "law_doc_type": searches["law"][0],
+                "law_pool": law_pool,
+                "case_pool": case_pool,
+                "law_candidates": law_candidate_count,
+                "case_candidates": case_candidate_count,
+                "timed_out": timed_out,
+                "law_plan": plans["law"].to_dict(),
+                "case_plan": plans["case"].to_dict()
+            },
+            "timings": timings
         }
         
         log_message(f"搜索完成，找到 {len(laws)} 條相關法規和 {len(cases)} 條相關判例")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import Counter, deque
+
+# 法律詞彙多模式匹配器（Aho-Corasick自動機）
+# 由法律關鍵詞字典和問題分類器一次性編譯，對問題文本只需線性掃描一次
+class LegalTermMatcher:
+    def __init__(self, keywords_dict, classifier):
+        self.keywords_dict = keywords_dict
+        self.category_order = list(classifier.keys())
+
+        # 每個模式: [詞, 所屬類別列表, 是否為法律關鍵詞]
+        self._patterns = []
+        self._pattern_index = {}
+
+        # 自動機狀態
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for category, keywords in classifier.items():
+            for keyword in keywords:
+                if keyword:
+                    self._pattern(keyword)[1].append(category)
+
+        for keyword in keywords_dict.keys():
+            if len(keyword) > 1:  # 與jieba詞典一致，只考慮長度大於1的詞
+                self._pattern(keyword)[2] = True
+
+        for pattern_id, (term, categories, is_keyword) in enumerate(self._patterns):
+            self._insert(term, pattern_id)
+        self._build_failure_links()
+
+    # 取得（或新建）模式
+    def _pattern(self, term):
+        if term not in self._pattern_index:
+            self._pattern_index[term] = len(self._patterns)
+            self._patterns.append([term, [], False])
+        return self._patterns[self._pattern_index[term]]
+
+    # 將模式插入字典樹
+    def _insert(self, term, pattern_id):
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern_id)
+
+    # 以廣度優先建立失敗指針，並合併輸出
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    # 掃描文本，返回所有命中 (起始位置, 結束位置, 模式編號)，包含重疊命中
+    def scan(self, text):
+        hits = []
+        if not text:
+            return hits
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                end = position + 1
+                hits.append((end - len(self._patterns[pattern_id][0]), end, pattern_id))
+        return hits
+
+    # 根據命中結果計算類別分數，返回 (最高分類別, [(類別, 分數)])
+    def classify(self, hits):
+        category_scores = Counter()
+        for pattern_id in {pattern_id for _, _, pattern_id in hits}:
+            for category in self._patterns[pattern_id][1]:
+                category_scores[category] += 1
+
+        # 按分數排序（同分時保持分類器中的類別順序）
+        sorted_categories = sorted(
+            [(category, category_scores[category]) for category in self.category_order if category in category_scores],
+            key=lambda x: x[1],
+            reverse=True
+        )
+        if sorted_categories:
+            return sorted_categories[0][0], sorted_categories
+        return None, []
+
+    # 根據命中結果提取法律關鍵詞，返回 [(關鍵詞, 字典信息, 出現次數)]
+    def legal_keywords(self, hits, topK=10):
+        # 以最左最長且不重疊的方式選取命中，與分詞結果保持一致
+        keyword_hits = sorted(
+            [(start, -end, pattern_id) for start, end, pattern_id in hits if self._patterns[pattern_id][2]]
+        )
+        selected = []
+        last_end = 0
+        for start, negative_end, pattern_id in keyword_hits:
+            if start >= last_end:
+                selected.append(self._patterns[pattern_id][0])
+                last_end = -negative_end
+
+        # 按出現頻率排序
+        counter = Counter(selected)
+        legal_keywords_with_freq = [(keyword, self.keywords_dict[keyword], counter[keyword]) for keyword in selected]
+        legal_keywords_with_freq.sort(key=lambda x: x[2], reverse=True)
+
+        return legal_keywords_with_freq[:topK]
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
@@ -8,8 +8,9 @@ import json
 import os
 import logging
 from datetime import datetime
-import jieba
 import re
+import text_tokenizer
+import legal_search
 
 # 設置日誌
 logging.basicConfig(
@@ -36,13 +37,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # 允許前端讀取分頁游標
 )
 
-# 數據庫連接
+# 數據庫連接（反饋和歷史記錄；法規和判例通過 legal_search 的全文搜索索引查詢）
 DB_PATH = "/home/ubuntu/legal-ai-system/data/legal_db.sqlite"
 
+# 同步依賴在線程池中執行，而 async 端點在事件循環線程中使用連接，需關閉同線程檢查（每個請求獨立連接，不會並發使用）
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     try:
         yield conn
@@ -83,48 +86,29 @@ def log_request(question: str, ip: str):
 
 # 關鍵詞提取
 def extract_keywords(text):
-    # 使用jieba進行分詞
-    words = jieba.cut(text)
+    # 使用查詢分詞器進行分詞
+    words = text_tokenizer.get_tokenizer(text_tokenizer.QUERY_TOKENIZER).cut(text)
     # 過濾停用詞和標點符號
-    stopwords = {'的', '了', '和', '是', '在', '我', '有', '這', '那', '你', '他', '她', '它', '們', '什麼', '怎麼', '如何', '為什麼'}
-    keywords = [word for word in words if word not in stopwords and len(word) > 1 and not re.match(r'[^\w\s]', word)]
+    keywords = [word for word in words if word not in text_tokenizer.QUESTION_STOPWORDS and len(word) > 1 and not re.match(r'[^\w\s]', word)]
     return keywords
 
-# 法律搜索
-def search_laws(keywords, db):
+# 按詞彙表規劃查詢詞：刪除停用詞和過於常見的詞（bm25 排序需為每個匹配文檔計分，常見詞匹配的文檔最多）
+def plan_keywords(doc_type, keywords):
+    return [term for term, df in legal_search.get_query_planner(doc_type).plan(keywords).terms]
+
+# 法律搜索：FTS5全文搜索，按 bm25 相關性排序（已拆分條文時返回相關條文）
+def search_laws(keywords):
+    keywords = plan_keywords(legal_search.get_law_doc_type(), keywords)
     if not keywords:
         return []
-    
-    # 構建查詢條件
-    query_conditions = " OR ".join(["title LIKE ? OR content LIKE ?" for _ in keywords])
-    params = []
-    for keyword in keywords:
-        params.extend([f"%{keyword}%", f"%{keyword}%"])
-    
-    query = f"SELECT * FROM laws WHERE {query_conditions} LIMIT 5"
-    
-    cursor = db.cursor()
-    cursor.execute(query, params)
-    laws = [dict(row) for row in cursor.fetchall()]
-    return laws
+    return legal_search.search_laws(keywords, limit=5)
 
-# 判例搜索
-def search_cases(keywords, db):
+# 判例搜索：FTS5全文搜索，按 bm25 相關性排序
+def search_cases(keywords):
+    keywords = plan_keywords("case", keywords)
     if not keywords:
         return []
-    
-    # 構建查詢條件
-    query_conditions = " OR ".join(["title LIKE ? OR content LIKE ?" for _ in keywords])
-    params = []
-    for keyword in keywords:
-        params.extend([f"%{keyword}%", f"%{keyword}%"])
-    
-    query = f"SELECT * FROM cases WHERE {query_conditions} LIMIT 5"
-    
-    cursor = db.cursor()
-    cursor.execute(query, params)
-    cases = [dict(row) for row in cursor.fetchall()]
-    return cases
+    return legal_search.search_cases(keywords, limit=5)
 
 # 生成回答
 def generate_response(question, laws, cases):
@@ -137,7 +121,7 @@ def generate_response(question, laws, cases):
     if laws:
         response += "相關法規：\n"
         for law in laws:
-            response += f"- {law['title']}: {law['content'][:100]}...\n"
+            response += f"- {law['title']}{law.get('article') or ''}: {law['content'][:100]}...\n"
         response += "\n"
     
     if cases:
@@ -184,8 +168,7 @@ def read_root():
 @app.post("/api/question")
 async def answer_question(
     request: QuestionRequest, 
-    background_tasks: BackgroundTasks, 
-    db: sqlite3.Connection = Depends(get_db)
+    background_tasks: BackgroundTasks
 ):
     question = request.question
     
@@ -202,8 +185,8 @@ async def answer_question(
     keywords = extract_keywords(question)
     
     # 搜索相關法規和判例
-    laws = search_laws(keywords, db)
-    cases = search_cases(keywords, db)
+    laws = search_laws(keywords)
+    cases = search_cases(keywords)
     
     # 生成回答
     response = generate_response(question, laws, cases)
@@ -225,123 +208,129 @@ async def answer_question(
 
 @app.get("/api/laws")
 async def get_laws(
+    response: Response,
     keyword: Optional[str] = None,
     category: Optional[str] = None,
     limit: int = 20,
-    db: sqlite3.Connection = Depends(get_db)
+    cursor: Optional[str] = None
 ):
     # 檢查緩存
-    cache_key = f"laws_{keyword}_{category}_{limit}"
+    cache_key = f"laws_{keyword}_{category}_{limit}_{cursor}"
     cached_result = get_cache(cache_key)
     if cached_result:
-        return cached_result
-    
-    cursor = db.cursor()
-    query = "SELECT * FROM laws WHERE 1=1"
-    params = []
-    
-    if keyword:
-        query += " AND (title LIKE ? OR content LIKE ?)"
-        params.extend([f"%{keyword}%", f"%{keyword}%"])
-    
-    if category:
-        query += " AND category = ?"
-        params.append(category)
-    
-    query += f" LIMIT {limit}"
+        laws, next_cursor = cached_result
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return laws
+    
+    # 有關鍵詞時使用全文搜索按相關性分頁，否則按ID分頁；下一頁游標通過響應頭 X-Next-Cursor 返回
+    # 已拆分條文時返回條文（與 /api/question 一致），結果的 doc_type 標明是法規還是條文
+    keywords = [keyword] if keyword else []
+    try:
+        laws, next_cursor = legal_search.search_law_page(keywords, category, limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"法規查詢失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"法規查詢失敗: {str(e)}")
     
-    cursor.execute(query, params)
-    laws = [dict(row) for row in cursor.fetchall()]
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     # 設置緩存
-    set_cache(cache_key, laws)
+    set_cache(cache_key, (laws, next_cursor))
     
     return laws
 
 @app.get("/api/cases")
 async def get_cases(
+    response: Response,
     keyword: Optional[str] = None,
     case_type: Optional[str] = None,
     limit: int = 20,
-    db: sqlite3.Connection = Depends(get_db)
+    cursor: Optional[str] = None
 ):
     # 檢查緩存
-    cache_key = f"cases_{keyword}_{case_type}_{limit}"
+    cache_key = f"cases_{keyword}_{case_type}_{limit}_{cursor}"
     cached_result = get_cache(cache_key)
     if cached_result:
-        return cached_result
-    
-    cursor = db.cursor()
-    query = "SELECT * FROM cases WHERE 1=1"
-    params = []
-    
-    if keyword:
-        query += " AND (title LIKE ? OR content LIKE ?)"
-        params.extend([f"%{keyword}%", f"%{keyword}%"])
-    
-    if case_type:
-        query += " AND case_type = ?"
-        params.append(case_type)
+        cases, next_cursor = cached_result
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return cases
     
-    query += f" LIMIT {limit}"
+    # 有關鍵詞時使用全文搜索按相關性分頁，否則按ID分頁；下一頁游標通過響應頭 X-Next-Cursor 返回
+    keywords = [keyword] if keyword else []
+    try:
+        cases, next_cursor = legal_search.search_page("case", keywords, case_type, limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"判例查詢失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"判例查詢失敗: {str(e)}")
     
-    cursor.execute(query, params)
-    cases = [dict(row) for row in cursor.fetchall()]
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     # 設置緩存
-    set_cache(cache_key, cases)
+    set_cache(cache_key, (cases, next_cursor))
     
     return cases
 
 @app.get("/api/laws/{law_id}")
-async def get_law_detail(
-    law_id: int,
-    db: sqlite3.Connection = Depends(get_db)
-):
+async def get_law_detail(law_id: int):
     # 檢查緩存
     cache_key = f"law_detail_{law_id}"
     cached_result = get_cache(cache_key)
     if cached_result:
         return cached_result
     
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM laws WHERE id = ?", (law_id,))
-    law = cursor.fetchone()
+    law = legal_search.get_document("law", law_id)
     
     if not law:
         raise HTTPException(status_code=404, detail="法規未找到")
     
-    result = dict(law)
-    
     # 設置緩存
-    set_cache(cache_key, result)
+    set_cache(cache_key, law)
     
-    return result
+    return law
 
 @app.get("/api/cases/{case_id}")
-async def get_case_detail(
-    case_id: int,
-    db: sqlite3.Connection = Depends(get_db)
-):
+async def get_case_detail(case_id: int):
     # 檢查緩存
     cache_key = f"case_detail_{case_id}"
     cached_result = get_cache(cache_key)
     if cached_result:
         return cached_result
     
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM cases WHERE id = ?", (case_id,))
-    case = cursor.fetchone()
+    case = legal_search.get_document("case", case_id)
     
     if not case:
         raise HTTPException(status_code=404, detail="判例未找到")
     
-    result = dict(case)
-    
     # 設置緩存
-    set_cache(cache_key, result)
-    
-    return result
+    set_cache(cache_key, case)
+
+    return case
+
+# 法規條文詳情（/api/question 已拆分條文時返回的 id 為條文ID，所屬法規見 law_id）
+@app.get("/api/articles/{article_id}")
+async def get_article_detail(article_id: int):
+    # 檢查緩存
+    cache_key = f"article_detail_{article_id}"
+    cached_result = get_cache(cache_key)
+    if cached_result:
+        return cached_result
+
+    article = legal_search.get_document("article", article_id)
+
+    if not article:
+        raise HTTPException(status_code=404, detail="條文未找到")
+
+    # 設置緩存
+    set_cache(cache_key, article)
+
+    return article
 
 @app.post("/api/feedback")
 async def save_feedback(
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 全文搜索查詢詞規劃
+# 問題分析產生的關鍵詞（TF-IDF、TextRank、法律詞、實體、行為短語）合併後常有30個以上，
+# 以 OR 連接時每個詞都要讀取一次倒排列表；常見詞的倒排列表最長，卻幾乎不影響排序。
+# 按預先計算的文檔頻率（DF）刪除停用詞和過於常見的詞、拆分詞表外的短語，並限制詞數。
+
+import os
+import math
+import sqlite3
+from collections import Counter
+from datetime import datetime
+import text_tokenizer
+import token_store
+
+# 設定基本參數
+DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
+DB_FILE = os.path.join(DB_DIR, "legal_db.sqlite")
+LOG_FILE = os.path.join(DB_DIR, "query_planner_log.txt")
+
+# 查詢詞上限：按IDF從高到低保留
+MAX_QUERY_TERMS = int(os.environ.get("MAX_QUERY_TERMS", "12"))
+
+# 文檔頻率超過文檔總數此比例的詞視為過於常見（文檔數少於 MIN_PRUNE_DOCS 時不按比例刪除，避免小語料誤刪）
+MAX_DF_RATIO = float(os.environ.get("MAX_DF_RATIO", "0.5"))
+MIN_PRUNE_DOCS = int(os.environ.get("MIN_PRUNE_DOCS", "20"))
+
+# 查詢詞的停用詞：問題停用詞和通用停用詞
+PLANNER_STOPWORDS = text_tokenizer.QUESTION_STOPWORDS | text_tokenizer.STOPWORDS
+
+# 確保目錄存在
+os.makedirs(DB_DIR, exist_ok=True)
+
+# 記錄函數
+def log_message(message):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"[{timestamp}] {message}\n")
+    print(f"[{timestamp}] {message}")
+
+# 創建詞彙表（每個詞的文檔頻率）和語料統計表
+def ensure_vocabulary_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS term_vocabulary (
+        doc_type TEXT NOT NULL,
+        tokenizer_version TEXT NOT NULL,
+        term TEXT NOT NULL,
+        df INTEGER NOT NULL,
+        PRIMARY KEY (doc_type, tokenizer_version, term)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS corpus_statistics (
+        doc_type TEXT NOT NULL,
+        tokenizer_version TEXT NOT NULL,
+        doc_count INTEGER NOT NULL,
+        PRIMARY KEY (doc_type, tokenizer_version)
+    )
+    ''')
+
+# 由已保存的詞頻向量重建文檔類型的詞彙表，返回 (文檔數, 詞彙量)
+def build_vocabulary(conn, doc_type):
+    ensure_vocabulary_table(conn)
+    df = Counter()
+    doc_count = 0
+    for doc_id, vector, norm in token_store.iter_document_vectors(conn, doc_type):
+        df.update(vector.keys())
+        doc_count += 1
+
+    version = token_store.TOKENIZER_VERSION
+    conn.execute("DELETE FROM term_vocabulary WHERE doc_type = ? AND tokenizer_version = ?", (doc_type, version))
+    conn.executemany(
+        "INSERT INTO term_vocabulary (doc_type, tokenizer_version, term, df) VALUES (?, ?, ?, ?)",
+        ((doc_type, version, term, count) for term, count in df.items())
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO corpus_statistics (doc_type, tokenizer_version, doc_count) VALUES (?, ?, ?)",
+        (doc_type, version, doc_count)
+    )
+    conn.commit()
+    return doc_count, len(df)
+
+# 查詢計劃：保留的查詢詞（按IDF從高到低）和被刪除的詞及原因
+class QueryPlan:
+    def __init__(self, doc_type, keywords, terms, dropped, doc_count):
+        self.doc_type = doc_type
+        self.keywords = keywords
+        self.terms = terms
+        self.dropped = dropped
+        self.doc_count = doc_count
+
+    def to_dict(self):
+        return {
+            "keywords": len(self.keywords),
+            "terms": [{"term": term, "df": df} for term, df in self.terms],
+            "dropped": [{"term": term, "reason": reason} for term, reason in self.dropped],
+            "doc_count": self.doc_count
+        }
+
+    # 計劃摘要，用於日誌
+    def describe(self):
+        kept = ", ".join(f"{term}(df={'?' if df is None else df})" for term, df in self.terms)
+        dropped = ", ".join(f"{term}({reason})" for term, reason in self.dropped)
+        return f"{self.doc_type}查詢計劃: {len(self.keywords)} -> {len(self.terms)} 個詞 [{kept}]，刪除 [{dropped}]"
+
+# 查詢詞規劃器：詞彙表在建立時整體載入記憶體，規劃時只做字典查找
+class QueryPlanner:
+    def __init__(self, doc_type, df, doc_count, max_terms=MAX_QUERY_TERMS, max_df_ratio=MAX_DF_RATIO):
+        self.doc_type = doc_type
+        self.df = df
+        self.doc_count = doc_count
+        self.max_terms = max_terms
+        self.max_df_ratio = max_df_ratio
+
+    # 從數據庫載入文檔類型的詞彙表，詞彙表尚未建立時只按停用詞和詞數上限規劃
+    @classmethod
+    def load(cls, conn, doc_type):
+        version = token_store.TOKENIZER_VERSION
+        try:
+            row = conn.execute(
+                "SELECT doc_count FROM corpus_statistics WHERE doc_type = ? AND tokenizer_version = ?",
+                (doc_type, version)
+            ).fetchone()
+            df = dict(conn.execute(
+                "SELECT term, df FROM term_vocabulary WHERE doc_type = ? AND tokenizer_version = ?",
+                (doc_type, version)
+            ).fetchall())
+        except sqlite3.OperationalError as e:
+            log_message(f"讀取{doc_type}詞彙表失敗: {str(e)}")
+            row, df = None, {}
+        if not df:
+            log_message(f"警告: {doc_type}查詢詞彙表為空，只能刪除停用詞和限制詞數，請先運行 ai_setup.py 建立詞彙表")
+        return cls(doc_type, df, row[0] if row else 0)
+
+    # 詞的IDF，詞彙表中沒有的詞視為最罕見
+    def idf(self, df):
+        if df is None:
+            df = 0
+        return math.log((self.doc_count + 1) / (df + 1))
+
+    def is_stopword(self, term):
+        return len(term) < 2 or term in PLANNER_STOPWORDS or text_tokenizer.PUNCTUATION_RE.fullmatch(term) is not None
+
+    # 詞表外的長短語拆分為詞表中的詞；只能拆出一個詞或拆不出時保留原短語
+    def split_phrase(self, term):
+        if term in self.df or not self.df:
+            return [term]
+        parts = [part for part in token_store.tokenize_document(term) if part in self.df and not self.is_stopword(part)]
+        return parts if len(parts) > 1 else [term]
+
+    # 規劃查詢詞，返回 QueryPlan
+    def plan(self, keywords):
+        keywords = list(dict.fromkeys((keyword or "").strip() for keyword in keywords))
+        keywords = [keyword for keyword in keywords if keyword]
+        dropped = []
+
+        # 刪除停用詞，拆分詞表外的短語
+        candidates = []
+        for keyword in keywords:
+            if self.is_stopword(keyword):
+                dropped.append((keyword, "stopword"))
+                continue
+            parts = self.split_phrase(keyword)
+            if parts != [keyword]:
+                dropped.append((keyword, "split:" + "+".join(parts)))
+            candidates.extend(parts)
+        candidates = list(dict.fromkeys(candidates))
+
+        # 刪除過於常見的詞（至少保留一個詞）
+        if self.doc_count >= MIN_PRUNE_DOCS:
+            limit = self.max_df_ratio * self.doc_count
+            common = [term for term in candidates if (self.df.get(term) or 0) > limit]
+            if len(common) == len(candidates) and common:
+                common.remove(min(common, key=lambda term: self.df[term]))
+            for term in common:
+                dropped.append((term, f"common:{self.df[term]}/{self.doc_count}"))
+            candidates = [term for term in candidates if term not in common]
+
+        # OR 查詢中包含另一個保留詞的短語只匹配其子集，不增加召回
+        kept = set(candidates)
+        subsumed = [term for term in candidates if any(other != term and other in term for other in kept)]
+        for term in subsumed:
+            dropped.append((term, "subsumed"))
+        candidates = [term for term in candidates if term not in subsumed]
+
+        # 按IDF從高到低保留上限數量的詞；詞彙表中沒有的詞很可能沒有匹配，排在已知詞之後
+        candidates.sort(key=lambda term: (bool(self.df) and term not in self.df, -self.idf(self.df.get(term))))
+        for term in candidates[self.max_terms:]:
+            dropped.append((term, "limit"))
+        terms = [(term, self.df.get(term)) for term in candidates[:self.max_terms]]
+        return QueryPlan(self.doc_type, keywords, terms, dropped, self.doc_count)
+
+# 主函數：由已保存的詞頻向量重建詞彙表（先運行 token_store.py；ai_setup.py 建立索引時也會重建）
+def main():
+    log_message(f"開始建立查詢詞彙表，分詞器版本: {token_store.TOKENIZER_VERSION}")
+
+    conn = sqlite3.connect(DB_FILE)
+    for doc_type in token_store.DOC_TABLES:
+        try:
+            doc_count, vocabulary_size = build_vocabulary(conn, doc_type)
+            log_message(f"{doc_type}詞彙表: {doc_count} 篇文檔，詞彙量 {vocabulary_size}")
+        except sqlite3.OperationalError as e:
+            log_message(f"建立{doc_type}詞彙表失敗: {str(e)}")
+    conn.close()
+
+    log_message("查詢詞彙表建立完成")
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,8 @@ def load_response_templates():
 def load_keyword_extractor():
     try:
         import keyword_extractor
+        # 預先載入共用的問題分析器
+        keyword_extractor.get_analyzer()
         log_message("成功載入關鍵詞提取系統")
         return keyword_extractor
     except Exception as e:
@@ -125,7 +127,8 @@ def generate_legal_advice(question, search_result, templates):
             law = search_result["laws"][0]  # 使用最相關的法規
             law_template = random.choice(templates.get("general_law_query", ["根據{law_name}，{law_content}"]))
             law_content = extract_key_content_from_law(law["content"])
-            law_part = law_template.format(law_name=law["title"], law_content=law_content)
+            # 條文搜索結果的法規名稱帶條號（如「中華民國刑法第277條」）
+            law_part = law_template.format(law_name=law["title"] + law.get("article", ""), law_content=law_content)
             response_parts.append(law_part)
         
         # 添加判例引用
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 全文搜索查詢構建器
+# 每個搜索目標只產生固定的幾條參數化語句（MATCH ? / 過濾欄位 = ? / LIMIT ?），
+# 不同問題使用相同的SQL文本，可重複使用sqlite3連接的預編譯語句緩存
+
+import json
+import base64
+import hashlib
+import threading
+import itertools
+from collections import OrderedDict
+import fts_index
+
+# 摘要中關鍵詞的標記和省略號（與 legal_search.format_excerpt 一致）
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_ELLIPSIS = "…"
+
+# sqlite3.connect 的 cached_statements 預設值，統計時按相同容量模擬緩存
+STATEMENT_CACHE_SIZE = 128
+
+# 語句緩存統計：按連接模擬sqlite3的LRU語句緩存，記錄SQL文本是否命中
+class StatementCacheStats:
+    def __init__(self, capacity=STATEMENT_CACHE_SIZE):
+        self.capacity = capacity
+        self._caches = {}
+        self._statements = set()
+        self._lock = threading.Lock()
+        self._executions = 0
+        self._hits = 0
+
+    # 記錄一次語句執行
+    def record(self, conn, sql):
+        with self._lock:
+            cache = self._caches.setdefault(id(conn), OrderedDict())
+            self._executions += 1
+            self._statements.add(sql)
+            if sql in cache:
+                cache.move_to_end(sql)
+                self._hits += 1
+            else:
+                cache[sql] = True
+                if len(cache) > self.capacity:
+                    cache.popitem(last=False)
+
+    # 語句緩存統計
+    def stats(self):
+        with self._lock:
+            return {
+                "executions": self._executions,
+                "hits": self._hits,
+                "misses": self._executions - self._hits,
+                "hit_rate": round(self._hits / self._executions, 4) if self._executions else 0.0,
+                "distinct_statements": len(self._statements),
+                "connections": len(self._caches)
+            }
+
+# 全局語句緩存統計
+statement_stats = StatementCacheStats()
+
+# 查詢條件的指紋：游標只能用於產生它的同一個查詢
+def query_fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+# 將最後一條結果的排序鍵編碼為不透明的分頁游標
+def encode_cursor(keys, fingerprint):
+    raw = json.dumps({"k": list(keys), "f": fingerprint}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+# 解碼分頁游標，返回排序鍵；格式錯誤或不屬於此查詢時拋出 ValueError
+def decode_cursor(cursor, fingerprint):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        keys = tuple(data["k"])
+    except Exception:
+        raise ValueError("無效的分頁游標")
+    if data.get("f") != fingerprint:
+        raise ValueError("分頁游標不屬於此查詢")
+    return keys
+
+# 數據表的全文搜索查詢：建立時生成全部語句，查詢時只選擇語句和綁定參數
+# snippet 為 (欄位, 長度) 時額外返回該欄位的摘要：有關鍵詞時使用FTS5 snippet()（長度為詞數），否則取開頭（長度為字數）
+# excerpt 為 (欄位, 字數) 時額外返回該欄位在第一個關鍵詞附近的片段和片段起始位置（用於不保存內容的bigram索引），
+# 片段多取一個字，用於判斷後面是否還有內容
+# date_column 為日期範圍過濾的欄位（YYYY-MM-DD 格式，包含兩端）
+class SearchQueryBuilder:
+    def __init__(self, table, columns, filter_column, rank, snippet=None, date_column="date", excerpt=None):
+        fts = fts_index.FTS_TABLES[table]["fts"]
+        select = ", ".join(f"{table}.{column}" for column in columns)
+        match_select = select
+        filter_clause = f"{table}.{filter_column} = ?"
+        if snippet:
+            column, length = snippet
+            column_index = fts_index.FTS_TABLES[table]["columns"].index(column)
+            match_select += (
+                f", snippet({fts}, {column_index}, '{SNIPPET_START}', '{SNIPPET_END}', '{SNIPPET_ELLIPSIS}', {length})"
+            )
+            select += f", substr({table}.{column}, 1, {length * 4})"
+        if excerpt:
+            column, length = excerpt
+            # 片段從關鍵詞前 1/4 長度處開始；關鍵詞不在此欄位（如只匹配標題）時 instr 為0，從開頭截取
+            start = f"max(1, instr({table}.{column}, ?) - {length // 4})"
+            excerpt_select = f", substr({table}.{column}, {start}, {length + 1}), {start}"
+            select += excerpt_select
+            match_select += excerpt_select
+
+        self.table = table
+        self.excerpt = excerpt
+        self.statements = {}
+        # 鍵為 (是否有關鍵詞, 是否有過濾條件, 是否有起始日期, 是否有結束日期, 是否有分頁游標)
+        # 分頁使用鍵集條件（排序鍵大於上一頁最後一條），深頁不需要像 OFFSET 一樣掃描並丟棄前面的結果
+        for key in itertools.product((False, True), repeat=5):
+            has_match, has_filter, has_from, has_to, has_after = key
+            conditions = []
+            if has_match:
+                conditions.append(f"{fts} MATCH ?")
+            if has_filter:
+                conditions.append(filter_clause)
+            if has_from:
+                conditions.append(f"{table}.{date_column} >= ?")
+            if has_to:
+                conditions.append(f"{table}.{date_column} <= ?")
+            if has_after:
+                if has_match:
+                    conditions.append(f"({rank} > ? OR ({rank} = ? AND {table}.id > ?))")
+                else:
+                    conditions.append(f"{table}.id < ?")
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            if has_match:
+                sql = (
+                    f"SELECT {match_select}, {rank} AS score FROM {fts} JOIN {table} ON {fts}.rowid = {table}.id"
+                    f"{where} ORDER BY score, {table}.id LIMIT ?"
+                )
+            else:
+                sql = f"SELECT {select}, NULL FROM {table}{where} ORDER BY {table}.id DESC LIMIT ?"
+            self.statements[key] = sql
+
+    # 返回 (SQL, 參數)；有關鍵詞但無法構建 MATCH 表達式時返回 (None, None)
+    # after 為上一頁最後一條的排序鍵：有關鍵詞時為 (bm25分數, ID)，否則為 (ID,)
+    # date_range 為 (起始日期, 結束日期)，任一端可為 None
+    # 有 excerpt 時以第一個關鍵詞（查詢計劃中IDF最高的詞）定位片段，參數位於 SELECT 子句，排在最前
+    def build(self, keywords, filter_value, limit, mode, after=None, date_range=None):
+        params = []
+        if self.excerpt:
+            term = next((keyword for keyword in keywords or [] if keyword), "")
+            params.extend([term, term])
+        match = None
+        if keywords:
+            # 關鍵詞作為FTS5短語傳入，雙引號在 fts_index.quote_phrase 中轉義
+            match = fts_index.build_match_expression(keywords, mode)
+            if match is None:
+                return None, None
+            params.append(match)
+        if filter_value:
+            params.append(filter_value)
+        date_from, date_to = date_range or (None, None)
+        if date_from:
+            params.append(date_from)
+        if date_to:
+            params.append(date_to)
+        if after:
+            if match is not None:
+                score, doc_id = after
+                params.extend([score, score, doc_id])
+            else:
+                params.append(after[-1])
+        params.append(int(limit))
+        key = (match is not None, bool(filter_value), bool(date_from), bool(date_to), bool(after))
+        return self.statements[key], params
+
+    # 構建並執行查詢，返回結果行
+    def execute(self, conn, keywords, filter_value, limit, mode, after=None, date_range=None):
+        sql, params = self.build(keywords, filter_value, limit, mode, after, date_range)
+        if sql is None:
+            return None
+        statement_stats.record(conn, sql)
+        return conn.execute(sql, params).fetchall()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+from contextlib import contextmanager
+
+# 分階段計時器，用於回報分析和搜索各階段的耗時（毫秒）
+class StageTimer:
+    def __init__(self):
+        self.timings = {}
+        self._start = time.perf_counter()
+
+    # 計時一個階段，同名階段的耗時會累加
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[name] = round(self.timings.get(name, 0.0) + elapsed, 3)
+
+    # 返回各階段耗時及總耗時
+    def report(self):
+        timings = dict(self.timings)
+        timings["total"] = round((time.perf_counter() - self._start) * 1000, 3)
+        return timings
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+# 測試直接導入項目根目錄的模塊
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
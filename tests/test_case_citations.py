@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import case_citations
+
+CASE_COLUMNS = ["id", "title", "case_number"]
+
+# 建立只包含字號查詢所需欄位的判決表
+def make_db(rows):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE court_cases (id INTEGER PRIMARY KEY, case_id TEXT, title TEXT, year TEXT, case_type TEXT, case_number TEXT)")
+    conn.executemany("INSERT INTO court_cases (case_id, title, year, case_type, case_number) VALUES (?, ?, ?, ?, ?)", rows)
+    return conn
+
+def test_parse_case_citation_with_court():
+    citations = case_citations.parse_case_citations("請查詢最高法院110年度台上字第1234號判決")
+    assert len(citations) == 1
+    citation = citations[0]
+    assert citation["court"].endswith("最高法院")
+    assert (citation["year"], citation["case_word"], citation["case_number"]) == ("110", "台上", "1234")
+
+def test_parse_case_citation_chinese_numerals_and_spaces():
+    citations = case_citations.parse_case_citations("臺灣高等法院臺中分院 一百零九 年度 上訴 字第 五十六 號")
+    assert [(c["year"], c["case_word"], c["case_number"]) for c in citations] == [("109", "上訴", "56")]
+
+def test_parse_case_citation_without_court():
+    citations = case_citations.parse_case_citations("110年度台上字第1234號")
+    assert citations[0]["court"] is None
+
+def test_jid_court():
+    assert case_citations.jid_court("TPSV,110,台上,1234,20210825,1") == "最高法院"
+    assert case_citations.jid_court("TCHM,109,上訴,56,20200301,1") == "臺灣高等法院臺中分院"
+    assert case_citations.jid_court("109-台上-2134") == ""
+    assert case_citations.jid_court(None) == ""
+
+def test_matches_court_uses_jid_for_jtitle_rows():
+    citation = case_citations.parse_case_citations("最高法院110年度台上字第1234號")[0]
+    # 司法院資料的標題為案由，不含法院名稱
+    assert case_citations.matches_court(citation, "損害賠償", "TPSV,110,台上,1234,20210825,1")
+    assert not case_citations.matches_court(citation, "損害賠償", "TPHV,110,台上,1234,20210825,1")
+    # 無法確定判決的法院時不過濾
+    assert case_citations.matches_court(citation, "損害賠償")
+
+def test_matches_court_from_title_and_abbreviation():
+    citation = case_citations.parse_case_citations("臺北地方法院107年度訴字第5678號")[0]
+    assert case_citations.matches_court(citation, "臺灣臺北地方法院 107 年度訴字第 5678 號刑事判決")
+    assert not case_citations.matches_court(citation, "臺灣新北地方法院 107 年度訴字第 5678 號刑事判決")
+
+def test_lookup_case_citation_on_jtitle_rows():
+    conn = make_db([
+        ("TPSV,110,台上,1234,20210825,1", "損害賠償", "110", "台上", "1234"),
+        ("TPHV,110,臺上,1234,20210901,1", "給付工程款", "110", "臺上", "1234"),
+        ("TPSV,110,台上,999,20210825,1", "損害賠償", "110", "台上", "999")
+    ])
+    citation = case_citations.parse_case_citations("最高法院110年度台上字第1234號")[0]
+    assert [doc["id"] for doc in case_citations.lookup_case_citation(conn, citation, CASE_COLUMNS)] == [1]
+
+    # 沒有法院名稱時，台/臺兩種寫法的同字號判決都返回
+    citation = case_citations.parse_case_citations("110年度臺上字第1234號")[0]
+    assert [doc["id"] for doc in case_citations.lookup_case_citation(conn, citation, CASE_COLUMNS)] == [1, 2]
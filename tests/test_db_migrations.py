@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+import db_migrations
+
+def test_normalize_date_formats():
+    assert db_migrations.normalize_date("20210623") == "2021-06-23"
+    assert db_migrations.normalize_date("2021/6/23") == "2021-06-23"
+    assert db_migrations.normalize_date("2021.06.03") == "2021-06-03"
+    assert db_migrations.normalize_date("2021-6-3") == "2021-06-03"
+    assert db_migrations.normalize_date(" 2021-06-23 ") == "2021-06-23"
+    assert db_migrations.normalize_date(20210623) == "2021-06-23"
+
+def test_normalize_date_keeps_unrecognized_values():
+    assert db_migrations.normalize_date("") == ""
+    assert db_migrations.normalize_date(None) is None
+    assert db_migrations.normalize_date("民國110年6月23日") == "民國110年6月23日"
+    assert db_migrations.normalize_date("2021-06") == "2021-06"
+
+def test_is_iso_date():
+    assert db_migrations.is_iso_date("2021-06-23")
+    assert db_migrations.is_iso_date("2020-02-29")
+    assert not db_migrations.is_iso_date("2021-02-29")
+    assert not db_migrations.is_iso_date("2019-13-01")
+    assert not db_migrations.is_iso_date("20210623")
+    assert not db_migrations.is_iso_date("")
+    assert not db_migrations.is_iso_date(None)
+
+def test_normalize_date_rejects_ambiguous_and_invalid_dates():
+    assert db_migrations.normalize_date("2021123") == "2021123"
+    assert db_migrations.normalize_date("2021/13/01") == "2021/13/01"
+    assert db_migrations.normalize_date("2021/2/30") == "2021/2/30"
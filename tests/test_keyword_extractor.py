@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+import keyword_extractor
+
+def test_normalize_question_keeps_punctuation():
+    assert keyword_extractor.normalize_question("  民法　第184條  是什麼？ ") == "民法 第184條 是什麼?"
+    assert keyword_extractor.normalize_question(None) == ""
+
+def test_question_cache_key_ignores_trailing_punctuation():
+    key = keyword_extractor.question_cache_key("民法第184條是什麼")
+    for question in ("民法第184條是什麼?", "民法第184條是什麼？", "民法第184條是什麼。", "民法第184條是什麼？！ ", " 民法第184條是什麼"):
+        assert keyword_extractor.question_cache_key(question) == key, question
+
+def test_question_cache_key_keeps_inner_punctuation():
+    # 句中的標點影響實體和行為抽取，不能共用緩存
+    assert keyword_extractor.question_cache_key("我在台北，他打了我") != keyword_extractor.question_cache_key("我在台北他打了我")
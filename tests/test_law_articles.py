@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import law_articles
+
+def test_parse_number_arabic_and_fullwidth():
+    assert law_articles.parse_number("184") == 184
+    assert law_articles.parse_number("１８４") == 184
+    assert law_articles.parse_number(" 7 ") == 7
+
+def test_parse_number_chinese():
+    assert law_articles.parse_number("一百八十四") == 184
+    assert law_articles.parse_number("十") == 10
+    assert law_articles.parse_number("十五") == 15
+    assert law_articles.parse_number("一百零五") == 105
+    assert law_articles.parse_number("兩千") == 2000
+    assert law_articles.parse_number("二〇一") == 201
+
+def test_parse_number_invalid():
+    assert law_articles.parse_number("") is None
+    assert law_articles.parse_number(None) is None
+    assert law_articles.parse_number("第一") is None
+
+def test_format_article_label():
+    assert law_articles.format_article_label(184) == "第184條"
+    assert law_articles.format_article_label(185, 3) == "第185條之3"
+
+def test_split_articles():
+    content = "\n".join([
+        "第 1 條",
+        "行為之處罰，以行為時之法律有明文規定者為限。",
+        "拘束人身自由之保安處分，亦同。",
+        "第一百八十五條之三",
+        "駕駛動力交通工具而有下列情形之一者。",
+        "第 24-1 條",
+        "依第一百三十五條、第一百三十六條之規定處罰。",
+        "第 2 條",
+        "第 1 條",
+        "重複的條號只保留第一條。"
+    ])
+    assert law_articles.split_articles(content) == [
+        (1, 0, "行為之處罰，以行為時之法律有明文規定者為限。\n拘束人身自由之保安處分，亦同。"),
+        (185, 3, "駕駛動力交通工具而有下列情形之一者。"),
+        (24, 1, "依第一百三十五條、第一百三十六條之規定處罰。")
+    ]
+
+def test_split_articles_without_headings():
+    assert law_articles.split_articles("本法自公布日施行。") == []
+    assert law_articles.split_articles("") == []
+    assert law_articles.split_articles(None) == []
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import law_citations
+
+# 法規ID 1 為民法，2 為刑法，3 為勞動基準法；條文ID = 法規ID * 1000 + 條號
+LAW_TITLES = {1: "中華民國民法", 2: "中華民國刑法", 3: "勞動基準法"}
+ARTICLES = {
+    (1, 184, 0): 1184,
+    (1, 185, 0): 1185,
+    (2, 185, 3): 2185,
+    (3, 24, 1): 3024
+}
+
+def make_index():
+    return law_citations.CitationIndex(LAW_TITLES, ARTICLES)
+
+def summary(citations):
+    return [(c["law_id"], c["article_number"], c["article_suffix"]) for c in citations]
+
+# 模擬 legal_search.lookup_citations 標記引用是否找到條文
+def resolve_all(index, citations):
+    for citation in citations:
+        citation["found"] = index.resolve(citation) is not None
+    return citations
+
+def test_parse_full_name_prefix_and_alias():
+    index = make_index()
+    assert summary(index.parse("中華民國民法第184條")) == [(1, 184, 0)]
+    assert summary(index.parse("民法第一百八十四條")) == [(1, 184, 0)]
+    assert summary(index.parse("刑法第185條之3")) == [(2, 185, 3)]
+    assert summary(index.parse("勞基法24-1條")) == [(3, 24, 1)]
+
+def test_parse_continuation_keeps_previous_law():
+    citations = make_index().parse("民法第184條、第185條及刑法第185條之3")
+    assert summary(citations) == [(1, 184, 0), (1, 185, 0), (2, 185, 3)]
+    assert citations[0]["citation"] == "民法第184條"
+    assert citations[0]["article"] == "第184條"
+
+def test_parse_ignores_articles_without_law():
+    assert make_index().parse("第184條的規定") == []
+    # 中間有其他文字時不沿用前一個引用的法規
+    assert summary(make_index().parse("民法第184條，另外第3條")) == [(1, 184, 0)]
+
+def test_resolve():
+    index = make_index()
+    assert index.resolve(index.parse("民法第184條")[0]) == 1184
+    assert index.resolve(index.parse("民法第999條")[0]) is None
+
+def test_is_citation_query():
+    index = make_index()
+    for question in ("民法第184條", "民法第184條的內容是什麼?", "請問刑法第185條之3規定"):
+        citations = resolve_all(index, index.parse(question))
+        assert law_citations.is_citation_query(question, citations), question
+
+def test_is_not_citation_query():
+    index = make_index()
+    question = "朋友開車撞到我，可以依民法第184條請求賠償嗎?"
+    assert not law_citations.is_citation_query(question, resolve_all(index, index.parse(question)))
+    # 引用的條文不存在
+    question = "民法第999條"
+    assert not law_citations.is_citation_query(question, resolve_all(index, index.parse(question)))
+    assert not law_citations.is_citation_query("借錢不還", [])
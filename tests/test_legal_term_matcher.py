@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from legal_term_matcher import LegalTermMatcher
+
+KEYWORDS = {"損害賠償": {"count": 3}, "損害": {"count": 5}, "契約": {"count": 2}, "法": {"count": 9}}
+CLASSIFIER = {
+    "刑事": ["殺人", "傷害", "竊盜"],
+    "民事": ["契約", "損害賠償", "傷害"],
+    "勞工": ["資遣", "工資"]
+}
+
+def make_matcher():
+    return LegalTermMatcher(KEYWORDS, CLASSIFIER)
+
+def terms(matcher, hits):
+    return sorted((start, end, matcher._patterns[pattern_id][0]) for start, end, pattern_id in hits)
+
+def test_scan_finds_overlapping_hits():
+    matcher = make_matcher()
+    assert terms(matcher, matcher.scan("請求損害賠償")) == [(2, 4, "損害"), (2, 6, "損害賠償")]
+    assert matcher.scan("") == []
+
+def test_classify_counts_distinct_terms():
+    matcher = make_matcher()
+    assert matcher.classify(matcher.scan("違反契約要求損害賠償，契約無效")) == ("民事", [("民事", 2)])
+
+def test_classify_tie_keeps_classifier_order():
+    matcher = make_matcher()
+    # 「傷害」同時屬於刑事和民事
+    assert matcher.classify(matcher.scan("傷害")) == ("刑事", [("刑事", 1), ("民事", 1)])
+    assert matcher.classify(matcher.scan("被資遣，傷害")) == ("刑事", [("刑事", 1), ("民事", 1), ("勞工", 1)])
+
+def test_classify_without_hits():
+    matcher = make_matcher()
+    assert matcher.classify(matcher.scan("今天天氣很好")) == (None, [])
+
+def test_legal_keywords_leftmost_longest():
+    matcher = make_matcher()
+    keywords = matcher.legal_keywords(matcher.scan("契約損害賠償與損害賠償"))
+    # 單字詞「法」不作為法律關鍵詞；「損害」被較長的「損害賠償」覆蓋
+    assert [(keyword, count) for keyword, info, count in keywords] == [("損害賠償", 2), ("損害賠償", 2), ("契約", 1)]
+    assert keywords[0][1] == {"count": 3}
+
+def test_legal_keywords_top_k():
+    matcher = make_matcher()
+    assert len(matcher.legal_keywords(matcher.scan("契約損害賠償"), topK=1)) == 1
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import query_planner
+
+# 100 篇文檔的詞彙表
+DF = {"損害": 80, "賠償": 60, "損害賠償": 20, "車禍": 5, "過失": 30, "侵權": 10, "侵權行為": 8, "行為": 90}
+
+def make_planner(df=DF, doc_count=100, max_terms=12):
+    return query_planner.QueryPlanner("case", df, doc_count, max_terms=max_terms, max_df_ratio=0.5)
+
+def test_plan_drops_stopwords_and_duplicates():
+    plan = make_planner().plan(["什麼", "的", "車禍", " 車禍 ", "", "？"])
+    assert plan.terms == [("車禍", 5)]
+    assert ("什麼", "stopword") in plan.dropped
+    assert ("的", "stopword") in plan.dropped
+
+def test_plan_drops_common_terms():
+    plan = make_planner().plan(["損害", "賠償", "行為", "車禍"])
+    assert plan.terms == [("車禍", 5)]
+    assert ("損害", "common:80/100") in plan.dropped
+    assert ("賠償", "common:60/100") in plan.dropped
+    assert ("行為", "common:90/100") in plan.dropped
+
+def test_plan_keeps_least_common_when_all_common():
+    plan = make_planner().plan(["損害", "行為"])
+    assert plan.terms == [("損害", 80)]
+
+def test_plan_drops_subsumed_phrases():
+    plan = make_planner().plan(["損害賠償", "侵權", "侵權行為"])
+    assert [term for term, df in plan.terms] == ["侵權", "損害賠償"]
+    assert ("侵權行為", "subsumed") in plan.dropped
+
+def test_plan_splits_phrases_outside_vocabulary():
+    plan = make_planner().plan(["車禍過失"])
+    assert plan.terms == [("車禍", 5), ("過失", 30)]
+    assert plan.dropped == [("車禍過失", "split:車禍+過失")]
+
+def test_plan_orders_by_idf_and_limits_terms():
+    plan = make_planner(max_terms=2).plan(["過失", "車禍", "侵權", "損害賠償"])
+    assert plan.terms == [("車禍", 5), ("侵權", 10)]
+    assert [(term, reason) for term, reason in plan.dropped if reason == "limit"] == [("損害賠償", "limit"), ("過失", "limit")]
+
+def test_plan_unknown_terms_after_known_terms():
+    plan = make_planner().plan(["區塊鏈", "過失"])
+    assert plan.terms == [("過失", 30), ("區塊鏈", None)]
+
+def test_plan_small_corpus_does_not_prune_common_terms():
+    plan = make_planner(doc_count=query_planner.MIN_PRUNE_DOCS - 1).plan(["損害", "行為"])
+    assert sorted(term for term, df in plan.terms) == ["損害", "行為"]
+
+def test_plan_without_vocabulary():
+    plan = make_planner(df={}, doc_count=0).plan(["怎麼", "車禍", "損害賠償"])
+    assert [term for term, df in plan.terms] == ["車禍", "損害賠償"]
+    assert plan.to_dict()["dropped"] == [{"term": "怎麼", "reason": "stopword"}]
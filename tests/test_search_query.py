@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import pytest
+import fts_index
+import search_query
+
+COLUMNS = ["id", "title", "content", "category", "date"]
+
+# 建立使用bigram全文搜索索引的法規表
+def make_db(rows):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE laws (id INTEGER PRIMARY KEY, title TEXT, content TEXT, source TEXT, category TEXT, date TEXT)")
+    fts_index.register_functions(conn)
+    fts_index.create_fts_schema(conn, "laws", "bigram")
+    conn.executemany("INSERT INTO laws (title, content, category, date) VALUES (?, ?, ?, ?)", rows)
+    return conn
+
+# 以游標逐頁讀取全部結果，返回每頁的ID列表
+def read_pages(builder, conn, keywords, filter_value, page_size):
+    fingerprint = search_query.query_fingerprint("law", keywords, filter_value)
+    pages = []
+    cursor = None
+    while True:
+        after = search_query.decode_cursor(cursor, fingerprint) if cursor else None
+        rows = builder.execute(conn, keywords, filter_value, page_size + 1, "bigram", after)
+        page = rows[:page_size]
+        pages.append([row[0] for row in page])
+        if len(rows) <= page_size:
+            return pages
+        last = page[-1]
+        keys = (last[-1], last[0]) if last[-1] is not None else (last[0],)
+        cursor = search_query.encode_cursor(keys, fingerprint)
+
+def test_cursor_round_trip():
+    fingerprint = search_query.query_fingerprint("law", ["損害", "賠償"], "民事", [], "bigram")
+    cursor = search_query.encode_cursor((-1.25, 42), fingerprint)
+    assert "=" not in cursor
+    assert search_query.decode_cursor(cursor, fingerprint) == (-1.25, 42)
+    assert search_query.decode_cursor(search_query.encode_cursor((7,), fingerprint), fingerprint) == (7,)
+
+def test_query_fingerprint_depends_on_query():
+    assert search_query.query_fingerprint("law", ["損害"], None) == search_query.query_fingerprint("law", ["損害"], None)
+    assert search_query.query_fingerprint("law", ["損害"], None) != search_query.query_fingerprint("law", ["損害"], "民事")
+    assert search_query.query_fingerprint("law", ["損害"], None) != search_query.query_fingerprint("case", ["損害"], None)
+
+def test_decode_cursor_rejects_other_query():
+    cursor = search_query.encode_cursor((3,), search_query.query_fingerprint("law", ["損害"], None))
+    with pytest.raises(ValueError, match="不屬於此查詢"):
+        search_query.decode_cursor(cursor, search_query.query_fingerprint("law", ["賠償"], None))
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", "e30", "W10"])
+def test_decode_cursor_rejects_malformed(cursor):
+    with pytest.raises(ValueError, match="無效的分頁游標"):
+        search_query.decode_cursor(cursor, "fingerprint")
+
+def test_keyset_pages_without_keywords():
+    conn = make_db([(f"法規{i}", "內容", "民事" if i % 2 else "刑事", "2020-01-01") for i in range(1, 12)])
+    builder = search_query.SearchQueryBuilder("laws", COLUMNS, "category", "bm25(laws_fts)")
+    pages = read_pages(builder, conn, [], "民事", 2)
+    assert pages == [[11, 9], [7, 5], [3, 1]]
+
+def test_keyset_pages_match_single_query():
+    rows = [(f"法規{i}", "損害賠償" * (i % 4 + 1) + "其他內容" * i, "民事", "2020-01-01") for i in range(1, 15)]
+    rows.append(("刑法", "殺人者處死刑", "刑事", "2020-01-01"))
+    conn = make_db(rows)
+    builder = search_query.SearchQueryBuilder("laws", COLUMNS, "category", "bm25(laws_fts)")
+    expected = [row[0] for row in builder.execute(conn, ["損害賠償"], None, 100, "bigram")]
+    pages = read_pages(builder, conn, ["損害賠償"], None, 4)
+    assert [len(page) for page in pages] == [4, 4, 4, 2]
+    assert [doc_id for page in pages for doc_id in page] == expected
+    assert sorted(expected) == list(range(1, 15))
+
+def test_excerpt_around_first_keyword():
+    content = "甲" * 50 + "損害賠償" + "乙" * 50
+    conn = make_db([("民法", content, "民事", "2020-01-01"), ("刑法", "損害賠償在開頭", "刑事", "2020-01-01")])
+    builder = search_query.SearchQueryBuilder("laws", ["id"], "category", "bm25(laws_fts)", excerpt=("content", 20))
+    rows = {row[0]: row for row in builder.execute(conn, ["損害賠償", "賠償"], None, 10, "bigram")}
+    # 片段從關鍵詞前 20 // 4 = 5 個字開始，多取一個字
+    assert rows[1][1:3] == ("甲" * 5 + "損害賠償" + "乙" * 12, 46)
+    assert rows[2][1:3] == ("損害賠償在開頭", 1)
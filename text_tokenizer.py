@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import jieba
+import jieba.posseg
+
+# 通用停用詞（建立索引和分析問題共用）
+STOPWORDS = frozenset({'的', '了', '和', '是', '在', '有', '與', '之', '或', '及', '對', '由', '上', '中', '下', '為', '以', '等'})
+
+# 問題關鍵詞的停用詞（另外排除代詞和疑問詞）
+QUESTION_STOPWORDS = frozenset({'的', '了', '和', '是', '在', '我', '有', '這', '那', '你', '他', '她', '它', '們', '什麼', '怎麼', '如何', '為什麼'})
+
+# 選擇建立索引和查詢時使用的分詞器（jieba / jieba_nohmm / bigram）
+INDEX_TOKENIZER = os.environ.get("INDEX_TOKENIZER", "jieba")
+QUERY_TOKENIZER = os.environ.get("QUERY_TOKENIZER", "jieba")
+
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+CJK_RUN_RE = re.compile(r'[\u4e00-\u9fff]+|[^\u4e00-\u9fff\s]+|\s+')
+
+# jieba分詞器，hmm=False 時只使用詞典，速度較快但未登錄詞會被拆成單字
+class JiebaTokenizer:
+    def __init__(self, hmm=True):
+        self.hmm = hmm
+        self.name = "jieba" if hmm else "jieba_nohmm"
+        self.version = f"jieba-{jieba.__version__}-{'hmm' if hmm else 'nohmm'}"
+
+    def cut(self, text):
+        return jieba.lcut(text or "", HMM=self.hmm)
+
+    # 分詞並標註詞性，返回 [(詞, 詞性)]
+    def cut_pos(self, text):
+        return [(pair.word, pair.flag) for pair in jieba.posseg.cut(text or "", HMM=self.hmm)]
+
+# 字元二元組分詞器：中文連續字元切成重疊的雙字詞，其他字元按原樣保留
+# 不依賴詞典，速度最快且召回率高，但詞彙表較大
+class BigramTokenizer:
+    name = "bigram"
+    version = "bigram-v1"
+
+    def cut(self, text):
+        tokens = []
+        for run in CJK_RUN_RE.findall(text or ""):
+            if len(run) > 1 and '\u4e00' <= run[0] <= '\u9fff':
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            else:
+                tokens.append(run)
+        return tokens
+
+    # 不做詞性標註，詞性為 None
+    def cut_pos(self, text):
+        return [(token, None) for token in self.cut(text)]
+
+# 可用的分詞器
+TOKENIZERS = {
+    "jieba": JiebaTokenizer(hmm=True),
+    "jieba_nohmm": JiebaTokenizer(hmm=False),
+    "bigram": BigramTokenizer()
+}
+
+# 獲取分詞器，名稱未知時使用jieba
+def get_tokenizer(name=None):
+    return TOKENIZERS.get(name or QUERY_TOKENIZER, TOKENIZERS["jieba"])
+
+# 分詞並移除標點符號、空白和停用詞
+def tokenize(text, name=None, stopwords=STOPWORDS):
+    if not text:
+        return []
+    text = PUNCTUATION_RE.sub('', text)
+    return [word for word in get_tokenizer(name).cut(text) if word.strip() and word not in stopwords]
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import math
+import sqlite3
+from collections import Counter
+from datetime import datetime
+import text_tokenizer
+
+# 設定基本參數
+DB_DIR = "/home/ubuntu/legal-ai-system/data/db"
+DB_FILE = os.path.join(DB_DIR, "legal_db.sqlite")
+LOG_FILE = os.path.join(DB_DIR, "token_store_log.txt")
+
+# 建立文檔分詞結果使用的分詞器（由 text_tokenizer.INDEX_TOKENIZER 設定）
+DOCUMENT_TOKENIZER = text_tokenizer.get_tokenizer(text_tokenizer.INDEX_TOKENIZER)
+
+# 分詞器版本：分詞方式改變時需更新，舊版本的分詞結果會被視為不存在
+TOKENIZER_VERSION = f"{DOCUMENT_TOKENIZER.version}-v1"
+
+# 文檔類型對應的數據表
+DOC_TABLES = {
+    "law": "laws",
+    "case": "court_cases",
+    "article": "law_articles"
+}
+
+# 確保目錄存在
+os.makedirs(DB_DIR, exist_ok=True)
+
+# 記錄函數
+def log_message(message):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"[{timestamp}] {message}\n")
+    print(f"[{timestamp}] {message}")
+
+# 創建詞頻向量表
+def ensure_token_table(conn):
+    # 詞頻向量和向量長度，重排序時只需查詢詞的詞頻即可計算餘弦相似度
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS document_vectors (
+        doc_type TEXT NOT NULL,
+        doc_id INTEGER NOT NULL,
+        tokenizer_version TEXT NOT NULL,
+        norm REAL NOT NULL,
+        vector TEXT NOT NULL,
+        PRIMARY KEY (doc_type, doc_id, tokenizer_version)
+    )
+    ''')
+
+# 對文檔內容分詞（與相似度計算使用的分詞方式一致）
+def tokenize_document(text):
+    return DOCUMENT_TOKENIZER.cut(text)
+
+# 由分詞結果建立詞頻向量，返回 (詞頻字典, 向量長度)
+def build_vector(tokens):
+    vector = dict(Counter(tokens))
+    return vector, math.sqrt(sum(count * count for count in vector.values()))
+
+# 計算兩個詞頻向量的餘弦相似度（遍歷較短的向量）
+def cosine_similarity(vector1, norm1, vector2, norm2):
+    if not norm1 or not norm2:
+        return 0
+    if len(vector1) > len(vector2):
+        vector1, vector2 = vector2, vector1
+    numerator = sum(count * vector2.get(word, 0) for word, count in vector1.items())
+    return numerator / (norm1 * norm2)
+
+# 保存文檔的詞頻向量（只保存向量，不保存完整的分詞序列），rows 為 (文檔ID, 內容) 列表
+def store_document_tokens(conn, doc_type, rows):
+    try:
+        ensure_token_table(conn)
+        count = 0
+        for doc_id, content in rows:
+            vector, norm = build_vector(tokenize_document(content))
+            conn.execute('''
+            INSERT OR REPLACE INTO document_vectors (doc_type, doc_id, tokenizer_version, norm, vector)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (doc_type, doc_id, TOKENIZER_VERSION, norm, json.dumps(vector, ensure_ascii=False)))
+            count += 1
+        conn.commit()
+        log_message(f"成功保存 {count} 條{doc_type}文檔的詞頻向量")
+        return count
+    except Exception as e:
+        log_message(f"保存文檔詞頻向量失敗: {str(e)}")
+        return 0
+
+# 刪除文檔的詞頻向量（文檔被刪除時調用）
+def delete_document_tokens(conn, doc_type, doc_ids):
+    ensure_token_table(conn)
+    params = [(doc_type, doc_id) for doc_id in doc_ids]
+    conn.executemany("DELETE FROM document_vectors WHERE doc_type = ? AND doc_id = ?", params)
+    conn.commit()
+
+# 批量讀取文檔詞頻向量，返回 {文檔ID: (詞頻字典, 向量長度)}，缺失的文檔不在結果中
+def load_document_vectors(conn, doc_type, doc_ids):
+    if not doc_ids:
+        return {}
+    try:
+        placeholders = ",".join("?" for _ in doc_ids)
+        cursor = conn.execute(f'''
+        SELECT doc_id, norm, vector FROM document_vectors
+        WHERE doc_type = ? AND tokenizer_version = ? AND doc_id IN ({placeholders})
+        ''', [doc_type, TOKENIZER_VERSION] + list(doc_ids))
+        return {doc_id: (json.loads(vector), norm) for doc_id, norm, vector in cursor.fetchall()}
+    except sqlite3.OperationalError as e:
+        # 詞頻向量表尚未建立
+        log_message(f"讀取文檔詞頻向量失敗: {str(e)}")
+        return {}
+
+# 逐條讀取文檔類型的全部詞頻向量，產生 (文檔ID, 詞頻字典, 向量長度)
+def iter_document_vectors(conn, doc_type):
+    try:
+        cursor = conn.execute('''
+        SELECT doc_id, vector, norm FROM document_vectors
+        WHERE doc_type = ? AND tokenizer_version = ?
+        ORDER BY doc_id
+        ''', (doc_type, TOKENIZER_VERSION))
+    except sqlite3.OperationalError as e:
+        # 詞頻向量表尚未建立
+        log_message(f"讀取文檔詞頻向量失敗: {str(e)}")
+        return
+    for doc_id, vector, norm in cursor:
+        yield doc_id, json.loads(vector), norm
+
+# 為尚未保存當前版本詞頻向量的文檔補建
+def backfill_document_tokens(conn, doc_type):
+    ensure_token_table(conn)
+    table = DOC_TABLES[doc_type]
+    cursor = conn.execute(f'''
+    SELECT {table}.id, {table}.content FROM {table}
+    WHERE NOT EXISTS (
+        SELECT 1 FROM document_vectors
+        WHERE document_vectors.doc_type = ? AND document_vectors.doc_id = {table}.id
+        AND document_vectors.tokenizer_version = ?
+    )
+    ''', (doc_type, TOKENIZER_VERSION))
+    rows = cursor.fetchall()
+    return store_document_tokens(conn, doc_type, rows)
+
+# 刪除舊版本的分詞序列表（document_tokens，重排序改用詞頻向量後不再讀取），返回是否刪除
+# 刪除後的空間需 VACUUM 才會歸還給文件系統
+def drop_token_streams(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'document_tokens'").fetchone()
+    if exists:
+        conn.execute("DROP TABLE document_tokens")
+        conn.commit()
+    return exists is not None
+
+# 刪除舊版本分詞器產生的詞頻向量和舊的分詞序列表
+def purge_stale_tokens(conn):
+    ensure_token_table(conn)
+    if drop_token_streams(conn):
+        log_message("刪除不再使用的 document_tokens 分詞序列表，可運行 VACUUM 回收空間")
+    cursor = conn.execute("DELETE FROM document_vectors WHERE tokenizer_version != ?", (TOKENIZER_VERSION,))
+    conn.commit()
+    log_message(f"刪除 {cursor.rowcount} 條舊版本詞頻向量")
+
+# 主函數：為現有數據補建詞頻向量
+def main():
+    log_message(f"開始建立文檔詞頻向量，分詞器版本: {TOKENIZER_VERSION}")
+
+    conn = sqlite3.connect(DB_FILE)
+    purge_stale_tokens(conn)
+    for doc_type in DOC_TABLES:
+        try:
+            backfill_document_tokens(conn, doc_type)
+        except sqlite3.OperationalError as e:
+            log_message(f"補建{doc_type}文檔詞頻向量失敗: {str(e)}")
+    conn.close()
+
+    log_message("文檔詞頻向量建立完成")
+
+if __name__ == "__main__":
+    main()
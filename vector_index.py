@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 稀疏向量相似度引擎
+# 每篇文檔以「詞ID -> 權重」的稀疏向量保存在CSR矩陣中，並預先計算向量長度，
+# 查詢與N篇候選文檔的餘弦相似度只需一次稀疏矩陣乘法
+
+import os
+import time
+import shutil
+import tempfile
+import numpy as np
+from scipy import sparse
+from collections import Counter
+
+# 二進制TF-IDF索引和稀疏向量索引的文件（每個數組一個 .npy 文件，以 mmap 方式載入）
+TFIDF_INDEX_ARRAYS = ("vocabulary", "idf", "data", "indices", "indptr", "doc_ids", "norms")
+VECTOR_INDEX_ARRAYS = ("vocabulary", "data", "indices", "indptr", "doc_ids", "norms")
+
+# 寫入二進制索引的最長詞長：詞彙表為定長字串數組，過長的詞會使每個詞都佔用同樣空間
+MAX_TERM_LENGTH = 32
+
+# 已排序詞彙表：以二分查找代替字典，mmap載入後不需要建立 {詞: 詞ID}
+class SortedVocabulary:
+    def __init__(self, words):
+        self.words = words
+
+    def __len__(self):
+        return len(self.words)
+
+    def get(self, word, default=None):
+        position = int(np.searchsorted(self.words, word))
+        if position < len(self.words) and self.words[position] == word:
+            return position
+        return default
+
+# 稀疏向量索引：vocabulary 支持 get(詞) 返回詞ID，matrix 為 文檔數 x 詞彙量 的CSR矩陣
+class SparseVectorIndex:
+    def __init__(self, vocabulary, matrix, norms, doc_ids):
+        matrix = sparse.csr_matrix(matrix)
+        norms = np.asarray(norms, dtype=np.float64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        # 按文檔ID排序，以二分查找定位文檔所在的行
+        if len(doc_ids) > 1 and np.any(doc_ids[1:] < doc_ids[:-1]):
+            order = np.argsort(doc_ids, kind="stable")
+            matrix, norms, doc_ids = matrix[order], norms[order], doc_ids[order]
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+        self.norms = norms
+        self.doc_ids = doc_ids
+
+    # 由 (文檔ID, 詞頻字典, 向量長度) 建立索引
+    @classmethod
+    def from_vectors(cls, items):
+        vocabulary = {}
+        doc_ids = []
+        norms = []
+        indptr = [0]
+        indices = []
+        data = []
+        for doc_id, vector, norm in items:
+            for word, weight in vector.items():
+                indices.append(vocabulary.setdefault(word, len(vocabulary)))
+                data.append(weight)
+            indptr.append(len(indices))
+            doc_ids.append(doc_id)
+            norms.append(norm)
+        matrix = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(doc_ids), len(vocabulary))
+        )
+        return cls(vocabulary, matrix, norms, doc_ids)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        position = int(np.searchsorted(self.doc_ids, doc_id))
+        return position < len(self.doc_ids) and self.doc_ids[position] == doc_id
+
+    # 將查詢詞頻字典轉為 詞彙量 x 1 的稀疏列向量，索引中沒有的詞不影響點積
+    def _query_column(self, vector):
+        indices = []
+        data = []
+        for word, weight in vector.items():
+            word_id = self.vocabulary.get(word)
+            if word_id is not None:
+                indices.append(word_id)
+                data.append(weight)
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), (np.asarray(indices, dtype=np.int32), np.zeros(len(indices), dtype=np.int32))),
+            shape=(len(self.vocabulary), 1)
+        )
+
+    # 計算查詢與文檔的餘弦相似度，doc_ids 為空時計算全部文檔（doc_ids 必須都在索引中）
+    # query_norm 為完整查詢向量的長度（包含索引中沒有的詞），與逐篇計算的結果一致
+    def score(self, vector, query_norm, doc_ids=None):
+        if doc_ids is None:
+            rows = slice(None)
+            ids = self.doc_ids
+        else:
+            rows = np.searchsorted(self.doc_ids, np.asarray(doc_ids, dtype=np.int64))
+            ids = self.doc_ids[rows]
+        if not query_norm or not len(ids):
+            return ids, np.zeros(len(ids))
+
+        dots = (self.matrix[rows] @ self._query_column(vector)).toarray().ravel()
+        norms = self.norms[rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(norms > 0, dots / (norms * query_norm), 0.0)
+        return ids, scores
+
+    # 返回相似度最高的 k 篇文檔 [(文檔ID, 相似度)]，相似度為0的文檔不返回
+    def top_k(self, vector, query_norm, k):
+        ids, scores = self.score(vector, query_norm)
+        if not len(ids) or k <= 0:
+            return []
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+# TF-IDF索引：文檔權重為 詞頻比例 x IDF，查詢向量以相同方式計算
+class TfidfIndex(SparseVectorIndex):
+    def __init__(self, vocabulary, idf, matrix, norms, doc_ids):
+        super().__init__(vocabulary, matrix, norms, doc_ids)
+        self.idf = idf
+
+    # 由查詢詞頻字典計算TF-IDF向量，返回 (權重字典, 向量長度)
+    # 未按查詢長度歸一化詞頻：餘弦相似度不受整體縮放影響
+    def weight_vector(self, counts):
+        vector = {}
+        for word, count in counts.items():
+            word_id = self.vocabulary.get(word)
+            if word_id is not None:
+                vector[word] = count * float(self.idf[word_id])
+        return vector, float(np.sqrt(sum(weight * weight for weight in vector.values())))
+
+    # 搜索與分詞結果最相似的 k 篇文檔
+    def search(self, tokens, k):
+        vector, norm = self.weight_vector(Counter(tokens))
+        return self.top_k(vector, norm, k)
+
+# 保存數組目錄：數組寫入新的版本目錄（目錄名.隨機後綴），再以符號鏈接指向新版本
+# os.replace 替換符號鏈接是原子操作，讀取者只會看到完整的舊版本或新版本，不會混合兩個版本的數組
+def _save_arrays(directory, arrays):
+    directory = os.path.abspath(directory)
+    parent, name = os.path.split(directory)
+    os.makedirs(parent, exist_ok=True)
+    version_dir = tempfile.mkdtemp(prefix=f"{name}.", dir=parent)
+    try:
+        for array_name, array in arrays.items():
+            with open(os.path.join(version_dir, f"{array_name}.npy"), "wb") as f:
+                np.save(f, array)
+                f.flush()
+                os.fsync(f.fileno())
+    except Exception:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    # 舊格式為普通目錄，無法以符號鏈接原子替換，先改名為版本目錄
+    if os.path.isdir(directory) and not os.path.islink(directory):
+        os.rename(directory, f"{directory}.{os.getpid()}-{int(time.time())}")
+    previous = os.path.realpath(directory) if os.path.islink(directory) else None
+    link = f"{version_dir}.link"
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, directory)
+
+    # 保留上一個版本，正在按舊路徑載入的進程仍可讀取完整的數組；更早的版本刪除
+    for entry in os.listdir(parent):
+        path = os.path.join(parent, entry)
+        if not entry.startswith(f"{name}.") or path in (version_dir, previous):
+            continue
+        if os.path.islink(path):
+            os.remove(path)
+        elif os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+# 以 mmap 方式載入數組目錄：先解析符號鏈接，所有數組都從同一個版本目錄讀取
+def _load_arrays(directory, names):
+    directory = os.path.realpath(directory)
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in names}
+
+# 將 [(文檔ID, {詞: 權重})] 按文檔ID排序轉為CSR數組，不在詞彙表中的詞被忽略
+def _csr_arrays(doc_vectors, vocabulary):
+    doc_vectors = sorted(doc_vectors, key=lambda item: item[0])
+    indptr = [0]
+    indices = []
+    data = []
+    norms = []
+    for doc_id, vector in doc_vectors:
+        # 行內按詞ID排序，符合CSR的標準格式
+        row = sorted((vocabulary[word], weight) for word, weight in vector.items() if word in vocabulary)
+        indices.extend(word_id for word_id, weight in row)
+        data.extend(weight for word_id, weight in row)
+        indptr.append(len(indices))
+        norms.append(np.sqrt(sum(weight * weight for word_id, weight in row)))
+
+    # indices 和 indptr 使用相同的整數類型，scipy 載入時不需要轉換（轉換會複製 mmap 的數據）
+    index_dtype = np.int32 if len(indices) < np.iinfo(np.int32).max else np.int64
+    return {
+        "data": np.array(data, dtype=np.float32),
+        "indices": np.array(indices, dtype=index_dtype),
+        "indptr": np.array(indptr, dtype=index_dtype),
+        "doc_ids": np.array([doc_id for doc_id, vector in doc_vectors], dtype=np.int64),
+        "norms": np.array(norms, dtype=np.float64)
+    }
+
+# 已排序詞彙表的定長字串數組
+def _vocabulary_array(words):
+    return np.array(words, dtype=f"U{max([len(word) for word in words] + [1])}")
+
+# 以 mmap 數組建立CSR矩陣，不複製數據
+def _csr_matrix(arrays):
+    return sparse.csr_matrix(
+        (arrays["data"], arrays["indices"], arrays["indptr"]),
+        shape=(len(arrays["doc_ids"]), len(arrays["vocabulary"])),
+        copy=False
+    )
+
+# 將TF-IDF向量保存為二進制索引目錄，doc_vectors 為 [(文檔ID, {詞: 權重})]，idf 為 {詞: IDF}
+def save_tfidf_index(directory, doc_vectors, idf):
+    words = sorted(word for word in idf if len(word) <= MAX_TERM_LENGTH)
+    vocabulary = {word: word_id for word_id, word in enumerate(words)}
+    arrays = _csr_arrays(doc_vectors, vocabulary)
+    arrays["vocabulary"] = _vocabulary_array(words)
+    arrays["idf"] = np.array([idf[word] for word in words], dtype=np.float32)
+    _save_arrays(directory, arrays)
+    return len(arrays["doc_ids"]), len(words)
+
+# 以 mmap 方式載入二進制TF-IDF索引，數組頁面由操作系統按需讀取並在進程間共享
+def load_tfidf_index(directory):
+    arrays = _load_arrays(directory, TFIDF_INDEX_ARRAYS)
+    return TfidfIndex(SortedVocabulary(arrays["vocabulary"]), arrays["idf"], _csr_matrix(arrays), arrays["norms"], arrays["doc_ids"])
+
+# 將詞頻向量保存為二進制稀疏向量索引目錄，items 為 (文檔ID, 詞頻字典, 向量長度)
+# 向量長度使用保存的值（包含超過 MAX_TERM_LENGTH 而未寫入詞彙表的詞），與逐篇計算的相似度一致
+def save_vector_index(directory, items):
+    doc_vectors = []
+    stored_norms = {}
+    words = set()
+    for doc_id, vector, norm in items:
+        doc_vectors.append((doc_id, vector))
+        stored_norms[doc_id] = norm
+        words.update(word for word in vector if len(word) <= MAX_TERM_LENGTH)
+    words = sorted(words)
+    arrays = _csr_arrays(doc_vectors, {word: word_id for word_id, word in enumerate(words)})
+    arrays["vocabulary"] = _vocabulary_array(words)
+    arrays["norms"] = np.array([stored_norms[doc_id] for doc_id in arrays["doc_ids"].tolist()], dtype=np.float64)
+    _save_arrays(directory, arrays)
+    return len(doc_vectors), len(words)
+
+# 以 mmap 方式載入二進制稀疏向量索引
+def load_vector_index(directory):
+    arrays = _load_arrays(directory, VECTOR_INDEX_ARRAYS)
+    return SparseVectorIndex(SortedVocabulary(arrays["vocabulary"]), _csr_matrix(arrays), arrays["norms"], arrays["doc_ids"])